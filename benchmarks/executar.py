@@ -0,0 +1,378 @@
+"""Benchmark de carga dos blueprints reais contra um Stripe falso local.
+
+Uso (a partir da raiz do repositório):
+
+    python -m benchmarks.executar --pedidos 1000000            # semeia e mede
+    python -m benchmarks.executar --salvar-baseline             # grava benchmarks/baseline.json
+    python -m benchmarks.executar --pedidos 50000 --reusar-banco
+
+Cada cenário é disparado por várias threads usando o test client do Flask
+sobre o app real (src.main.create_app), com o banco em um arquivo SQLite
+separado. O relatório traz p50/p95/p99, requisições por segundo e
+consultas SQL por requisição; se existir um baseline, o comando sai com
+código 1 quando algum cenário piora além da tolerância. O baseline deve ser
+gravado na mesma máquina em que a comparação roda.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PADRAO = os.path.join(RAIZ, 'benchmarks', 'baseline.json')
+SEGREDO_WEBHOOK = 'whsec_benchmark'
+TAMANHO_LOTE_SEMENTE = 10000
+SENHA_SEMENTE = 'benchmark'
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--banco', default=os.path.join(tempfile.gettempdir(), 'esfiharia_benchmark.db'))
+    parser.add_argument('--reusar-banco', action='store_true', help='não recriar nem semear o banco')
+    parser.add_argument('--esfihas', type=int, default=60)
+    parser.add_argument('--usuarios', type=int, default=20000)
+    parser.add_argument('--pedidos', type=int, default=1000000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--requisicoes', type=int, default=2000, help='requisições por cenário')
+    parser.add_argument('--latencia-stripe', type=float, default=0.05, help='segundos por chamada ao Stripe falso')
+    parser.add_argument('--baseline', default=BASELINE_PADRAO)
+    parser.add_argument('--salvar-baseline', action='store_true')
+    parser.add_argument('--tolerancia', type=float, default=0.20, help='piora relativa aceita (0.20 = 20%%)')
+    parser.add_argument('--saida', help='grava os resultados em JSON neste arquivo')
+    return parser.parse_args()
+
+
+def _semear(app, args):
+    """Insere cardápio, usuários e pedidos sintéticos com executemany em lotes."""
+    from werkzeug.security import generate_password_hash
+    from src.models.user import db, User
+    from src.models.esfiha import Esfiha
+    from src.models.pedido import Pedido, ItemPedido, StatusPedido
+
+    aleatorio = random.Random(42)
+    agora = datetime.utcnow()
+    status_possiveis = [
+        StatusPedido.ENTREGUE, StatusPedido.ENTREGUE, StatusPedido.ENTREGUE, StatusPedido.CANCELADO,
+        StatusPedido.FALHA_PAGAMENTO, StatusPedido.PENDENTE, StatusPedido.EM_PREPARACAO,
+        StatusPedido.PAGAMENTO_PENDENTE,
+    ]
+    categorias = ['carne', 'frango', 'queijo', 'vegetariana', 'doce']
+    hash_senha = generate_password_hash(SENHA_SEMENTE, method='pbkdf2:sha256:1000')
+
+    with app.app_context():
+        with db.engine.begin() as conexao:
+            conexao.execute(Esfiha.__table__.insert(), [{
+                'nome': f'Esfiha {i}', 'descricao': f'Descrição da esfiha {i}', 'preco': round(4 + (i % 12) * 0.75, 2),
+                'categoria': categorias[i % len(categorias)], 'disponivel': True, 'imagem_url': '',
+                'data_criacao': agora, 'data_atualizacao': agora,
+            } for i in range(1, args.esfihas + 1)])
+            conexao.execute(User.__table__.insert(), [{
+                'username': f'cliente{i}', 'email': f'cliente{i}@exemplo.com', 'password_hash': hash_senha,
+            } for i in range(1, args.usuarios + 1)])
+
+        pedido_id = 0
+        while pedido_id < args.pedidos:
+            pedidos, itens = [], []
+            for _ in range(min(TAMANHO_LOTE_SEMENTE, args.pedidos - pedido_id)):
+                pedido_id += 1
+                criado = agora - timedelta(seconds=aleatorio.randint(0, 365 * 24 * 3600))
+                total = 0
+                for _ in range(aleatorio.randint(1, 4)):
+                    preco = round(4 + aleatorio.randint(0, 11) * 0.75, 2)
+                    quantidade = aleatorio.randint(1, 6)
+                    total += preco * quantidade
+                    itens.append({
+                        'pedido_id': pedido_id, 'esfiha_id': aleatorio.randint(1, args.esfihas),
+                        'quantidade': quantidade, 'preco_unitario': preco, 'observacoes': '',
+                    })
+                pedidos.append({
+                    'id': pedido_id, 'cliente_id': aleatorio.randint(1, args.usuarios),
+                    'nome_cliente': 'Cliente Benchmark', 'telefone': '11999999999', 'endereco': 'Rua Teste, 1',
+                    'forma_entrega': aleatorio.choice(['retirada', 'entrega']),
+                    'status': aleatorio.choice(status_possiveis), 'valor_total': round(total, 2),
+                    'observacoes': '', 'data_criacao': criado, 'data_atualizacao': criado,
+                    'stripe_payment_intent_id': f'pi_semente_{pedido_id}',
+                })
+            with db.engine.begin() as conexao:
+                conexao.execute(Pedido.__table__.insert(), pedidos)
+                conexao.execute(ItemPedido.__table__.insert(), itens)
+            print(f'  {pedido_id}/{args.pedidos} pedidos', end='\r', flush=True)
+        print()
+
+
+class ContadorConsultas:
+    """Conta as consultas SQL executadas pela thread atual (ignora as threads de fundo)."""
+
+    def __init__(self, engine):
+        from sqlalchemy import event
+        self._local = threading.local()
+        event.listen(engine, 'before_cursor_execute', self._contar)
+
+    def _contar(self, *args):
+        if getattr(self._local, 'ativo', False):
+            self._local.total += 1
+
+    def iniciar(self):
+        self._local.ativo = True
+        self._local.total = 0
+
+    def parar(self):
+        self._local.ativo = False
+        return self._local.total
+
+
+def _percentil(valores_ordenados, p):
+    if not valores_ordenados:
+        return 0.0
+    indice = min(len(valores_ordenados) - 1, int(round(p / 100 * (len(valores_ordenados) - 1))))
+    return valores_ordenados[indice]
+
+
+def _executar_cenario(app, contador, nome, total, threads, requisicao):
+    """Dispara `total` chamadas de requisicao(client, i) em `threads` threads e mede cada uma."""
+    latencias, consultas, erros = [], [], []
+    lock = threading.Lock()
+    proximo = iter(range(total))
+
+    def trabalhador():
+        client = app.test_client()
+        while True:
+            with lock:
+                i = next(proximo, None)
+            if i is None:
+                return
+            contador.iniciar()
+            inicio = time.perf_counter()
+            resposta = requisicao(client, i)
+            duracao = time.perf_counter() - inicio
+            n_consultas = contador.parar()
+            with lock:
+                latencias.append(duracao)
+                consultas.append(n_consultas)
+                if resposta.status_code >= 400:
+                    erros.append(resposta.status_code)
+
+    inicio = time.perf_counter()
+    grupo = [threading.Thread(target=trabalhador) for _ in range(threads)]
+    for thread in grupo:
+        thread.start()
+    for thread in grupo:
+        thread.join()
+    duracao_total = time.perf_counter() - inicio
+
+    latencias.sort()
+    return {
+        'requisicoes': total,
+        'erros': len(erros),
+        'rps': round(total / duracao_total, 1),
+        'p50_ms': round(_percentil(latencias, 50) * 1000, 2),
+        'p95_ms': round(_percentil(latencias, 95) * 1000, 2),
+        'p99_ms': round(_percentil(latencias, 99) * 1000, 2),
+        'consultas_por_requisicao': round(sum(consultas) / max(len(consultas), 1), 2),
+    }
+
+
+def _aguardar(condicao, timeout=120):
+    inicio = time.perf_counter()
+    while not condicao():
+        if time.perf_counter() - inicio > timeout:
+            return None
+        time.sleep(0.05)
+    return round(time.perf_counter() - inicio, 2)
+
+
+def _cenarios(app, args, stripe_falso):
+    from benchmarks.stripe_falso import evento_assinado
+    from src.models.user import db
+    from src.models.pagamento import EventoStripe, PagamentoOutbox, StatusEvento, StatusOutbox
+
+    contador = ContadorConsultas(_engine(app))
+    resultados = {}
+    aleatorio = random.Random(7)
+    pedidos_criados = []
+    lock_criados = threading.Lock()
+
+    resultados['listar_cardapio'] = _executar_cenario(
+        app, contador, 'listar_cardapio', args.requisicoes, args.threads,
+        lambda client, i: client.get('/api/esfihas/')
+    )
+
+    def criar_pedido(client, i):
+        resposta = client.post('/api/pedidos/criar-intent-pagamento', json={
+            'nome_cliente': 'Cliente Benchmark', 'telefone': '11999999999', 'forma_entrega': 'retirada',
+            'itens': [
+                {'esfiha_id': aleatorio.randint(1, args.esfihas), 'quantidade': aleatorio.randint(1, 4)}
+                for _ in range(aleatorio.randint(1, 8))
+            ],
+        })
+        if resposta.status_code < 400:
+            with lock_criados:
+                pedidos_criados.append(resposta.get_json()['pedido_id'])
+        return resposta
+
+    resultados['criar_pedido'] = _executar_cenario(
+        app, contador, 'criar_pedido', args.requisicoes, args.threads, criar_pedido
+    )
+
+    def outbox_drenado():
+        with app.app_context():
+            try:
+                return not db.session.query(PagamentoOutbox.id).filter(
+                    PagamentoOutbox.status.in_([StatusOutbox.PENDENTE, StatusOutbox.PROCESSANDO])
+                ).first()
+            finally:
+                db.session.remove()
+
+    resultados['criar_pedido']['drenagem_outbox_s'] = _aguardar(outbox_drenado)
+    resultados['criar_pedido']['chamadas_stripe'] = stripe_falso.chamadas
+
+    def webhook(client, i):
+        pedido_id = pedidos_criados[i % len(pedidos_criados)]
+        payload, assinatura = evento_assinado(
+            SEGREDO_WEBHOOK, f'evt_bench_{i}', 'payment_intent.succeeded', pedido_id, f'pi_{pedido_id}'
+        )
+        return client.post('/api/pedidos/stripe-webhook', data=payload, headers={
+            'Stripe-Signature': assinatura, 'Content-Type': 'application/json'
+        })
+
+    if pedidos_criados:
+        resultados['webhook'] = _executar_cenario(
+            app, contador, 'webhook', args.requisicoes, args.threads, webhook
+        )
+
+        def eventos_aplicados():
+            with app.app_context():
+                try:
+                    return not db.session.query(EventoStripe.id).filter_by(status=StatusEvento.RECEBIDO).first()
+                finally:
+                    db.session.remove()
+
+        resultados['webhook']['drenagem_eventos_s'] = _aguardar(eventos_aplicados)
+
+    resultados['listar_pedidos_admin'] = _executar_cenario(
+        app, contador, 'listar_pedidos_admin', args.requisicoes, args.threads,
+        lambda client, i: client.get('/api/pedidos/admin?limite=50')
+    )
+
+    # Login verifica a senha no pool de hash; /me resolve a identidade do JWT pelo cache
+    tokens = {}
+    lock_tokens = threading.Lock()
+
+    def login(client, i):
+        usuario = aleatorio.randint(1, args.usuarios)
+        resposta = client.post('/api/users/login', json={
+            'identifier': f'cliente{usuario}', 'password': SENHA_SEMENTE,
+        })
+        if resposta.status_code < 400:
+            with lock_tokens:
+                tokens[usuario] = resposta.get_json()['access_token']
+        return resposta
+
+    resultados['login'] = _executar_cenario(
+        app, contador, 'login', args.requisicoes, args.threads, login
+    )
+
+    if tokens:
+        lista_tokens = list(tokens.values())
+        resultados['usuario_me'] = _executar_cenario(
+            app, contador, 'usuario_me', args.requisicoes, args.threads,
+            lambda client, i: client.get('/api/users/me', headers={
+                'Authorization': f'Bearer {lista_tokens[i % len(lista_tokens)]}'
+            })
+        )
+    return resultados
+
+
+def _engine(app):
+    from src.models.user import db
+    with app.app_context():
+        return db.engine
+
+
+def _comparar(resultados, baseline, tolerancia):
+    """Retorna a lista de regressões em relação ao baseline."""
+    regressoes = []
+    for cenario, atual in resultados.items():
+        base = baseline.get(cenario)
+        if not base:
+            continue
+        for metrica in ('p95_ms', 'p99_ms'):
+            if atual[metrica] > base[metrica] * (1 + tolerancia):
+                regressoes.append(f'{cenario}: {metrica} {base[metrica]} -> {atual[metrica]}')
+        if atual['rps'] < base['rps'] * (1 - tolerancia):
+            regressoes.append(f"{cenario}: rps {base['rps']} -> {atual['rps']}")
+        if atual['consultas_por_requisicao'] > base['consultas_por_requisicao'] + 0.5:
+            regressoes.append(
+                f"{cenario}: consultas/req {base['consultas_por_requisicao']} -> {atual['consultas_por_requisicao']}"
+            )
+    return regressoes
+
+
+def main():
+    args = _parse_args()
+    sys.path.insert(0, RAIZ)
+
+    if not args.reusar_banco:
+        for sufixo in ('', '-wal', '-shm'):
+            if os.path.exists(args.banco + sufixo):
+                os.remove(args.banco + sufixo)
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(args.banco)}'
+    os.environ['STRIPE_WEBHOOK_SECRET'] = SEGREDO_WEBHOOK
+    os.environ.setdefault('STRIPE_SECRET_KEY', 'sk_test_benchmark')
+    os.environ.setdefault('JWT_SECRET_KEY', 'chave-jwt-do-benchmark-com-32-bytes-ou-mais')
+
+    from benchmarks.stripe_falso import StripeFalso
+
+    with StripeFalso(latencia=args.latencia_stripe) as stripe_falso:
+        import stripe
+        stripe.api_base = stripe_falso.url
+
+        from src.main import create_app
+        from src.migracoes import migrar
+
+        app = create_app()
+        with app.app_context():
+            migrar()
+
+        if not args.reusar_banco:
+            print(f'Semeando {args.pedidos} pedidos em {args.banco}...')
+            inicio = time.perf_counter()
+            _semear(app, args)
+            print(f'Semente concluída em {time.perf_counter() - inicio:.1f}s')
+
+        resultados = _cenarios(app, args, stripe_falso)
+
+    print(f"\n{'cenário':<22}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'sql/req':>9}{'erros':>7}")
+    for cenario, r in resultados.items():
+        print(f"{cenario:<22}{r['rps']:>9}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}"
+              f"{r['consultas_por_requisicao']:>9}{r['erros']:>7}")
+
+    if args.saida:
+        with open(args.saida, 'w') as arquivo:
+            json.dump(resultados, arquivo, indent=2)
+
+    if args.salvar_baseline:
+        with open(args.baseline, 'w') as arquivo:
+            json.dump(resultados, arquivo, indent=2)
+        print(f'\nBaseline gravado em {args.baseline}')
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as arquivo:
+            regressoes = _comparar(resultados, json.load(arquivo), args.tolerancia)
+        if regressoes:
+            print('\nRegressões em relação ao baseline:')
+            for regressao in regressoes:
+                print(f'  - {regressao}')
+            return 1
+        print('\nSem regressões em relação ao baseline.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""Benchmark do tempo de subida de um worker até a primeira resposta.
+
+Uso (a partir da raiz do repositório):
+
+    python -m benchmarks.inicializacao                      # mede e compara
+    python -m benchmarks.inicializacao --salvar-baseline    # grava benchmarks/baseline_inicializacao.json
+
+Cada rodada é um processo Python novo, como um worker do gunicorn recém
+criado: importa src.main, chama create_app() e responde GET /api/esfihas/.
+O banco é migrado uma vez antes das rodadas, pois os workers não aplicam
+migrações. O comando sai com código 1 se o p50 piorar além da tolerância em
+relação ao baseline, ou se algum módulo pesado (ex.: stripe) for importado
+antes de ser usado.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PADRAO = os.path.join(RAIZ, 'benchmarks', 'baseline_inicializacao.json')
+MODULOS_PREGUICOSOS = ('stripe',)
+
+# Executado em cada processo filho; imprime os tempos em JSON
+RODADA = """
+import json, sys, time
+inicio = time.perf_counter()
+from src.main import create_app
+importado = time.perf_counter()
+app = create_app()
+criado = time.perf_counter()
+resposta = app.test_client().get('/api/esfihas/')
+fim = time.perf_counter()
+print(json.dumps({
+    'importacao_ms': (importado - inicio) * 1000,
+    'create_app_ms': (criado - importado) * 1000,
+    'primeira_requisicao_ms': (fim - criado) * 1000,
+    'total_ms': (fim - inicio) * 1000,
+    'status': resposta.status_code,
+    'modulos': [nome for nome in %r if nome in sys.modules],
+}))
+"""
+
+
+def _parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--banco', default=os.path.join(tempfile.gettempdir(), 'esfiharia_inicializacao.db'))
+    parser.add_argument('--rodadas', type=int, default=10)
+    parser.add_argument('--baseline', default=BASELINE_PADRAO)
+    parser.add_argument('--salvar-baseline', action='store_true')
+    parser.add_argument('--tolerancia', type=float, default=0.20, help='piora relativa aceita (0.20 = 20%%)')
+    return parser.parse_args()
+
+
+def _executar(ambiente, *argumentos):
+    resultado = subprocess.run(
+        [sys.executable, *argumentos], cwd=RAIZ, env=ambiente, capture_output=True, text=True, check=True
+    )
+    return resultado.stdout
+
+
+def _mediana(valores):
+    ordenados = sorted(valores)
+    meio = len(ordenados) // 2
+    return ordenados[meio] if len(ordenados) % 2 else (ordenados[meio - 1] + ordenados[meio]) / 2
+
+
+def main():
+    args = _parse_args()
+    for sufixo in ('', '-wal', '-shm'):
+        if os.path.exists(args.banco + sufixo):
+            os.remove(args.banco + sufixo)
+    ambiente = dict(os.environ, DATABASE_URL=f'sqlite:///{os.path.abspath(args.banco)}', PYTHONPATH=RAIZ)
+    _executar(ambiente, '-m', 'flask', '--app', 'src.main', 'migrar')
+
+    rodadas = [
+        json.loads(_executar(ambiente, '-c', RODADA % (MODULOS_PREGUICOSOS,)).strip().splitlines()[-1])
+        for _ in range(args.rodadas)
+    ]
+    resultados = {
+        metrica: round(_mediana([rodada[metrica] for rodada in rodadas]), 1)
+        for metrica in ('importacao_ms', 'create_app_ms', 'primeira_requisicao_ms', 'total_ms')
+    }
+    resultados['max_total_ms'] = round(max(rodada['total_ms'] for rodada in rodadas), 1)
+
+    print(f"{'métrica':<26}{'p50 ms':>10}")
+    for metrica in ('importacao_ms', 'create_app_ms', 'primeira_requisicao_ms', 'total_ms'):
+        print(f'{metrica:<26}{resultados[metrica]:>10}')
+    print(f"{'max_total_ms':<26}{resultados['max_total_ms']:>10}")
+
+    problemas = []
+    if any(rodada['status'] != 200 for rodada in rodadas):
+        problemas.append('GET /api/esfihas/ não respondeu 200 em todas as rodadas')
+    importados = sorted({nome for rodada in rodadas for nome in rodada['modulos']})
+    if importados:
+        problemas.append(f"módulos importados na subida: {', '.join(importados)}")
+
+    if args.salvar_baseline and not problemas:
+        with open(args.baseline, 'w') as arquivo:
+            json.dump(resultados, arquivo, indent=2)
+        print(f'\nBaseline gravado em {args.baseline}')
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as arquivo:
+            baseline = json.load(arquivo)
+        for metrica in ('total_ms', 'primeira_requisicao_ms'):
+            if resultados[metrica] > baseline[metrica] * (1 + args.tolerancia):
+                problemas.append(f'{metrica}: {baseline[metrica]} -> {resultados[metrica]}')
+
+    if problemas:
+        print('\nProblemas na inicialização:')
+        for problema in problemas:
+            print(f'  - {problema}')
+        return 1
+    print('\nInicialização OK.')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+"""Servidor HTTP local que imita os endpoints do Stripe usados pela aplicação.
+
+Usado pelos benchmarks para que a criação de Payment Intents não dependa da
+rede nem de uma conta real. A latência de cada chamada é configurável para
+simular o tempo de resposta do provedor.
+"""
+import hashlib
+import hmac
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # Keep-alive, como o Stripe real
+    contador = itertools.count(1)
+
+    def log_message(self, *args):
+        pass
+
+    def _responder(self, status, corpo):
+        dados = json.dumps(corpo).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def do_POST(self):
+        tamanho = int(self.headers.get('Content-Length') or 0)
+        parametros = {chave: valores[-1] for chave, valores in parse_qs(self.rfile.read(tamanho).decode()).items()}
+        time.sleep(self.server.latencia)
+        with self.server.lock:
+            self.server.chamadas += 1
+
+        if self.path == '/v1/payment_intents':
+            intent_id = f'pi_falso_{next(self.contador)}'
+            metadata = {
+                chave[len('metadata['):-1]: valor
+                for chave, valor in parametros.items() if chave.startswith('metadata[')
+            }
+            return self._responder(200, {
+                'id': intent_id,
+                'object': 'payment_intent',
+                'amount': int(parametros.get('amount', 0)),
+                'currency': parametros.get('currency', 'brl'),
+                'client_secret': f'{intent_id}_secret_falso',
+                'status': 'requires_payment_method',
+                'metadata': metadata,
+            })
+        if self.path.startswith('/v1/payment_intents/') and self.path.endswith('/cancel'):
+            intent_id = self.path.split('/')[3]
+            return self._responder(200, {'id': intent_id, 'object': 'payment_intent', 'status': 'canceled'})
+        return self._responder(404, {'error': {'type': 'invalid_request_error', 'message': 'Rota não simulada'}})
+
+
+class StripeFalso:
+    """Sobe o servidor em uma thread; use `url` como stripe.api_base."""
+
+    def __init__(self, latencia=0.05, porta=0):
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', porta), _Handler)
+        self.servidor.daemon_threads = True
+        self.servidor.latencia = latencia
+        self.servidor.chamadas = 0
+        self.servidor.lock = threading.Lock()
+        self._thread = threading.Thread(target=self.servidor.serve_forever, name='stripe-falso', daemon=True)
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.servidor.server_address[1]}'
+
+    @property
+    def chamadas(self):
+        return self.servidor.chamadas
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+
+def evento_assinado(segredo, event_id, tipo, pedido_id, payment_intent_id):
+    """Monta o payload de um webhook e o cabeçalho Stripe-Signature válido para ele."""
+    payload = json.dumps({
+        'id': event_id,
+        'object': 'event',
+        'type': tipo,
+        'data': {'object': {
+            'id': payment_intent_id,
+            'object': 'payment_intent',
+            'metadata': {'pedido_id': str(pedido_id)},
+        }},
+    })
+    timestamp = int(time.time())
+    assinatura = hmac.new(segredo.encode(), f'{timestamp}.{payload}'.encode(), hashlib.sha256).hexdigest()
+    return payload, f't={timestamp},v1={assinatura}'
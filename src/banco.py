@@ -0,0 +1,82 @@
+import os
+
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+
+from src.models.user import db
+
+URL_PADRAO = 'sqlite:///esfiharia.db'  # Usar SQLite para simplicidade
+
+
+def _normalizar_url(url):
+    """Garante o driver PyMySQL para URLs MySQL sem driver explícito."""
+    if url.startswith('mysql://'):
+        return 'mysql+pymysql://' + url[len('mysql://'):]
+    return url
+
+
+def opcoes_engine(url, busy_timeout_ms=5000):
+    """Retorna as opções de create_engine adequadas ao backend da URL."""
+    backend = make_url(url).get_backend_name()
+    if backend == 'sqlite':
+        return {
+            'connect_args': {
+                # Os workers do outbox/webhook usam conexões em outras threads
+                'check_same_thread': False,
+                'timeout': busy_timeout_ms / 1000,
+            },
+        }
+    if backend == 'mysql':
+        return {
+            'pool_size': int(os.getenv('DB_POOL_SIZE', '10')),
+            'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '20')),
+            'pool_timeout': int(os.getenv('DB_POOL_TIMEOUT', '30')),
+            'pool_pre_ping': True,
+            # Reciclar antes do wait_timeout do servidor derrubar a conexão
+            'pool_recycle': int(os.getenv('DB_POOL_RECYCLE', '280')),
+        }
+    return {}
+
+
+def _pragmas_sqlite(app):
+    """Listener de conexão que aplica os PRAGMAs de desempenho do SQLite."""
+    pragmas = [
+        f"PRAGMA busy_timeout={app.config['SQLITE_BUSY_TIMEOUT_MS']}",
+        f"PRAGMA synchronous={app.config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA mmap_size={app.config['SQLITE_MMAP_SIZE']}",
+        'PRAGMA temp_store=MEMORY',
+    ]
+
+    def ao_conectar(conexao_dbapi, registro):
+        cursor = conexao_dbapi.cursor()
+        try:
+            # WAL permite leituras concorrentes com um escritor; é persistente
+            # no arquivo, mas não se aplica a bancos em memória
+            cursor.execute(f"PRAGMA journal_mode={app.config['SQLITE_JOURNAL_MODE']}")
+            for pragma in pragmas:
+                cursor.execute(pragma)
+        finally:
+            cursor.close()
+
+    return ao_conectar
+
+
+def init_banco(app):
+    """Configura a URL e o engine do banco a partir do ambiente e inicializa o SQLAlchemy.
+
+    DATABASE_URL seleciona o backend (SQLite por padrão, ou mysql+pymysql://...).
+    """
+    url = _normalizar_url(app.config.get('SQLALCHEMY_DATABASE_URI') or os.getenv('DATABASE_URL', URL_PADRAO))
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config.setdefault('SQLALCHEMY_TRACK_MODIFICATIONS', False)
+    app.config.setdefault('SQLITE_JOURNAL_MODE', os.getenv('SQLITE_JOURNAL_MODE', 'WAL'))
+    app.config.setdefault('SQLITE_SYNCHRONOUS', os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL'))
+    app.config.setdefault('SQLITE_BUSY_TIMEOUT_MS', int(os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')))
+    app.config.setdefault('SQLITE_MMAP_SIZE', int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))))
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', opcoes_engine(url, app.config['SQLITE_BUSY_TIMEOUT_MS']))
+
+    db.init_app(app)
+
+    with app.app_context():
+        if db.engine.dialect.name == 'sqlite':
+            event.listen(db.engine, 'connect', _pragmas_sqlite(app))
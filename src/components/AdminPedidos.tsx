@@ -26,16 +26,22 @@ export function AdminPedidos() {
   const [carregando, setCarregando] = useState(true);
   const [erro, setErro] = useState<string | null>(null);
   const [filtroStatus, setFiltroStatus] = useState("todos");
+  const [proximoCursor, setProximoCursor] = useState<string | null>(null);
+  const [carregandoMais, setCarregandoMais] = useState(false);
 
   useEffect(() => {
     carregarPedidos();
-  }, []);
+  }, [filtroStatus]);
+
+  // O filtro de status é aplicado no servidor, que devolve os pedidos paginados
+  const filtros = () => (filtroStatus === "todos" ? {} : { status: filtroStatus });
 
   const carregarPedidos = async () => {
     try {
       setCarregando(true);
-      const data = await pedidoAPI.listarTodosAdmin();
-      setPedidos(data);
+      const pagina = await pedidoAPI.listarTodosAdmin(filtros());
+      setPedidos(pagina.pedidos);
+      setProximoCursor(pagina.proximoCursor);
       setErro(null);
     } catch (error: any) {
       console.error("Erro ao carregar pedidos:", error);
@@ -48,6 +54,25 @@ export function AdminPedidos() {
     }
   };
 
+  const carregarMais = async () => {
+    if (!proximoCursor) return;
+    try {
+      setCarregandoMais(true);
+      const pagina = await pedidoAPI.listarTodosAdmin({ ...filtros(), cursor: proximoCursor });
+      setPedidos((pedidosAtuais) => [...pedidosAtuais, ...pagina.pedidos]);
+      setProximoCursor(pagina.proximoCursor);
+      setErro(null);
+    } catch (error: any) {
+      console.error("Erro ao carregar mais pedidos:", error);
+      setErro(
+        error.message ||
+          "Não foi possível carregar mais pedidos. Tente novamente."
+      );
+    } finally {
+      setCarregandoMais(false);
+    }
+  };
+
   const atualizarStatus = async (id: number, novoStatus: string) => {
     if (typeof id !== "number") {
       console.error("ID inválido para atualizar status:", id);
@@ -106,6 +131,7 @@ export function AdminPedidos() {
     }
   };
 
+  // Mantém a lista coerente com o filtro depois de uma alteração de status local
   const pedidosFiltrados = filtroStatus === "todos"
       ? pedidos
       : pedidos.filter(pedido => pedido.status === filtroStatus);
@@ -228,6 +254,13 @@ export function AdminPedidos() {
               )}
             </TableBody>
           </Table>
+          {proximoCursor && (
+            <div className="flex justify-center mt-4">
+              <Button variant="outline" onClick={carregarMais} disabled={carregandoMais}>
+                {carregandoMais ? "Carregando..." : "Carregar mais"}
+              </Button>
+            </div>
+          )}
         </CardContent>
       </Card>
     </div>
@@ -16,7 +16,8 @@ const getAuthHeaders = (): HeadersInit => {
   return token ? { Authorization: `Bearer ${token}` } : {};
 };
 
-const apiFetch = async <T>(url: string, options: RequestInit = {}): Promise<T> => {
+// Retorna o corpo JSON completo (ex.: com 'paginacao'); apiFetch devolve só 'data'
+const apiFetchResposta = async <T>(url: string, options: RequestInit = {}): Promise<T> => {
   const response = await fetch(url, {
     ...options,
     headers: {
@@ -42,8 +43,12 @@ const apiFetch = async <T>(url: string, options: RequestInit = {}): Promise<T> =
     return undefined as T;
   }
 
-  const data = await response.json();
-  return data.data || data;
+  return response.json();
+};
+
+const apiFetch = async <T>(url: string, options: RequestInit = {}): Promise<T> => {
+  const data = await apiFetchResposta<any>(url, options);
+  return data === undefined ? (undefined as T) : data.data || data;
 };
 
 // --- Interfaces de Tipagem Atualizadas ---
@@ -110,9 +115,28 @@ export interface AuthResponse {
 }
 
 export interface PaymentIntentResponse {
-  client_secret: string;
   pedido_id: number;
   valor_total: number;
+  token_pagamento: string;
+  pagamento_url: string;
+}
+
+export interface PaginaPedidos {
+  pedidos: Pedido[];
+  proximoCursor: string | null;
+}
+
+export interface FiltrosPedidosAdmin {
+  status?: string; // Um ou mais status separados por vírgula
+  cursor?: string | null; // 'proximoCursor' da página anterior
+  limite?: number;
+}
+
+export interface PagamentoStatus {
+  pedido_id: number;
+  status: 'pendente' | 'processando' | 'concluido' | 'falhou';
+  client_secret: string | null;
+  tentativas: number;
 }
 
 // --- API de Autenticação ---
@@ -183,13 +207,19 @@ export const esfihaAPI = {
 // --- API de Pedidos Atualizada ---
 
 export const pedidoAPI = {
-  criarIntentPagamento: async (pedidoInput: PedidoInput): Promise<PaymentIntentResponse> => {
+  // Reenvie a mesma chaveIdempotencia (ex.: crypto.randomUUID() por checkout) ao repetir a chamada
+  criarIntentPagamento: async (pedidoInput: PedidoInput, chaveIdempotencia?: string): Promise<PaymentIntentResponse> => {
     return apiFetch<PaymentIntentResponse>(`${API_BASE_URL}/pedidos/criar-intent-pagamento`, {
       method: "POST",
       body: JSON.stringify(pedidoInput),
+      headers: chaveIdempotencia ? { "Idempotency-Key": chaveIdempotencia } : {},
     });
   },
 
+  obterPagamento: async (pedidoId: number, token: string): Promise<PagamentoStatus> => {
+    return apiFetch<PagamentoStatus>(`${API_BASE_URL}/pedidos/pagamento/${pedidoId}?token=${encodeURIComponent(token)}`);
+  },
+
   listarMeusPedidos: async (): Promise<Pedido[]> => {
     return apiFetch<Pedido[]>(`${API_BASE_URL}/pedidos/me`);
   },
@@ -205,8 +235,17 @@ export const pedidoAPI = {
   },
 
   // --- Funções Admin ---
-  listarTodosAdmin: async (): Promise<Pedido[]> => {
-    return apiFetch<Pedido[]>(`${API_BASE_URL}/pedidos/admin`);
+  // Uma página da listagem do admin (mais recentes primeiro); siga proximoCursor para as seguintes
+  listarTodosAdmin: async (filtros: FiltrosPedidosAdmin = {}): Promise<PaginaPedidos> => {
+    const params = new URLSearchParams();
+    if (filtros.status) params.set("status", filtros.status);
+    if (filtros.cursor) params.set("cursor", filtros.cursor);
+    if (filtros.limite) params.set("limite", String(filtros.limite));
+    const query = params.toString();
+    const resposta = await apiFetchResposta<{ data: Pedido[]; paginacao: { proximo_cursor: string | null } }>(
+      `${API_BASE_URL}/pedidos/admin${query ? `?${query}` : ""}`
+    );
+    return { pedidos: resposta.data, proximoCursor: resposta.paginacao.proximo_cursor };
   },
 
   obterAdmin: async (id: number): Promise<Pedido> => {
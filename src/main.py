@@ -1,59 +1,157 @@
 
 import os
 import sys
+import threading
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory, jsonify
+from flask import Flask, jsonify, request
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager  # Importar JWTManager
 from src.models.user import db
+from src.banco import init_banco
+from src.migracoes import migrar, verificar_planos
+from src.services import relatorios
+from src.services.arquivamento import arquivador_pedidos
+from src.services.cache_usuarios import cache_identidades
+from src.services.cliente_stripe import cliente_stripe
+from src.services.estaticos import ManifestoEstaticos
+from src.services.eventos_pedido import sincronizador_pedidos
+from src.services.fila_cozinha import fila_cozinha
+from src.services.metricas import metricas
 from src.routes.user import user_bp
 from src.routes.esfiha import esfiha_bp
 from src.routes.pedido import pedido_bp
+from src.services.eventos_stripe import consumidor_eventos_stripe
+from src.services.pagamento_outbox import despachante_pagamentos
+from src.services.pedidos_abandonados import coletor_pedidos_abandonados
 
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-CORS(app)  # Habilitar CORS para todas as rotas
-
-# Configurações
-app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'asdf#FGSgvasgf$5$WGT') # Usar variável de ambiente ou default
-app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'super-secret-jwt-key') # Chave para JWT
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///esfiharia.db'  # Usar SQLite para simplicidade
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# Inicializar extensões
-db.init_app(app)
-jwt = JWTManager(app) # Inicializar JWTManager
-
-# Registrar Blueprints
-app.register_blueprint(user_bp, url_prefix='/api/users')
-app.register_blueprint(esfiha_bp, url_prefix='/api/esfihas')
-app.register_blueprint(pedido_bp, url_prefix='/api/pedidos')
-
-# Criar tabelas do banco de dados se não existirem
-with app.app_context():
-    db.create_all()
-
-# Rota para servir o frontend React (build)
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
-def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
-            return jsonify({"error": "Static folder not configured"}), 404
-
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        # Serve arquivos específicos (js, css, imagens, etc.)
-        return send_from_directory(static_folder_path, path)
-    else:
-        # Serve o index.html para qualquer outra rota (SPA behavior)
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
+
+def _iniciar_servicos():
+    """Inicia as threads de fundo no processo atual.
+
+    Chamado no primeiro request de cada processo: com `gunicorn --preload` o
+    app é criado no processo mestre e as threads iniciadas antes do fork não
+    existiriam nos workers. As tarefas usam UPDATEs condicionais, então vários
+    workers podem rodá-las ao mesmo tempo.
+    """
+    despachante_pagamentos.iniciar_varredura()
+    consumidor_eventos_stripe.iniciar()
+    arquivador_pedidos.iniciar()
+    coletor_pedidos_abandonados.iniciar()
+    sincronizador_pedidos.iniciar()
+    fila_cozinha.iniciar()
+
+
+def _registrar_comandos(app):
+    @app.cli.command('migrar')
+    def migrar_comando():
+        """Aplica as migrações pendentes do banco (cria as tabelas em bancos novos)."""
+        aplicadas = migrar()
+        print(f"Migrações aplicadas: {', '.join(aplicadas) if aplicadas else 'nenhuma'}")
+
+    @app.cli.command('verificar-planos')
+    def verificar_planos_comando():
+        """Falha se alguma consulta quente fizer varredura completa de tabela."""
+        problemas = verificar_planos()
+        for nome, plano in problemas.items():
+            print(f"{nome}:\n  " + "\n  ".join(plano))
+        if problemas:
+            raise SystemExit(1)
+        print("Planos de consulta OK")
+
+    @app.cli.command('backfill-relatorios')
+    def backfill_relatorios_comando():
+        """Reconstrói a tabela de vendas diárias a partir dos pedidos existentes."""
+        linhas = relatorios.recalcular()
+        print(f"Vendas diárias recalculadas: {linhas} linhas")
+
+    @app.cli.command('arquivar-pedidos')
+    def arquivar_pedidos_comando():
+        """Arquiva agora os pedidos finalizados mais antigos que ARQUIVO_IDADE_DIAS."""
+        print(f"Pedidos arquivados: {arquivador_pedidos.arquivar()}")
+
+
+def create_app(config=None):
+    """Cria o app Flask.
+
+    Não toca no banco: as migrações rodam uma vez por deploy com `flask migrar`,
+    e não a cada worker. Em produção: gunicorn --preload 'src.main:create_app()'.
+    """
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+    CORS(app)  # Habilitar CORS para todas as rotas
+
+    # Configurações
+    app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'asdf#FGSgvasgf$5$WGT') # Usar variável de ambiente ou default
+    app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'super-secret-jwt-key') # Chave para JWT
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # Banco definido por DATABASE_URL (padrão: sqlite:///esfiharia.db); ver src/banco.py
+    if config:
+        app.config.update(config)
+    # Os testes desligam as threads de fundo e chamam os serviços diretamente
+    app.config.setdefault('INICIAR_SERVICOS', os.getenv('INICIAR_SERVICOS', '1') == '1')
+
+    # Inicializar extensões
+    init_banco(app) # Engine com PRAGMAs do SQLite (WAL) ou pool do MySQL
+    JWTManager(app) # Inicializar JWTManager
+    cliente_stripe.init_app(app) # O SDK do Stripe só é importado no primeiro uso
+    despachante_pagamentos.init_app(app) # Pool de workers que cria os Payment Intents do outbox
+    consumidor_eventos_stripe.init_app(app) # Aplica em lotes os eventos gravados pelo webhook
+    arquivador_pedidos.init_app(app) # Move pedidos finalizados antigos para as tabelas de arquivo
+    coletor_pedidos_abandonados.init_app(app) # Cancela pedidos com pagamento abandonado e seus intents
+    sincronizador_pedidos.init_app(app) # Leva aos feeds SSE as mudanças feitas por outros workers
+    fila_cozinha.init_app(app) # Índice em memória dos pedidos em andamento, montado ao iniciar os serviços
+    metricas.init_app(app) # Latência por rota, SQL por request e chamadas ao Stripe em /metrics
+    metricas.registrar_estatisticas('esfiharia_cache_identidades', cache_identidades.estatisticas,
+                                    contadores=('acertos', 'falhas', 'remocoes'))
+    metricas.registrar_estatisticas('esfiharia_pedidos_abandonados', coletor_pedidos_abandonados.estatisticas,
+                                    contadores=('execucoes', 'pedidos_cancelados', 'intents_cancelados', 'intents_com_erro',
+                                               'pedidos_restaurados'))
+
+    # Registrar Blueprints
+    app.register_blueprint(user_bp, url_prefix='/api/users')
+    app.register_blueprint(esfiha_bp, url_prefix='/api/esfihas')
+    app.register_blueprint(pedido_bp, url_prefix='/api/pedidos')
+
+    _registrar_comandos(app)
+
+    processo_com_servicos = None
+    lock_servicos = threading.Lock()
+
+    @app.before_request
+    def iniciar_servicos():
+        nonlocal processo_com_servicos
+        if app.config['INICIAR_SERVICOS'] and processo_com_servicos != os.getpid():
+            with lock_servicos:
+                if processo_com_servicos != os.getpid():
+                    _iniciar_servicos()
+                    processo_com_servicos = os.getpid()
+
+    # Manifesto do build do frontend, carregado em memória uma vez (com variantes gzip/brotli)
+    estaticos = ManifestoEstaticos(app.static_folder)
+
+    # Rota para servir o frontend React (build)
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        if app.static_folder is None:
+                return jsonify({"error": "Static folder not configured"}), 404
+
+        if path != "" and path in estaticos:
+            # Serve arquivos específicos (js, css, imagens, etc.)
+            return estaticos.servir(path, request)
+        elif 'index.html' in estaticos:
+            # Serve o index.html para qualquer outra rota (SPA behavior)
+            return estaticos.servir('index.html', request)
         else:
             return jsonify({"error": "index.html not found"}), 404
 
+    return app
+
+
 if __name__ == '__main__':
     # Usar Gunicorn ou outro WSGI server em produção
+    app = create_app()
+    with app.app_context():
+        migrar() # Conveniência do servidor de desenvolvimento; em produção use `flask migrar`
     app.run(host='0.0.0.0', port=5000, debug=True) # Debug True apenas para desenvolvimento
-
@@ -0,0 +1,359 @@
+import logging
+from datetime import datetime
+
+from sqlalchemy import (
+    Boolean, Column, Date, DateTime, Float, ForeignKey, Index, Integer, MetaData, String, Table, Text, func,
+    inspect, select, text,
+)
+from sqlalchemy.schema import CreateColumn, CreateTable
+
+from src.models.user import db
+from src.models.pedido import Pedido, ItemPedido
+from src.models.arquivo import PedidoArquivado, ItemPedidoArquivado
+from src.services.arquivamento import STATUS_FINAIS
+from src.services.exportacao_pedidos import consulta_exportacao
+from src.services.fila_cozinha import STATUS_ATIVOS
+
+logger = logging.getLogger(__name__)
+
+# Tabela de controle fora do db.Model, para não se misturar às tabelas da aplicação
+_metadata_controle = MetaData()
+tabela_migracoes = Table(
+    'schema_migracao', _metadata_controle,
+    Column('id', String(100), primary_key=True),
+    Column('aplicada_em', DateTime, nullable=False),
+)
+
+# Esquema congelado no momento de cada migração. Não usa os modelos: uma
+# migração já aplicada precisa criar sempre o mesmo esquema, mesmo depois que
+# os modelos mudarem. Mudanças novas entram como migrações novas no fim da lista.
+_esquema = MetaData()
+
+# 0001: tabelas existentes quando as migrações foram introduzidas
+_user = Table(
+    'user', _esquema,
+    Column('id', Integer, primary_key=True),
+    Column('username', String(80), unique=True, nullable=False),
+    Column('email', String(120), unique=True, nullable=False),
+    Column('password_hash', String(256), nullable=False),
+)
+_esfiha = Table(
+    'esfiha', _esquema,
+    Column('id', Integer, primary_key=True),
+    Column('nome', String(100), nullable=False),
+    Column('descricao', Text, nullable=True),
+    Column('preco', Float, nullable=False),
+    Column('categoria', String(50), nullable=True),
+    Column('disponivel', Boolean),
+    Column('imagem_url', String(255), nullable=True),
+    Column('data_criacao', DateTime),
+    Column('data_atualizacao', DateTime),
+)
+_pedido = Table(
+    'pedido', _esquema,
+    Column('id', Integer, primary_key=True),
+    Column('cliente_id', Integer, ForeignKey('user.id'), nullable=True),
+    Column('nome_cliente', String(100), nullable=False),
+    Column('telefone', String(20), nullable=False),
+    Column('endereco', Text, nullable=True),
+    Column('forma_entrega', String(20), nullable=False),
+    Column('status', String(30), nullable=False),
+    Column('valor_total', Float, nullable=False),
+    Column('observacoes', Text, nullable=True),
+    Column('data_criacao', DateTime),
+    Column('data_atualizacao', DateTime),
+    Column('stripe_payment_intent_id', String(255), nullable=True),
+)
+_item_pedido = Table(
+    'item_pedido', _esquema,
+    Column('id', Integer, primary_key=True),
+    Column('pedido_id', Integer, ForeignKey('pedido.id'), nullable=False),
+    Column('esfiha_id', Integer, ForeignKey('esfiha.id'), nullable=False),
+    Column('quantidade', Integer, nullable=False),
+    Column('preco_unitario', Float, nullable=False),
+    Column('observacoes', Text, nullable=True),
+)
+_pagamento_outbox = Table(
+    'pagamento_outbox', _esquema,
+    Column('id', Integer, primary_key=True),
+    Column('pedido_id', Integer, ForeignKey('pedido.id'), nullable=False, unique=True),
+    Column('status', String(20), nullable=False),
+    Column('token', String(64), nullable=False),
+    Column('tentativas', Integer, nullable=False),
+    Column('proxima_tentativa_em', DateTime, nullable=False),
+    Column('client_secret', String(255), nullable=True),
+    Column('ultimo_erro', Text, nullable=True),
+    Column('data_criacao', DateTime),
+    Column('data_atualizacao', DateTime),
+)
+_evento_stripe = Table(
+    'evento_stripe', _esquema,
+    Column('id', String(255), primary_key=True),
+    Column('tipo', String(100), nullable=False),
+    Column('payload', Text, nullable=False),
+    Column('status', String(20), nullable=False),
+    Column('resultado', String(255), nullable=True),
+    Column('data_recebimento', DateTime, nullable=False),
+    Column('data_processamento', DateTime, nullable=True),
+)
+
+# 0003
+_venda_diaria = Table(
+    'venda_diaria', _esquema,
+    Column('dia', Date, primary_key=True),
+    Column('esfiha_id', Integer, ForeignKey('esfiha.id'), primary_key=True),
+    Column('grupo_status', String(20), primary_key=True),
+    Column('quantidade', Integer, nullable=False),
+    Column('receita', Float, nullable=False),
+)
+
+# 0004
+_pedido_arquivado = Table(
+    'pedido_arquivado', _esquema,
+    Column('id', Integer, primary_key=True, autoincrement=False),
+    Column('cliente_id', Integer, nullable=True),
+    Column('nome_cliente', String(100), nullable=False),
+    Column('telefone', String(20), nullable=False),
+    Column('endereco', Text, nullable=True),
+    Column('forma_entrega', String(20), nullable=False),
+    Column('status', String(30), nullable=False),
+    Column('valor_total', Float, nullable=False),
+    Column('observacoes', Text, nullable=True),
+    Column('data_criacao', DateTime),
+    Column('data_atualizacao', DateTime),
+    Column('stripe_payment_intent_id', String(255), nullable=True),
+    Column('data_arquivamento', DateTime, nullable=False),
+)
+_item_pedido_arquivado = Table(
+    'item_pedido_arquivado', _esquema,
+    Column('id', Integer, primary_key=True, autoincrement=False),
+    Column('pedido_id', Integer, nullable=False),
+    Column('esfiha_id', Integer, nullable=False),
+    Column('quantidade', Integer, nullable=False),
+    Column('preco_unitario', Float, nullable=False),
+    Column('observacoes', Text, nullable=True),
+)
+
+# 0005
+_resposta_idempotente = Table(
+    'resposta_idempotente', _esquema,
+    Column('escopo', String(100), primary_key=True),
+    Column('chave', String(255), primary_key=True),
+    Column('hash_requisicao', String(64), nullable=False),
+    Column('status', String(20), nullable=False),
+    Column('codigo_http', Integer, nullable=True),
+    Column('corpo', Text, nullable=True),
+    Column('data_criacao', DateTime, nullable=False),
+    Column('expira_em', DateTime, nullable=False),
+)
+
+
+def _criar_tabelas(*tabelas, indices=()):
+    """Cria as tabelas (sem índices) e depois os índices informados, pulando os que já existem.
+
+    Os índices são sempre listados na migração que os introduz; CREATE TABLE
+    não cria nenhum, para uma migração nunca criar um índice de outra.
+    """
+    def migracao(conexao):
+        for tabela in tabelas:
+            if not inspect(conexao).has_table(tabela.name):
+                conexao.execute(CreateTable(tabela))
+        for indice in indices:
+            indice.create(conexao, checkfirst=True)
+    return migracao
+
+
+def _criar_indices(*indices):
+    return _criar_tabelas(indices=indices)
+
+
+def _adicionar_colunas(nome_tabela, *colunas):
+    """ALTER TABLE ... ADD COLUMN para cada coluna que a tabela ainda não tem."""
+    tabela = Table(nome_tabela, MetaData(), *colunas)
+
+    def migracao(conexao):
+        existentes = {coluna['name'] for coluna in inspect(conexao).get_columns(nome_tabela)}
+        nome = conexao.dialect.identifier_preparer.format_table(tabela)
+        for coluna in tabela.columns:
+            if coluna.name not in existentes:
+                definicao = CreateColumn(coluna).compile(dialect=conexao.dialect)
+                conexao.exec_driver_sql(f'ALTER TABLE {nome} ADD COLUMN {definicao}')
+    return migracao
+
+
+def _autoincremento_sqlite(*pares):
+    """Recria as tabelas (tabela, tabela_arquivo) com AUTOINCREMENT no SQLite.
+
+    Sem AUTOINCREMENT o SQLite devolve max(id) + 1, então ids de pedidos já
+    arquivados voltariam a ser usados. A tabela nova é copiada da estrutura
+    atual do banco (refletida, não dos modelos) e a sequência começa depois do
+    maior id das duas tabelas. Em outros bancos o AUTO_INCREMENT já não
+    reaproveita ids.
+    """
+    def migracao(conexao):
+        if conexao.dialect.name != 'sqlite':
+            return
+        for nome, nome_arquivo in pares:
+            sql_atual = conexao.execute(
+                text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :nome"), {'nome': nome}
+            ).scalar()
+            if 'AUTOINCREMENT' not in sql_atual.upper():
+                refletido = MetaData()
+                atual = Table(nome, refletido, autoload_with=conexao)
+                temporaria = f'{nome}_nova'
+                nova = atual.to_metadata(refletido, name=temporaria)
+                nova.dialect_kwargs['sqlite_autoincrement'] = True
+                colunas = ', '.join(coluna.name for coluna in atual.columns)
+                conexao.execute(CreateTable(nova))
+                conexao.exec_driver_sql(f'INSERT INTO {temporaria} ({colunas}) SELECT {colunas} FROM {nome}')
+                conexao.exec_driver_sql(f'DROP TABLE {nome}')
+                conexao.exec_driver_sql(f'ALTER TABLE {temporaria} RENAME TO {nome}')
+                for indice in atual.indexes:
+                    indice.create(conexao)
+
+            maior_id = max(
+                conexao.exec_driver_sql(f'SELECT COALESCE(MAX(id), 0) FROM {tabela}').scalar()
+                for tabela in (nome, nome_arquivo)
+            )
+            conexao.execute(text('DELETE FROM sqlite_sequence WHERE name = :nome'), {'nome': nome})
+            conexao.execute(
+                text('INSERT INTO sqlite_sequence (name, seq) VALUES (:nome, :seq)'),
+                {'nome': nome, 'seq': maior_id}
+            )
+    return migracao
+
+
+# Migrações em ordem de aplicação; ids e conteúdo das já aplicadas nunca devem ser alterados
+MIGRACOES = [
+    ('0001_schema_inicial', _criar_tabelas(
+        _user, _esfiha, _pedido, _item_pedido, _pagamento_outbox, _evento_stripe,
+        indices=(
+            Index('ix_pedido_stripe_payment_intent_id', _pedido.c.stripe_payment_intent_id),
+            Index('ix_pagamento_outbox_status_proxima',
+                  _pagamento_outbox.c.status, _pagamento_outbox.c.proxima_tentativa_em),
+            Index('ix_evento_stripe_status_recebimento', _evento_stripe.c.status, _evento_stripe.c.data_recebimento),
+        ),
+    )),
+    ('0002_indices_pedidos', _criar_indices(
+        Index('ix_pedido_data_criacao', _pedido.c.data_criacao),
+        Index('ix_pedido_cliente_data', _pedido.c.cliente_id, _pedido.c.data_criacao),
+        Index('ix_pedido_status_data', _pedido.c.status, _pedido.c.data_criacao),
+        Index('ix_item_pedido_pedido_id', _item_pedido.c.pedido_id),
+    )),
+    ('0003_venda_diaria', _criar_tabelas(_venda_diaria)),
+    ('0004_arquivo_pedidos', _criar_tabelas(
+        _pedido_arquivado, _item_pedido_arquivado,
+        indices=(
+            Index('ix_pedido_arquivado_data_criacao', _pedido_arquivado.c.data_criacao),
+            Index('ix_pedido_arquivado_cliente_data', _pedido_arquivado.c.cliente_id, _pedido_arquivado.c.data_criacao),
+            Index('ix_item_pedido_arquivado_pedido_id', _item_pedido_arquivado.c.pedido_id),
+        ),
+    )),
+    ('0005_resposta_idempotente', _criar_tabelas(
+        _resposta_idempotente,
+        indices=(Index('ix_resposta_idempotente_expira_em', _resposta_idempotente.c.expira_em),),
+    )),
+    ('0006_indices_sincronizacao', _criar_indices(
+        Index('ix_pedido_cliente_atualizacao', _pedido.c.cliente_id, _pedido.c.data_atualizacao),
+        Index('ix_pedido_arquivado_cliente_atualizacao',
+              _pedido_arquivado.c.cliente_id, _pedido_arquivado.c.data_atualizacao),
+    )),
+    ('0007_indice_pedido_atualizacao', _criar_indices(Index('ix_pedido_data_atualizacao', _pedido.c.data_atualizacao))),
+    ('0008_ids_sem_reuso', _autoincremento_sqlite(
+        ('pedido', 'pedido_arquivado'),
+        ('item_pedido', 'item_pedido_arquivado'),
+    )),
+    ('0009_tentativas_evento_stripe', _adicionar_colunas(
+        'evento_stripe',
+        Column('tentativas', Integer, nullable=False, server_default='0'),
+        Column('ultimo_erro', Text, nullable=True),
+    )),
+]
+
+
+def migrar():
+    """Aplica as migrações pendentes, cada uma em sua própria transação. Retorna os ids aplicados."""
+    aplicadas = []
+    with db.engine.begin() as conexao:
+        tabela_migracoes.create(conexao, checkfirst=True)
+        ja_aplicadas = set(conexao.execute(select(tabela_migracoes.c.id)).scalars())
+
+    for id_migracao, migracao in MIGRACOES:
+        if id_migracao in ja_aplicadas:
+            continue
+        with db.engine.begin() as conexao:
+            migracao(conexao)
+            conexao.execute(tabela_migracoes.insert().values(id=id_migracao, aplicada_em=datetime.utcnow()))
+        logger.info('Migração aplicada: %s', id_migracao)
+        aplicadas.append(id_migracao)
+    return aplicadas
+
+
+def _consultas_quentes():
+    """Consultas das rotas mais acessadas, usadas para verificar os planos de execução.
+
+    Retorna {nome: (consulta, aceita_varredura_de_indice)}; só a listagem do
+    admin e a exportação, que percorrem o índice em ordem, podem varrer um índice.
+    """
+    agora = datetime.utcnow()
+    return {
+        'listar_meus_pedidos': (Pedido.query.filter_by(cliente_id=1).order_by(Pedido.data_criacao.desc()), False),
+        'listar_meus_pedidos_arquivados': (PedidoArquivado.query.filter_by(cliente_id=1).order_by(
+            PedidoArquivado.data_criacao.desc()
+        ), False),
+        'sincronizar_meus_pedidos': (Pedido.query.filter(
+            Pedido.cliente_id == 1, Pedido.data_atualizacao > agora
+        ).order_by(Pedido.data_atualizacao), False),
+        'sincronizar_meus_pedidos_arquivados': (PedidoArquivado.query.filter(
+            PedidoArquivado.cliente_id == 1, PedidoArquivado.data_atualizacao > agora
+        ).order_by(PedidoArquivado.data_atualizacao), False),
+        'versao_meus_pedidos': (select(func.max(Pedido.data_atualizacao), func.count()).where(Pedido.cliente_id == 1), False),
+        'itens_arquivados': (ItemPedidoArquivado.query.filter(ItemPedidoArquivado.pedido_id.in_([1, 2, 3])), False),
+        'listar_todos_pedidos_admin': (
+            Pedido.query.order_by(Pedido.data_criacao.desc(), Pedido.id.desc()).limit(51), True
+        ),
+        'admin_filtro_status': (Pedido.query.filter(
+            Pedido.status == 'pendente', Pedido.data_criacao < agora
+        ).order_by(Pedido.data_criacao.desc()).limit(51), False),
+        'itens_do_pedido': (ItemPedido.query.filter(ItemPedido.pedido_id.in_([1, 2, 3])), False),
+        'pedido_por_payment_intent': (Pedido.query.filter_by(stripe_payment_intent_id='pi_x'), False),
+        'arquivar_pedidos': (Pedido.query.with_entities(Pedido.id).filter(
+            Pedido.status.in_(STATUS_FINAIS), Pedido.data_criacao < agora, Pedido.data_atualizacao < agora
+        ).limit(500), False),
+        'pedidos_abandonados': (Pedido.query.with_entities(Pedido.id).filter(
+            Pedido.status == 'pagamento_pendente', Pedido.data_criacao < agora
+        ).order_by(Pedido.data_criacao).limit(200), False),
+        'sincronizar_eventos_sse': (Pedido.query.with_entities(
+            Pedido.id, Pedido.cliente_id, Pedido.status, Pedido.data_atualizacao
+        ).filter(Pedido.data_atualizacao > agora).order_by(Pedido.data_atualizacao), False),
+        'fila_cozinha': (Pedido.query.filter(Pedido.status.in_(STATUS_ATIVOS)), False),
+        'exportar_pedidos': (consulta_exportacao([Pedido.data_criacao >= agora]), True),
+        'exportar_pedidos_arquivados': (consulta_exportacao(
+            [PedidoArquivado.data_criacao >= agora], PedidoArquivado, ItemPedidoArquivado
+        ), True),
+    }
+
+
+def verificar_planos():
+    """Roda EXPLAIN QUERY PLAN nas consultas quentes (SQLite).
+
+    Retorna {nome: [linhas do plano]} apenas das consultas que fazem varredura
+    de tabela (ou de índice, quando não permitido) ou ordenação em B-tree temporária.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        raise RuntimeError('verificar_planos suporta apenas SQLite')
+
+    problemas = {}
+    for nome, (consulta, aceita_varredura_de_indice) in _consultas_quentes().items():
+        sql = str(getattr(consulta, 'statement', consulta).compile(db.engine, compile_kwargs={'literal_binds': True}))
+        plano = [linha[-1] for linha in db.session.execute(text(f'EXPLAIN QUERY PLAN {sql}'))]
+        ruins = [
+            linha for linha in plano
+            if 'TEMP B-TREE' in linha or (
+                linha.startswith('SCAN ')
+                and not (aceita_varredura_de_indice and ' USING ' in linha)
+            )
+        ]
+        if ruins:
+            problemas[nome] = plano
+    return problemas
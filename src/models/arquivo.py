@@ -0,0 +1,46 @@
+from src.models.user import db
+from datetime import datetime
+
+class PedidoArquivado(db.Model):
+    """Pedido em status final movido de `pedido` pelo arquivador (src/services/arquivamento.py).
+
+    Mantém o id e as colunas originais, para que as rotas de histórico leiam as
+    duas tabelas com o mesmo serializador.
+    """
+    __tablename__ = 'pedido_arquivado'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    cliente_id = db.Column(db.Integer, nullable=True)
+    nome_cliente = db.Column(db.String(100), nullable=False)
+    telefone = db.Column(db.String(20), nullable=False)
+    endereco = db.Column(db.Text, nullable=True)
+    forma_entrega = db.Column(db.String(20), nullable=False)
+    status = db.Column(db.String(30), nullable=False)
+    valor_total = db.Column(db.Float, nullable=False)
+    observacoes = db.Column(db.Text, nullable=True)
+    data_criacao = db.Column(db.DateTime)
+    data_atualizacao = db.Column(db.DateTime)
+    stripe_payment_intent_id = db.Column(db.String(255), nullable=True)
+    data_arquivamento = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_pedido_arquivado_data_criacao', 'data_criacao'), # Exportação
+        db.Index('ix_pedido_arquivado_cliente_data', 'cliente_id', 'data_criacao'), # Histórico do cliente
+        db.Index('ix_pedido_arquivado_cliente_atualizacao', 'cliente_id', 'data_atualizacao'), # Sincronização do cliente
+    )
+
+    def __repr__(self):
+        return f'<PedidoArquivado {self.id}>'
+
+class ItemPedidoArquivado(db.Model):
+    __tablename__ = 'item_pedido_arquivado'
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    pedido_id = db.Column(db.Integer, nullable=False, index=True)
+    esfiha_id = db.Column(db.Integer, nullable=False)
+    quantidade = db.Column(db.Integer, nullable=False, default=1)
+    preco_unitario = db.Column(db.Float, nullable=False)
+    observacoes = db.Column(db.Text, nullable=True)
+
+    def __repr__(self):
+        return f'<ItemPedidoArquivado {self.id}>'
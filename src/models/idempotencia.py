@@ -0,0 +1,27 @@
+from src.models.user import db
+from datetime import datetime
+
+class StatusIdempotencia:
+    PROCESSANDO = 'processando'
+    CONCLUIDO = 'concluido'
+
+class RespostaIdempotente(db.Model):
+    """Resposta guardada de um request enviado com o cabeçalho Idempotency-Key.
+
+    A linha é criada como 'processando' antes de executar a rota e recebe o
+    status HTTP e o corpo da resposta ao final; repetições com a mesma chave
+    recebem essa resposta até `expira_em` (ver src/services/idempotencia.py).
+    """
+    __tablename__ = 'resposta_idempotente'
+
+    escopo = db.Column(db.String(100), primary_key=True) # Rota + usuário, para chaves de clientes diferentes não colidirem
+    chave = db.Column(db.String(255), primary_key=True)
+    hash_requisicao = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.String(20), default=StatusIdempotencia.PROCESSANDO, nullable=False)
+    codigo_http = db.Column(db.Integer, nullable=True)
+    corpo = db.Column(db.Text, nullable=True)
+    data_criacao = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    expira_em = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __repr__(self):
+        return f'<RespostaIdempotente {self.escopo} {self.chave}>'
@@ -0,0 +1,70 @@
+from src.models.user import db
+from datetime import datetime
+
+class StatusOutbox:
+    PENDENTE = 'pendente'
+    PROCESSANDO = 'processando'
+    CONCLUIDO = 'concluido'
+    FALHOU = 'falhou'
+
+class PagamentoOutbox(db.Model):
+    """Pedido de criação de Payment Intent aguardando envio ao Stripe.
+
+    A linha é gravada na mesma transação do Pedido; o Stripe só é chamado
+    depois do commit, pelos workers de src/services/pagamento_outbox.py.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    pedido_id = db.Column(db.Integer, db.ForeignKey('pedido.id'), nullable=False, unique=True)
+    status = db.Column(db.String(20), default=StatusOutbox.PENDENTE, nullable=False)
+    token = db.Column(db.String(64), nullable=False) # Autoriza a consulta do client_secret pelo cliente
+    tentativas = db.Column(db.Integer, default=0, nullable=False)
+    proxima_tentativa_em = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    client_secret = db.Column(db.String(255), nullable=True)
+    ultimo_erro = db.Column(db.Text, nullable=True)
+    data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
+    data_atualizacao = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_pagamento_outbox_status_proxima', 'status', 'proxima_tentativa_em'),
+    )
+
+    pedido = db.relationship('Pedido', backref=db.backref('pagamento_outbox', uselist=False))
+
+    def __repr__(self):
+        return f'<PagamentoOutbox {self.pedido_id} {self.status}>'
+
+    def to_dict(self):
+        return {
+            'pedido_id': self.pedido_id,
+            'status': self.status,
+            'client_secret': self.client_secret if self.status == StatusOutbox.CONCLUIDO else None,
+            'tentativas': self.tentativas
+        }
+
+class StatusEvento:
+    RECEBIDO = 'recebido'
+    PROCESSADO = 'processado'
+    FALHOU = 'falhou' # Falhou em todas as tentativas; volta para 'recebido' para reprocessar
+
+class EventoStripe(db.Model):
+    """Evento de webhook do Stripe já verificado, gravado antes de ser aplicado.
+
+    A chave primária é o id do evento no Stripe, então reentregas são
+    descartadas na inserção.
+    """
+    id = db.Column(db.String(255), primary_key=True)
+    tipo = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), default=StatusEvento.RECEBIDO, nullable=False)
+    resultado = db.Column(db.String(255), nullable=True)
+    data_recebimento = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    data_processamento = db.Column(db.DateTime, nullable=True)
+    tentativas = db.Column(db.Integer, default=0, nullable=False) # Falhas ao aplicar o evento
+    ultimo_erro = db.Column(db.Text, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_evento_stripe_status_recebimento', 'status', 'data_recebimento'),
+    )
+
+    def __repr__(self):
+        return f'<EventoStripe {self.id} {self.tipo}>'
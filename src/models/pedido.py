@@ -15,9 +15,39 @@ class StatusPedido:
     CANCELADO = 'cancelado'
     FALHA_PAGAMENTO = 'falha_pagamento' # Novo status
 
+    @staticmethod
+    def transicoes():
+        """Máquina de estados: status -> status para os quais o admin pode levar o pedido.
+
+        As transições de pagamento ficam com os eventos do Stripe
+        (`TRANSICOES_EVENTO` em src/services/eventos_stripe.py): de
+        `pagamento_pendente` e `falha_pagamento` o admin só pode cancelar.
+        """
+        S = StatusPedido
+        return {
+            S.PAGAMENTO_PENDENTE: {S.CANCELADO},
+            S.PENDENTE: {S.APROVADO, S.RECUSADO, S.EM_PREPARACAO, S.CANCELADO},
+            S.APROVADO: {S.EM_PREPARACAO, S.CANCELADO},
+            S.EM_PREPARACAO: {S.A_CAMINHO, S.PRONTO_RETIRADA, S.CANCELADO},
+            S.A_CAMINHO: {S.ENTREGUE},
+            S.PRONTO_RETIRADA: {S.ENTREGUE},
+            S.FALHA_PAGAMENTO: {S.CANCELADO},
+            S.ENTREGUE: set(),
+            S.RECUSADO: set(),
+            S.CANCELADO: set(),
+        }
+
+    @staticmethod
+    def origens(destino):
+        """Status a partir dos quais é permitido ir para `destino`."""
+        return {origem for origem, destinos in StatusPedido.transicoes().items() if destino in destinos}
+
 class ItemPedido(db.Model):
+    # AUTOINCREMENT: ids de itens arquivados nunca são reaproveitados (ver src/migracoes.py)
+    __table_args__ = {'sqlite_autoincrement': True}
+
     id = db.Column(db.Integer, primary_key=True)
-    pedido_id = db.Column(db.Integer, db.ForeignKey('pedido.id'), nullable=False)
+    pedido_id = db.Column(db.Integer, db.ForeignKey('pedido.id'), nullable=False, index=True)
     esfiha_id = db.Column(db.Integer, db.ForeignKey('esfiha.id'), nullable=False)
     quantidade = db.Column(db.Integer, nullable=False, default=1)
     preco_unitario = db.Column(db.Float, nullable=False)
@@ -54,6 +84,17 @@ class Pedido(db.Model):
     data_atualizacao = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     stripe_payment_intent_id = db.Column(db.String(255), nullable=True, index=True) # ID do Payment Intent do Stripe
 
+    # Índices das consultas quentes (ver src/migracoes.py)
+    __table_args__ = (
+        db.Index('ix_pedido_data_criacao', 'data_criacao'), # Listagem do admin
+        db.Index('ix_pedido_cliente_data', 'cliente_id', 'data_criacao'), # Pedidos do cliente
+        db.Index('ix_pedido_status_data', 'status', 'data_criacao'), # Filtro por status
+        db.Index('ix_pedido_cliente_atualizacao', 'cliente_id', 'data_atualizacao'), # Sincronização do cliente (ETag e since)
+        db.Index('ix_pedido_data_atualizacao', 'data_atualizacao'), # Eventos SSE entre processos
+        # AUTOINCREMENT: o arquivador apaga pedidos, e o SQLite reaproveitaria os maiores ids
+        {'sqlite_autoincrement': True},
+    )
+
     cliente = db.relationship('User', backref='pedidos')
     itens = db.relationship('ItemPedido', backref='pedido', cascade='all, delete-orphan')
 
@@ -0,0 +1,16 @@
+from src.models.user import db
+
+class VendaDiaria(db.Model):
+    """Totais de vendas por dia do pedido, esfiha e grupo de status.
+
+    Mantida incrementalmente a cada mudança de status (src/services/relatorios.py);
+    pode ser reconstruída com 'flask backfill-relatorios'.
+    """
+    dia = db.Column(db.Date, primary_key=True)
+    esfiha_id = db.Column(db.Integer, db.ForeignKey('esfiha.id'), primary_key=True)
+    grupo_status = db.Column(db.String(20), primary_key=True) # pago, cancelado ou falha
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+    receita = db.Column(db.Float, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<VendaDiaria {self.dia} {self.esfiha_id} {self.grupo_status}>'
@@ -1,6 +1,6 @@
 
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
+from src.services.senhas import pool_senhas
 
 db = SQLAlchemy()
 
@@ -11,11 +11,15 @@ class User(db.Model):
     password_hash = db.Column(db.String(256), nullable=False) # Increased length for hash
     # Add other fields as needed, e.g., name, phone, address
 
+    # Hashing roda no pool de processos; levanta PoolSenhasSaturado se estiver cheio
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = pool_senhas.gerar_hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return pool_senhas.verificar(self.password_hash, password)
+
+    def precisa_rehash(self):
+        return pool_senhas.precisa_rehash(self.password_hash)
 
     def __repr__(self):
         return f'<User {self.username}>'
@@ -1,17 +1,36 @@
-from flask import Blueprint, request, jsonify
+import csv
+import io
+from datetime import datetime
+from flask import Blueprint, Response, current_app, request, jsonify
+from sqlalchemy import insert, update
 from src.models.user import db
 from src.models.esfiha import Esfiha
+from src.services.busca_cardapio import indice_busca
+from src.services.cache_cardapio import cache_cardapio
 
 esfiha_bp = Blueprint('esfiha', __name__)
 
+LIMITE_PADRAO_BUSCA = 20
+LIMITE_MAXIMO_BUSCA = 50
+
+def _resposta_cacheada(chave, construir_dados):
+    """Serve o JSON do cache do cardápio com ETag, respondendo 304 quando o cliente já o tem."""
+    def construir():
+        return current_app.json.dumps({
+            'status': 'success',
+            'data': construir_dados()
+        }).encode('utf-8')
+
+    corpo, etag = cache_cardapio.obter(chave, construir)
+    resposta = Response(corpo, status=200, mimetype='application/json')
+    resposta.set_etag(etag)
+    resposta.headers['Cache-Control'] = 'no-cache'
+    return resposta.make_conditional(request)
+
 @esfiha_bp.route('/', methods=['GET'])
 def listar_esfihas():
     """Lista todas as esfihas disponíveis"""
-    esfihas = Esfiha.query.all()
-    return jsonify({
-        'status': 'success',
-        'data': [esfiha.to_dict() for esfiha in esfihas]
-    }), 200
+    return _resposta_cacheada('esfihas', lambda: [esfiha.to_dict() for esfiha in Esfiha.query.all()])
 
 @esfiha_bp.route('/<int:id>', methods=['GET'])
 def obter_esfiha(id):
@@ -45,6 +64,7 @@ def criar_esfiha():
     
     db.session.add(nova_esfiha)
     db.session.commit()
+    cache_cardapio.invalidar()
     
     return jsonify({
         'status': 'success',
@@ -73,6 +93,7 @@ def atualizar_esfiha(id):
         esfiha.imagem_url = dados['imagem_url']
     
     db.session.commit()
+    cache_cardapio.invalidar()
     
     return jsonify({
         'status': 'success',
@@ -87,6 +108,7 @@ def excluir_esfiha(id):
     
     db.session.delete(esfiha)
     db.session.commit()
+    cache_cardapio.invalidar()
     
     return jsonify({
         'status': 'success',
@@ -96,12 +118,32 @@ def excluir_esfiha(id):
 @esfiha_bp.route('/categorias', methods=['GET'])
 def listar_categorias():
     """Lista todas as categorias de esfihas disponíveis"""
-    categorias = db.session.query(Esfiha.categoria).distinct().all()
-    lista_categorias = [categoria[0] for categoria in categorias if categoria[0]]
-    
+    def construir_categorias():
+        categorias = db.session.query(Esfiha.categoria).distinct().all()
+        return [categoria[0] for categoria in categorias if categoria[0]]
+
+    return _resposta_cacheada('categorias', construir_categorias)
+
+@esfiha_bp.route('/busca', methods=['GET'])
+def buscar_esfihas():
+    """Busca esfihas por nome, descrição e categoria, ignorando acentos e aceitando prefixos.
+
+    Parâmetros: q (obrigatório), pagina (padrão 1) e limite (padrão 20, máximo 50).
+    """
+    consulta = request.args.get('q', '').strip()
+    if not consulta:
+        return jsonify({'status': 'error', 'message': "Parâmetro 'q' é obrigatório"}), 400
+    try:
+        pagina = max(int(request.args.get('pagina', 1)), 1)
+        limite = min(max(int(request.args.get('limite', LIMITE_PADRAO_BUSCA)), 1), LIMITE_MAXIMO_BUSCA)
+    except ValueError:
+        return jsonify({'status': 'error', 'message': "'pagina' e 'limite' devem ser inteiros"}), 400
+
+    total, esfihas = indice_busca.buscar(consulta, limite=limite, deslocamento=(pagina - 1) * limite)
     return jsonify({
         'status': 'success',
-        'data': lista_categorias
+        'data': esfihas,
+        'paginacao': {'pagina': pagina, 'limite': limite, 'total': total}
     }), 200
 
 @esfiha_bp.route('/atualizar-preco/<int:id>', methods=['PATCH'])
@@ -123,6 +165,7 @@ def atualizar_preco(id):
         
         esfiha.preco = novo_preco
         db.session.commit()
+        cache_cardapio.invalidar()
         
         return jsonify({
             'status': 'success',
@@ -138,3 +181,174 @@ def atualizar_preco(id):
             'status': 'error',
             'message': str(e)
         }), 400
+
+# --- Operações em lote ---
+
+CAMPOS_ESFIHA = ('nome', 'descricao', 'preco', 'categoria', 'disponivel', 'imagem_url')
+VALORES_VERDADEIROS = ('1', 'true', 'sim', 's', 'yes')
+
+def _linhas_do_request():
+    """Lê as linhas do corpo como array JSON ou CSV (lido em streaming, com cabeçalho)."""
+    if request.mimetype == 'text/csv':
+        texto = io.TextIOWrapper(request.stream, encoding='utf-8-sig', newline='')
+        # Números de linha começam em 2 por causa do cabeçalho; células vazias são ignoradas
+        return (
+            (numero, {campo: valor for campo, valor in linha.items() if valor not in ('', None)})
+            for numero, linha in enumerate(csv.DictReader(texto), start=2)
+        )
+
+    dados = request.get_json(silent=True)
+    if not isinstance(dados, list):
+        raise ValueError('Envie um array JSON ou um CSV (Content-Type: text/csv)')
+    return enumerate(dados, start=1)
+
+def _preco(valor):
+    preco = float(valor)
+    if preco < 0:
+        raise ValueError("O preço não pode ser negativo")
+    return round(preco, 2)
+
+def _id_opcional(valor):
+    return int(valor) if valor not in (None, '') else None
+
+def _normalizar_esfiha(linha):
+    """Converte uma linha (JSON ou CSV) nos campos de Esfiha, levantando ValueError se inválida."""
+    if not isinstance(linha, dict):
+        raise ValueError('Linha deve ser um objeto')
+    valores = {campo: linha[campo] for campo in CAMPOS_ESFIHA if campo in linha and linha[campo] is not None}
+    if 'preco' in valores:
+        valores['preco'] = _preco(valores['preco'])
+    if isinstance(valores.get('disponivel'), str):
+        valores['disponivel'] = valores['disponivel'].strip().lower() in VALORES_VERDADEIROS
+    return _id_opcional(linha.get('id')), valores
+
+def _resposta_lote(aplicadas, erros, **contagens):
+    if erros:
+        return jsonify({
+            'status': 'error',
+            'message': 'Nenhuma alteração aplicada: corrija as linhas com erro',
+            'erros': erros
+        }), 400
+    return jsonify({
+        'status': 'success',
+        'message': f'{aplicadas} esfihas processadas',
+        'data': contagens
+    }), 200
+
+@esfiha_bp.route('/importar', methods=['POST'])
+def importar_esfihas():
+    """Cria ou atualiza esfihas em lote (array JSON ou CSV).
+
+    Linhas com 'id' atualizam a esfiha existente; sem 'id', atualizam a esfiha
+    de mesmo nome ou criam uma nova. Tudo é validado antes de gravar e aplicado
+    em uma única transação (nada é gravado se alguma linha tiver erro).
+    """
+    try:
+        linhas = list(_linhas_do_request())
+    except (ValueError, csv.Error) as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    erros = []
+    normalizadas = []
+    linha_por_nome = {}
+    for numero, linha in linhas:
+        try:
+            esfiha_id, valores = _normalizar_esfiha(linha)
+        except (TypeError, ValueError) as e:
+            erros.append({'linha': numero, 'erro': str(e)})
+            continue
+        nome = valores.get('nome') if isinstance(valores.get('nome'), str) else None
+        if nome and nome in linha_por_nome:
+            # Duas linhas com o mesmo nome criariam duplicatas ou se sobrescreveriam
+            erros.append({'linha': numero, 'erro': f"Nome '{nome}' repetido (já usado na linha {linha_por_nome[nome]})"})
+            continue
+        if nome:
+            linha_por_nome[nome] = numero
+        normalizadas.append((numero, esfiha_id, valores))
+
+    # Resolver ids e nomes existentes com duas consultas para o lote inteiro
+    ids = {esfiha_id for _, esfiha_id, _ in normalizadas if esfiha_id is not None}
+    nomes = {valores.get('nome') for _, esfiha_id, valores in normalizadas if esfiha_id is None and valores.get('nome')}
+    ids_existentes = {id_ for (id_,) in db.session.query(Esfiha.id).filter(Esfiha.id.in_(ids))} if ids else set()
+    ids_por_nome = {}
+    if nomes:
+        for id_, nome in db.session.query(Esfiha.id, Esfiha.nome).filter(Esfiha.nome.in_(nomes)):
+            ids_por_nome.setdefault(nome, []).append(id_)
+
+    agora = datetime.utcnow()
+    inserir, atualizar = [], []
+    for numero, esfiha_id, valores in normalizadas:
+        if esfiha_id is None and valores.get('nome') in ids_por_nome:
+            encontrados = ids_por_nome[valores['nome']]
+            if len(encontrados) > 1:
+                erros.append({'linha': numero, 'erro': f"Nome '{valores['nome']}' é ambíguo; informe o id"})
+                continue
+            esfiha_id = encontrados[0]
+        elif esfiha_id is not None and esfiha_id not in ids_existentes:
+            erros.append({'linha': numero, 'erro': f'Esfiha ID {esfiha_id} não encontrada'})
+            continue
+
+        if esfiha_id is None:
+            if not valores.get('nome') or 'preco' not in valores:
+                erros.append({'linha': numero, 'erro': 'Nome e preço são obrigatórios'})
+                continue
+            inserir.append({
+                'descricao': '', 'categoria': '', 'disponivel': True, 'imagem_url': '',
+                **valores, 'data_criacao': agora, 'data_atualizacao': agora
+            })
+        else:
+            atualizar.append({**valores, 'id': esfiha_id, 'data_atualizacao': agora})
+
+    if erros:
+        return _resposta_lote(0, sorted(erros, key=lambda erro: erro['linha']))
+
+    # executemany: um INSERT para todas as novas e um UPDATE por conjunto de colunas
+    if inserir:
+        db.session.execute(insert(Esfiha), inserir)
+    for colunas in {tuple(sorted(linha)) for linha in atualizar}:
+        db.session.execute(update(Esfiha), [linha for linha in atualizar if tuple(sorted(linha)) == colunas])
+    db.session.commit()
+    cache_cardapio.invalidar()
+
+    return _resposta_lote(len(inserir) + len(atualizar), [], criadas=len(inserir), atualizadas=len(atualizar))
+
+@esfiha_bp.route('/atualizar-precos', methods=['PATCH'])
+def atualizar_precos():
+    """Atualiza o preço de várias esfihas de uma vez (array JSON ou CSV com colunas id,preco).
+
+    Aplicado com um único UPDATE executemany em uma transação; nada é gravado
+    se alguma linha tiver erro.
+    """
+    try:
+        linhas = list(_linhas_do_request())
+    except (ValueError, csv.Error) as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+
+    erros = []
+    precos = {}
+    for numero, linha in linhas:
+        try:
+            if not isinstance(linha, dict) or linha.get('id') in (None, '') or linha.get('preco') in (None, ''):
+                raise ValueError('Informe id e preco')
+            precos[int(linha['id'])] = (numero, _preco(linha['preco']))
+        except (TypeError, ValueError) as e:
+            erros.append({'linha': numero, 'erro': str(e)})
+
+    existentes = {id_ for (id_,) in db.session.query(Esfiha.id).filter(Esfiha.id.in_(precos))} if precos else set()
+    erros += [
+        {'linha': numero, 'erro': f'Esfiha ID {esfiha_id} não encontrada'}
+        for esfiha_id, (numero, _) in precos.items() if esfiha_id not in existentes
+    ]
+    if erros:
+        return _resposta_lote(0, sorted(erros, key=lambda erro: erro['linha']))
+
+    agora = datetime.utcnow()
+    if precos:
+        db.session.execute(update(Esfiha), [
+            {'id': esfiha_id, 'preco': preco, 'data_atualizacao': agora}
+            for esfiha_id, (_, preco) in precos.items()
+        ])
+        db.session.commit()
+        cache_cardapio.invalidar()
+
+    return _resposta_lote(len(precos), [], atualizadas=len(precos))
@@ -1,41 +1,149 @@
 
 import os
-import stripe # Importar Stripe
-from flask import Blueprint, request, jsonify
+import base64
+import hashlib
+import heapq
+import logging
+import secrets
+from flask import Blueprint, Response, abort, current_app, request, jsonify, stream_with_context, url_for
 from flask_jwt_extended import jwt_required, get_jwt_identity # Importar JWT
+from sqlalchemy import and_, func, or_, select, update
+from sqlalchemy.exc import IntegrityError
 from src.models.user import db, User # Importar User
 from src.models.pedido import Pedido, ItemPedido, StatusPedido
 from src.models.esfiha import Esfiha
-from datetime import datetime
+from src.models.pagamento import EventoStripe, PagamentoOutbox
+from src.models.arquivo import PedidoArquivado
+from src.services.cliente_stripe import cliente_stripe
+from src.services.eventos_pedido import barramento_pedidos, formatar_sse, registrar_mudanca_status
+from src.services.eventos_stripe import consumidor_eventos_stripe
+from src.services.fila_cozinha import fila_cozinha
+from src.services.idempotencia import guardar_resposta, idempotente
+from src.services import exportacao_pedidos, relatorios
+from src.services.serializacao_pedidos import resposta_json, selecionar_pedidos, serializador_pedidos
+from src.services.pagamento_outbox import despachante_pagamentos
+from src.services.pedidos_abandonados import coletor_pedidos_abandonados, encerrar_outbox
+from datetime import datetime, timedelta, timezone
 
 pedido_bp = Blueprint("pedido", __name__)
+logger = logging.getLogger(__name__)
 
-# Configurar a chave secreta do Stripe (idealmente via variáveis de ambiente)
-stripe.api_key = os.getenv("STRIPE_SECRET_KEY", "sk_test_YOUR_SECRET_KEY") # Substituir pela chave real ou variável
+LIMITE_PADRAO_ADMIN = 50
+LIMITE_MAXIMO_ADMIN = 200
+MARGEM_CURSOR_SINCRONIZACAO = timedelta(seconds=5)
 
 # --- Rotas para Clientes (Protegidas) ---
 
+def _pedidos_do_cliente(cliente_id, desde=None):
+    """Pedidos do cliente das tabelas quente e de arquivo, do mais recente ao mais antigo.
+
+    Com `desde`, só os criados ou alterados depois dessa data, na ordem de data_atualizacao.
+    """
+    if desde is None:
+        consultas = [
+            selecionar_pedidos(modelo).where(modelo.cliente_id == cliente_id).order_by(modelo.data_criacao.desc())
+            for modelo in (Pedido, PedidoArquivado)
+        ]
+        chave, reverso = (lambda linha: linha.data_criacao or datetime.min), True
+    else:
+        consultas = [
+            selecionar_pedidos(modelo)
+            .where(modelo.cliente_id == cliente_id, modelo.data_atualizacao > desde)
+            .order_by(modelo.data_atualizacao)
+            for modelo in (Pedido, PedidoArquivado)
+        ]
+        chave, reverso = (lambda linha: linha.data_atualizacao), False
+    quentes, arquivados = (db.session.execute(consulta).all() for consulta in consultas)
+    return list(heapq.merge(quentes, arquivados, key=chave, reverse=reverso))
+
+def _versao_pedidos_cliente(cliente_id):
+    """(maior data_atualizacao, quantidade) dos pedidos do cliente, lidos só do índice (cliente_id, data_atualizacao)."""
+    ultima, total = None, 0
+    for modelo in (Pedido, PedidoArquivado):
+        maior, quantidade = db.session.execute(
+            select(func.max(modelo.data_atualizacao), func.count()).where(modelo.cliente_id == cliente_id)
+        ).one()
+        if maior is not None and (ultima is None or maior > ultima):
+            ultima = maior
+        total += quantidade
+    return ultima, total
+
+def _obter_linha_pedido(pedido_id, cliente_id=None):
+    """Linha do pedido na tabela quente ou, se já foi arquivado, na de arquivo."""
+    for modelo in (Pedido, PedidoArquivado):
+        consulta = selecionar_pedidos(modelo).where(modelo.id == pedido_id)
+        if cliente_id is not None:
+            consulta = consulta.where(modelo.cliente_id == cliente_id)
+        linha = db.session.execute(consulta).first()
+        if linha is not None:
+            return linha
+    return None
+
 @pedido_bp.route("/me", methods=["GET"])
 @jwt_required()
 def listar_meus_pedidos():
-    """Lista os pedidos do usuário logado."""
+    """Lista os pedidos do usuário logado, incluindo os arquivados.
+
+    Com since=<cursor da resposta anterior>, devolve só os pedidos criados ou
+    alterados depois dele. O ETag muda a cada alteração nos pedidos do cliente;
+    com If-None-Match igual, responde 304 sem ler os pedidos.
+    """
     current_user_id = get_jwt_identity()
-    pedidos = Pedido.query.filter_by(cliente_id=current_user_id).order_by(Pedido.data_criacao.desc()).all()
-    return jsonify({
-        "status": "success",
-        "data": [pedido.to_dict() for pedido in pedidos]
-    }), 200
+    try:
+        desde = _parse_data(request.args["since"], "since") if request.args.get("since") else None
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    if desde is not None and desde.tzinfo is not None:
+        desde = desde.astimezone(timezone.utc).replace(tzinfo=None) # As datas são gravadas em UTC sem fuso
+
+    ultima, total = _versao_pedidos_cliente(current_user_id)
+    etag = hashlib.sha1(f"{current_user_id}|{ultima}|{total}".encode()).hexdigest()[:20]
+    if request.if_none_match.contains(etag):
+        resposta = Response(status=304)
+    else:
+        # O cursor fica um pouco atrás da última alteração: uma transação que
+        # gravou data_atualizacao antes dela mas confirmou depois não se perde
+        cursor = min(ultima, datetime.utcnow() - MARGEM_CURSOR_SINCRONIZACAO) if ultima else desde
+        linhas = _pedidos_do_cliente(current_user_id, desde)
+        resposta = resposta_json(
+            serializador_pedidos.serializar_lista(linhas),
+            cursor=cursor.isoformat() if cursor else None
+        )
+    resposta.set_etag(etag)
+    resposta.headers["Cache-Control"] = "private, no-cache"
+    return resposta
+
+def _stream_eventos(filtro=None):
+    """Resposta SSE com as mudanças de status, retomando a partir do Last-Event-ID."""
+    ultimo_id = request.headers.get("Last-Event-ID") or request.args.get("ultimo_id")
+    duracao_maxima = current_app.config.get("SSE_DURACAO_MAXIMA", 300)
+
+    def gerar():
+        yield "retry: 3000\n\n"
+        for evento_id, dados in barramento_pedidos.assinar(ultimo_id, filtro, duracao_maxima=duracao_maxima):
+            yield formatar_sse(evento_id, dados)
+
+    return Response(stream_with_context(gerar()), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no" # Desativar buffer do nginx
+    })
+
+@pedido_bp.route("/me/eventos", methods=["GET"])
+@jwt_required(locations=["headers", "query_string"]) # EventSource não envia cabeçalhos; aceitar ?jwt=
+def eventos_meus_pedidos():
+    """Stream SSE das mudanças de status dos pedidos do usuário logado."""
+    current_user_id = str(get_jwt_identity())
+    return _stream_eventos(lambda dados: str(dados["cliente_id"]) == current_user_id)
 
 @pedido_bp.route("/me/<int:id>", methods=["GET"])
 @jwt_required()
 def obter_meu_pedido(id):
     """Obtém um pedido específico do usuário logado."""
     current_user_id = get_jwt_identity()
-    pedido = Pedido.query.filter_by(id=id, cliente_id=current_user_id).first_or_404()
-    return jsonify({
-        "status": "success",
-        "data": pedido.to_dict()
-    }), 200
+    linha = _obter_linha_pedido(id, cliente_id=current_user_id)
+    if linha is None:
+        abort(404)
+    return resposta_json(serializador_pedidos.serializar([linha])[0])
 
 @pedido_bp.route("/me/cancelar/<int:id>", methods=["PATCH"])
 @jwt_required()
@@ -50,18 +158,19 @@ def cancelar_meu_pedido(id):
             "message": "Este pedido não pode mais ser cancelado"
         }), 400
 
-    # TODO: Adicionar lógica para cancelar o Payment Intent no Stripe se aplicável
-    # try:
-    #     if pedido.stripe_payment_intent_id:
-    #         stripe.PaymentIntent.cancel(pedido.stripe_payment_intent_id)
-    # except stripe.error.StripeError as e:
-    #     # Logar erro, mas continuar cancelando o pedido no sistema
-    #     print(f"Erro ao cancelar Payment Intent {pedido.stripe_payment_intent_id}: {e}")
+    aguardando_pagamento = pedido.status == StatusPedido.PAGAMENTO_PENDENTE
+    if aguardando_pagamento:
+        encerrar_outbox([pedido.id], "Pedido cancelado pelo cliente")
 
     pedido.status = StatusPedido.CANCELADO
     pedido.data_atualizacao = datetime.utcnow()
     db.session.commit()
 
+    # O Payment Intent é cancelado em segundo plano; erros do Stripe são apenas registrados.
+    # Pedidos já pagos precisam de reembolso, que não é feito por este fluxo.
+    if aguardando_pagamento and pedido.stripe_payment_intent_id:
+        coletor_pedidos_abandonados.cancelar_intents([pedido.stripe_payment_intent_id], motivo="requested_by_customer")
+
     return jsonify({
         "status": "success",
         "message": "Pedido cancelado com sucesso",
@@ -72,8 +181,14 @@ def cancelar_meu_pedido(id):
 
 @pedido_bp.route("/criar-intent-pagamento", methods=["POST"])
 @jwt_required(optional=True) # Permitir usuários não logados, mas capturar ID se logado
+@idempotente
 def criar_intent_pagamento():
-    """Cria um Pedido no banco com status PAGAMENTO_PENDENTE e um Payment Intent no Stripe."""
+    """Cria um Pedido com status PAGAMENTO_PENDENTE e enfileira a criação do Payment Intent.
+
+    Responde 202 sem esperar o Stripe; o cliente consulta 'pagamento_url'
+    até receber o client_secret. Com o cabeçalho Idempotency-Key, repetições
+    recebem a resposta original sem criar outro pedido.
+    """
     dados = request.json
     current_user_id = get_jwt_identity()
 
@@ -81,34 +196,43 @@ def criar_intent_pagamento():
     if not dados.get("nome_cliente") or not dados.get("telefone") or not dados.get("itens") or not dados.get("forma_entrega"):
         return jsonify({"status": "error", "message": "Dados incompletos para criar o pedido."}), 400
 
-    valor_total_calculado = 0
-    itens_pedido_info = []
-    item_ids_quantidades = {}
-
-    # Validar itens e calcular total
+    # Validar os itens e agrupar linhas repetidas da mesma esfiha
+    itens_agrupados = {}
     for item_data in dados.get("itens", []):
         esfiha_id = item_data.get("esfiha_id")
         quantidade = item_data.get("quantidade", 1)
 
-        if not esfiha_id or not isinstance(quantidade, int) or quantidade <= 0:
+        if not isinstance(esfiha_id, int) or isinstance(esfiha_id, bool) or not isinstance(quantidade, int) or quantidade <= 0:
             return jsonify({"status": "error", "message": f"Item inválido: {item_data}"}), 400
 
-        esfiha = Esfiha.query.get(esfiha_id)
+        item = itens_agrupados.setdefault(esfiha_id, {"quantidade": 0, "observacoes": []})
+        item["quantidade"] += quantidade
+        if item_data.get("observacoes"):
+            item["observacoes"].append(item_data["observacoes"])
+
+    if not itens_agrupados:
+         return jsonify({"status": "error", "message": "O pedido deve conter pelo menos um item."}), 400
+
+    # Buscar todas as esfihas do carrinho em uma única consulta
+    esfihas = {
+        esfiha.id: esfiha
+        for esfiha in Esfiha.query.filter(Esfiha.id.in_(itens_agrupados.keys())).all()
+    }
+
+    valor_total_calculado = 0
+    itens_pedido_info = []
+    for esfiha_id, item in itens_agrupados.items():
+        esfiha = esfihas.get(esfiha_id)
         if not esfiha or not esfiha.disponivel:
             return jsonify({"status": "error", "message": f"Esfiha ID {esfiha_id} indisponível ou não encontrada."}), 400
 
-        subtotal = esfiha.preco * quantidade
-        valor_total_calculado += subtotal
+        valor_total_calculado += esfiha.preco * item["quantidade"]
         itens_pedido_info.append({
             "esfiha_id": esfiha_id,
-            "quantidade": quantidade,
+            "quantidade": item["quantidade"],
             "preco_unitario": esfiha.preco,
-            "observacoes": item_data.get("observacoes", "")
+            "observacoes": "; ".join(item["observacoes"])
         })
-        item_ids_quantidades[esfiha_id] = quantidade
-
-    if not itens_pedido_info:
-         return jsonify({"status": "error", "message": "O pedido deve conter pelo menos um item."}), 400
 
     # Criar o Pedido no banco de dados primeiro
     novo_pedido = Pedido(
@@ -123,11 +247,12 @@ def criar_intent_pagamento():
     )
     db.session.add(novo_pedido)
     db.session.flush() # Obter o ID do pedido
+    pedido_id = novo_pedido.id # Lido antes do commit, que expira os atributos
 
     # Adicionar itens ao pedido
     for item_info in itens_pedido_info:
         novo_item = ItemPedido(
-            pedido_id=novo_pedido.id,
+            pedido_id=pedido_id,
             esfiha_id=item_info["esfiha_id"],
             quantidade=item_info["quantidade"],
             preco_unitario=item_info["preco_unitario"],
@@ -135,41 +260,42 @@ def criar_intent_pagamento():
         )
         db.session.add(novo_item)
 
-    try:
-        # Criar Payment Intent no Stripe
-        # O valor deve ser em centavos
-        amount_cents = int(novo_pedido.valor_total * 100)
-
-        intent = stripe.PaymentIntent.create(
-            amount=amount_cents,
-            currency="brl",
-            metadata={
-                "pedido_id": novo_pedido.id,
-                "cliente_nome": novo_pedido.nome_cliente,
-                "cliente_telefone": novo_pedido.telefone
-            },
-            # Habilitar métodos de pagamento desejados (ex: card, pix)
-            automatic_payment_methods={"enabled": True},
-        )
+    # O Payment Intent é criado pelo outbox depois do commit, fora da transação
+    token_pagamento = secrets.token_urlsafe(24)
+    db.session.add(PagamentoOutbox(pedido_id=pedido_id, token=token_pagamento))
 
-        # Salvar o ID do Payment Intent no pedido
-        novo_pedido.stripe_payment_intent_id = intent.id
-        db.session.commit()
+    resposta = jsonify({
+        "status": "success",
+        "pedido_id": pedido_id,
+        "valor_total": novo_pedido.valor_total,
+        "token_pagamento": token_pagamento, # Usado para consultar o client_secret
+        "pagamento_url": url_for("pedido.obter_pagamento", pedido_id=pedido_id, token=token_pagamento)
+    })
+    resposta.status_code = 202
+    guardar_resposta(resposta) # Confirmada junto com o pedido quando há Idempotency-Key
 
-        return jsonify({
-            "status": "success",
-            "client_secret": intent.client_secret, # Enviar para o frontend
-            "pedido_id": novo_pedido.id,
-            "valor_total": novo_pedido.valor_total
-        }), 201
-
-    except stripe.error.StripeError as e:
-        db.session.rollback() # Desfazer criação do pedido se Stripe falhar
-        return jsonify({"status": "error", "message": f"Erro no Stripe: {e}"}), 500
+    try:
+        db.session.commit()
     except Exception as e:
         db.session.rollback()
         return jsonify({"status": "error", "message": f"Erro interno: {e}"}), 500
 
+    despachante_pagamentos.enfileirar(pedido_id)
+
+    return resposta
+
+@pedido_bp.route("/pagamento/<int:pedido_id>", methods=["GET"])
+def obter_pagamento(pedido_id):
+    """Consulta o andamento da criação do Payment Intent (e o client_secret quando pronto)."""
+    entrada = PagamentoOutbox.query.filter_by(pedido_id=pedido_id).first()
+    token = request.args.get("token", "")
+    if not entrada or not secrets.compare_digest(entrada.token, token):
+        return jsonify({"status": "error", "message": "Pagamento não encontrado"}), 404
+    return jsonify({
+        "status": "success",
+        "data": entrada.to_dict()
+    }), 200
+
 # --- Rota de Webhook para Stripe (Processar eventos de pagamento) ---
 
 @pedido_bp.route("/stripe-webhook", methods=["POST"])
@@ -177,6 +303,7 @@ def stripe_webhook():
     payload = request.data
     sig_header = request.headers.get("Stripe-Signature")
     endpoint_secret = os.getenv("STRIPE_WEBHOOK_SECRET", "whsec_YOUR_WEBHOOK_SECRET") # Substituir
+    stripe = cliente_stripe.obter()
 
     try:
         event = stripe.Webhook.construct_event(
@@ -189,95 +316,207 @@ def stripe_webhook():
         # Assinatura inválida
         return jsonify({"status": "error", "message": "Invalid signature"}), 400
 
-    # Lidar com o evento
-    if event["type"] == "payment_intent.succeeded":
-        payment_intent = event["data"]["object"]
-        pedido_id = payment_intent["metadata"].get("pedido_id")
-        if pedido_id:
-            pedido = Pedido.query.get(pedido_id)
-            if pedido and pedido.status == StatusPedido.PAGAMENTO_PENDENTE:
-                pedido.status = StatusPedido.PENDENTE # Ou APROVADO, dependendo do fluxo
-                pedido.data_atualizacao = datetime.utcnow()
-                db.session.commit()
-                # TODO: Emitir evento via WebSocket para atualizar painel admin
-                print(f"Pedido {pedido_id} pago com sucesso!")
-            else:
-                 print(f"Webhook: Pedido {pedido_id} não encontrado ou já processado.")
-        else:
-            print("Webhook: ID do pedido não encontrado nos metadados do Payment Intent.")
-
-    elif event["type"] == "payment_intent.payment_failed":
-        payment_intent = event["data"]["object"]
-        pedido_id = payment_intent["metadata"].get("pedido_id")
-        if pedido_id:
-            pedido = Pedido.query.get(pedido_id)
-            if pedido and pedido.status == StatusPedido.PAGAMENTO_PENDENTE:
-                pedido.status = StatusPedido.FALHA_PAGAMENTO
-                pedido.data_atualizacao = datetime.utcnow()
-                db.session.commit()
-                print(f"Pagamento falhou para o pedido {pedido_id}.")
-            else:
-                print(f"Webhook: Pedido {pedido_id} não encontrado ou já processado (falha).")
-        else:
-            print("Webhook: ID do pedido não encontrado nos metadados do Payment Intent (falha).")
-    else:
-        print(f"Evento Stripe não tratado: {event['type']}")
+    # Gravar o evento e responder imediatamente; o consumidor aplica a transição
+    try:
+        db.session.add(EventoStripe(id=event["id"], tipo=event["type"], payload=payload.decode("utf-8")))
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        logger.info("Webhook: evento %s já recebido, ignorando reentrega.", event["id"])
+        return jsonify({"status": "success"}), 200
 
+    consumidor_eventos_stripe.notificar()
     return jsonify({"status": "success"}), 200
 
 # --- Rotas para Admin (Manter ou ajustar conforme necessário) ---
 
+def _codificar_cursor(pedido):
+    """Gera um cursor opaco a partir de (data_criacao, id) do último pedido da página."""
+    bruto = f"{pedido.data_criacao.isoformat()}|{pedido.id}"
+    return base64.urlsafe_b64encode(bruto.encode()).decode()
+
+def _decodificar_cursor(cursor):
+    """Retorna (data_criacao, id) de um cursor ou levanta ValueError se for inválido."""
+    try:
+        data_iso, pedido_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(data_iso), int(pedido_id)
+    except ValueError as e:
+        raise ValueError("Cursor inválido") from e
+
+def _parse_data(valor, nome):
+    try:
+        return datetime.fromisoformat(valor)
+    except ValueError as e:
+        raise ValueError(f"Data inválida para '{nome}': {valor}") from e
+
+def _filtros_admin(args, modelo=Pedido):
+    """Monta os filtros de status e intervalo de datas a partir da query string."""
+    filtros = []
+    if args.get("status"):
+        filtros.append(modelo.status.in_(args["status"].split(",")))
+    if args.get("data_inicio"):
+        filtros.append(modelo.data_criacao >= _parse_data(args["data_inicio"], "data_inicio"))
+    if args.get("data_fim"):
+        filtros.append(modelo.data_criacao < _parse_data(args["data_fim"], "data_fim"))
+    return filtros
+
 @pedido_bp.route("/admin", methods=["GET"])
 # @jwt_required() # Adicionar proteção e verificação de admin
 def listar_todos_pedidos_admin():
-    """Lista todos os pedidos para o admin."""
-    # Adicionar filtros por status, data, etc. se necessário
-    pedidos = Pedido.query.order_by(Pedido.data_criacao.desc()).all()
+    """Lista os pedidos para o admin, paginados por cursor em (data_criacao, id).
+
+    Parâmetros opcionais: status (separados por vírgula), data_inicio, data_fim
+    (ISO 8601, fim exclusivo), limite e cursor (valor de 'proximo_cursor').
+    """
+    try:
+        limite = min(max(int(request.args.get("limite", LIMITE_PADRAO_ADMIN)), 1), LIMITE_MAXIMO_ADMIN)
+        filtros = _filtros_admin(request.args)
+        if request.args.get("cursor"):
+            data_cursor, id_cursor = _decodificar_cursor(request.args["cursor"])
+            filtros.append(or_(
+                Pedido.data_criacao < data_cursor,
+                and_(Pedido.data_criacao == data_cursor, Pedido.id < id_cursor)
+            ))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    linhas = db.session.execute(
+        selecionar_pedidos()
+        .where(*filtros)
+        .order_by(Pedido.data_criacao.desc(), Pedido.id.desc())
+        .limit(limite + 1)
+    ).all()
+    tem_mais = len(linhas) > limite
+    linhas = linhas[:limite]
+
+    return resposta_json(serializador_pedidos.serializar_lista(linhas), paginacao={
+        "limite": limite,
+        "proximo_cursor": _codificar_cursor(linhas[-1]) if tem_mais else None
+    })
+
+@pedido_bp.route("/admin/exportar", methods=["GET"])
+# @jwt_required()
+def exportar_pedidos_admin():
+    """Exporta pedidos com itens em streaming (NDJSON ou CSV), do mais antigo ao mais recente.
+
+    Inclui os pedidos arquivados. Parâmetros opcionais: formato (ndjson ou csv; padrão ndjson), status,
+    data_inicio, data_fim e cursor (valor do campo 'cursor' do último pedido
+    recebido, para retomar uma exportação interrompida).
+    """
+    formato = request.args.get("formato", "ndjson")
+    if formato not in exportacao_pedidos.FORMATOS:
+        return jsonify({"status": "error", "message": f"Formato inválido. Use: {', '.join(exportacao_pedidos.FORMATOS)}"}), 400
+    try:
+        cursor = _decodificar_cursor(request.args["cursor"]) if request.args.get("cursor") else None
+        filtros = {}
+        for modelo in (Pedido, PedidoArquivado):
+            filtros[modelo] = _filtros_admin(request.args, modelo)
+            if cursor:
+                filtros[modelo].append(or_(
+                    modelo.data_criacao > cursor[0],
+                    and_(modelo.data_criacao == cursor[0], modelo.id > cursor[1])
+                ))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    return Response(
+        stream_with_context(exportacao_pedidos.exportar(
+            filtros[Pedido], filtros[PedidoArquivado], formato, _codificar_cursor
+        )),
+        mimetype=exportacao_pedidos.TIPOS_CONTEUDO[formato],
+        headers={
+            "Content-Disposition": f"attachment; filename=pedidos.{formato}",
+            "X-Accel-Buffering": "no"
+        }
+    )
+
+@pedido_bp.route("/admin/relatorios", methods=["GET"])
+# @jwt_required()
+def relatorios_admin():
+    """Totais de vendas a partir da tabela de vendas diárias (custo proporcional aos dias).
+
+    Parâmetros: data_inicio e data_fim (AAAA-MM-DD, inclusivas), agrupar (dia,
+    esfiha e/ou categoria, separados por vírgula; padrão 'dia') e grupo_status
+    (pago, cancelado ou falha; padrão 'pago').
+    """
+    agrupar = [campo for campo in request.args.get("agrupar", "dia").split(",") if campo]
+    grupo_status = request.args.get("grupo_status", relatorios.GRUPO_PAGO)
+    if any(campo not in relatorios.AGRUPAMENTOS for campo in agrupar):
+        return jsonify({"status": "error", "message": f"Agrupamento inválido. Use: {', '.join(relatorios.AGRUPAMENTOS)}"}), 400
+    if grupo_status not in (relatorios.GRUPO_PAGO, relatorios.GRUPO_CANCELADO, relatorios.GRUPO_FALHA):
+        return jsonify({"status": "error", "message": "grupo_status inválido"}), 400
+    try:
+        data_inicio = _parse_data(request.args["data_inicio"], "data_inicio").date() if request.args.get("data_inicio") else None
+        data_fim = _parse_data(request.args["data_fim"], "data_fim").date() if request.args.get("data_fim") else None
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
     return jsonify({
         "status": "success",
-        "data": [pedido.to_dict() for pedido in pedidos]
+        "data": relatorios.consultar(data_inicio, data_fim, agrupar, grupo_status)
     }), 200
 
+@pedido_bp.route("/admin/pagamentos-abandonados", methods=["GET"])
+# @jwt_required()
+def pagamentos_abandonados_admin():
+    """Contadores do cancelamento automático de pedidos com pagamento abandonado (deste processo)."""
+    return jsonify({"status": "success", "data": coletor_pedidos_abandonados.estatisticas()}), 200
+
+@pedido_bp.route("/admin/eventos", methods=["GET"])
+# @jwt_required()
+def eventos_pedidos_admin():
+    """Stream SSE das mudanças de status de todos os pedidos (substitui o polling do painel)."""
+    return _stream_eventos()
+
+@pedido_bp.route("/admin/cozinha", methods=["GET"])
+# @jwt_required()
+def fila_cozinha_admin():
+    """Pedidos em andamento para a tela da cozinha, por forma de entrega e do mais antigo ao mais novo."""
+    return resposta_json(fila_cozinha.listar())
+
 @pedido_bp.route("/admin/<int:id>", methods=["GET"])
 # @jwt_required()
 def obter_pedido_admin(id):
     """Obtém um pedido específico pelo ID para o admin."""
-    pedido = Pedido.query.get_or_404(id)
-    return jsonify({
-        "status": "success",
-        "data": pedido.to_dict()
-    }), 200
+    linha = _obter_linha_pedido(id)
+    if linha is None:
+        abort(404)
+    return resposta_json(serializador_pedidos.serializar([linha])[0])
 
 @pedido_bp.route("/admin/atualizar-status/<int:id>", methods=["PATCH"])
 # @jwt_required()
 def atualizar_status_admin(id):
-    """Atualiza o status de um pedido (Admin)."""
-    pedido = Pedido.query.get_or_404(id)
-    dados = request.json
+    """Atualiza o status de um pedido (Admin).
+
+    A transição é validada contra a máquina de estados de StatusPedido; as
+    transições de pagamento ficam com os eventos do Stripe.
+    """
+    dados = request.get_json(silent=True) or {}
 
     if "status" not in dados:
         return jsonify({"status": "error", "message": "Status não fornecido"}), 400
 
     novo_status = dados["status"]
-    status_validos = [
-        StatusPedido.PENDENTE, StatusPedido.APROVADO, StatusPedido.RECUSADO,
-        StatusPedido.EM_PREPARACAO, StatusPedido.A_CAMINHO, StatusPedido.PRONTO_RETIRADA,
-        StatusPedido.ENTREGUE, StatusPedido.CANCELADO, StatusPedido.FALHA_PAGAMENTO
-    ]
-
-    if novo_status not in status_validos:
+    transicoes = StatusPedido.transicoes()
+    if novo_status not in transicoes:
         return jsonify({"status": "error", "message": "Status inválido"}), 400
 
-    # Impedir que admin altere status relacionados ao pagamento diretamente?
-    if pedido.status in [StatusPedido.PAGAMENTO_PENDENTE, StatusPedido.FALHA_PAGAMENTO] and novo_status not in [StatusPedido.CANCELADO]:
-         # Poderia permitir apenas cancelamento nesses casos
-         pass # Ajustar lógica conforme necessário
+    pedido = db.session.get(Pedido, id, with_for_update=True)
+    if pedido is None:
+        abort(404)
+
+    permitidos = transicoes[pedido.status]
+    if novo_status not in permitidos:
+        db.session.rollback()
+        return jsonify({
+            "status": "error",
+            "message": f"Transição inválida: {pedido.status} -> {novo_status}",
+            "transicoes_permitidas": sorted(permitidos)
+        }), 409
 
     pedido.status = novo_status
     pedido.data_atualizacao = datetime.utcnow()
-    db.session.commit()
-
-    # TODO: Emitir evento via WebSocket para atualizar painel admin e cliente
+    db.session.commit() # A mudança é publicada nos feeds SSE após o commit
 
     return jsonify({
         "status": "success",
@@ -285,6 +524,84 @@ def atualizar_status_admin(id):
         "data": pedido.to_dict()
     }), 200
 
+LIMITE_LOTE_STATUS = 500
+TENTATIVAS_LOTE_STATUS = 3
+
+def _transicionar_lote(ids, destino):
+    """Aplica `destino` aos pedidos válidos com um único UPDATE. Retorna (aplicados, erros)."""
+    origens = StatusPedido.origens(destino)
+    agora = datetime.utcnow()
+    linhas = db.session.execute(
+        select(Pedido.id, Pedido.cliente_id, Pedido.status).where(Pedido.id.in_(ids)).with_for_update()
+    ).all()
+    encontrados = {linha.id: linha for linha in linhas}
+    erros = {}
+    for pedido_id in ids:
+        linha = encontrados.get(pedido_id)
+        if linha is None:
+            erros[pedido_id] = "Pedido não encontrado"
+        elif linha.status not in origens:
+            erros[pedido_id] = f"Transição inválida: {linha.status} -> {destino}"
+    validos = [linha for linha in linhas if linha.id not in erros]
+    if not validos:
+        return [], erros
+
+    alterados = db.session.execute(
+        update(Pedido)
+        .where(Pedido.id.in_([linha.id for linha in validos]), Pedido.status.in_(origens))
+        .values(status=destino, data_atualizacao=agora)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if alterados < len(validos):
+        return None, erros # Algum pedido mudou entre a leitura e o UPDATE; quem chamou repete
+    for linha in validos:
+        registrar_mudanca_status(linha.id, linha.cliente_id, destino, linha.status)
+    return validos, erros
+
+@pedido_bp.route("/admin/atualizar-status", methods=["PATCH"])
+# @jwt_required()
+def atualizar_status_lote_admin():
+    """Atualiza o status de vários pedidos de uma vez (Admin).
+
+    Corpo: {"ids": [...], "status": "..."}. Cada pedido é validado contra a
+    máquina de estados de StatusPedido; os válidos são alterados com um único
+    UPDATE em uma transação e os demais voltam em 'erros', por id.
+    """
+    dados = request.get_json(silent=True) or {}
+    ids = dados.get("ids")
+    destino = dados.get("status")
+
+    if destino not in StatusPedido.transicoes():
+        return jsonify({"status": "error", "message": "Status inválido"}), 400
+    if not isinstance(ids, list) or not ids or not all(type(pedido_id) is int for pedido_id in ids):
+        return jsonify({"status": "error", "message": "'ids' deve ser uma lista não vazia de inteiros"}), 400
+    if len(ids) > LIMITE_LOTE_STATUS:
+        return jsonify({"status": "error", "message": f"No máximo {LIMITE_LOTE_STATUS} pedidos por vez"}), 400
+    ids = list(dict.fromkeys(ids))
+
+    for _ in range(TENTATIVAS_LOTE_STATUS):
+        try:
+            aplicados, erros = _transicionar_lote(ids, destino)
+            if aplicados is None:
+                db.session.rollback()
+                continue
+            db.session.commit() # As mudanças são publicadas nos feeds SSE após o commit
+            break
+        except Exception:
+            db.session.rollback()
+            raise
+    else:
+        return jsonify({"status": "error", "message": "Pedidos alterados durante a atualização. Tente novamente."}), 409
+
+    return jsonify({
+        "status": "success",
+        "message": f"{len(aplicados)} pedidos atualizados",
+        "data": {
+            "atualizados": [linha.id for linha in aplicados],
+            "erros": {str(pedido_id): erro for pedido_id, erro in erros.items()}
+        }
+    }), 200
+
 # Manter rota antiga de criar pedido pode ser útil para testes ou cenários sem pagamento online
 # @pedido_bp.route("/criar-sem-pagamento", methods=["POST"])
 # def criar_pedido_sem_pagamento(): ... (código anterior adaptado)
@@ -1,11 +1,19 @@
 
 from flask import Blueprint, jsonify, request
-from werkzeug.security import generate_password_hash, check_password_hash # Import necessary security functions
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity # Import JWT functions
 from src.models.user import User, db
+from src.services.cache_usuarios import cache_identidades
+from src.services.senhas import PoolSenhasSaturado
 
 user_bp = Blueprint("user", __name__)
 
+@user_bp.errorhandler(PoolSenhasSaturado)
+def pool_senhas_saturado(e):
+    # Pool de hashing cheio: pedir ao cliente para tentar de novo em vez de travar o worker
+    resposta = jsonify({"message": "Too many authentication requests, try again shortly"})
+    resposta.headers["Retry-After"] = "1"
+    return resposta, 429
+
 # Rota de Registro (Substitui o antigo POST /users)
 @user_bp.route("/register", methods=["POST"])
 def register_user():
@@ -40,7 +48,11 @@ def login_user():
     user = User.query.filter((User.username == identifier) | (User.email == identifier)).first()
 
     if user and user.check_password(password):
-        access_token = create_access_token(identity=user.id) # Cria o token JWT
+        if user.precisa_rehash():
+            # Parâmetros de custo mudaram: regravar o hash com a senha já validada
+            user.set_password(password)
+            db.session.commit()
+        access_token = create_access_token(identity=str(user.id)) # Cria o token JWT (o subject precisa ser string)
         return jsonify(access_token=access_token)
     else:
         return jsonify({"message": "Invalid credentials"}), 401
@@ -50,10 +62,16 @@ def login_user():
 @jwt_required() # Protege a rota, exige um token JWT válido
 def get_current_user():
     current_user_id = get_jwt_identity() # Obtém o ID do usuário do token
-    user = User.query.get(current_user_id)
+    user = cache_identidades.obter(current_user_id)
     if not user:
         return jsonify({"message": "User not found"}), 404
-    return jsonify(user.to_dict())
+    return jsonify(user)
+
+@user_bp.route("/cache-identidades", methods=["GET"])
+@jwt_required()
+def estatisticas_cache_identidades():
+    # Contadores de acertos/falhas do cache de usuários deste processo
+    return jsonify(cache_identidades.estatisticas())
 
 # --- Rotas CRUD existentes (podem ser mantidas ou ajustadas conforme necessário) ---
 
@@ -69,18 +87,20 @@ def get_users():
 def get_user(user_id):
     # Adicionar lógica de permissão (ex: usuário só pode ver a si mesmo ou admin pode ver todos)
     current_user_id = get_jwt_identity()
-    if current_user_id != user_id: # Exemplo simples de permissão
+    if current_user_id != str(user_id): # Exemplo simples de permissão
          # Aqui poderia verificar se o usuário é admin
          return jsonify({"message": "Unauthorized"}), 403
 
-    user = User.query.get_or_404(user_id)
-    return jsonify(user.to_dict())
+    user = cache_identidades.obter(user_id)
+    if not user:
+        return jsonify({"message": "User not found"}), 404
+    return jsonify(user)
 
 @user_bp.route("/users/<int:user_id>", methods=["PUT"])
 @jwt_required()
 def update_user(user_id):
     current_user_id = get_jwt_identity()
-    if current_user_id != user_id:
+    if current_user_id != str(user_id):
         return jsonify({"message": "Unauthorized"}), 403
 
     user = User.query.get_or_404(user_id)
@@ -91,18 +111,20 @@ def update_user(user_id):
     # if 'password' in data:
     #     user.set_password(data['password'])
     db.session.commit()
+    cache_identidades.invalidar(user_id)
     return jsonify(user.to_dict())
 
 @user_bp.route("/users/<int:user_id>", methods=["DELETE"])
 @jwt_required()
 def delete_user(user_id):
     current_user_id = get_jwt_identity()
-    if current_user_id != user_id:
+    if current_user_id != str(user_id):
          # Adicionar lógica de permissão (ex: admin)
          return jsonify({"message": "Unauthorized"}), 403
 
     user = User.query.get_or_404(user_id)
     db.session.delete(user)
     db.session.commit()
+    cache_identidades.invalidar(user_id)
     return "", 204
 
@@ -0,0 +1,137 @@
+import logging
+import os
+import threading
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, insert, literal, select
+
+from src.models.user import db
+from src.models.pedido import Pedido, ItemPedido, StatusPedido
+from src.models.arquivo import PedidoArquivado, ItemPedidoArquivado
+from src.models.pagamento import PagamentoOutbox
+from src.services import idempotencia
+
+logger = logging.getLogger(__name__)
+
+STATUS_FINAIS = (
+    StatusPedido.ENTREGUE, StatusPedido.CANCELADO, StatusPedido.RECUSADO, StatusPedido.FALHA_PAGAMENTO,
+)
+COLUNAS_COPIADAS_PEDIDO = [coluna.name for coluna in Pedido.__table__.columns]
+COLUNAS_COPIADAS_ITEM = [coluna.name for coluna in ItemPedido.__table__.columns]
+
+
+class ArquivadorPedidos:
+    """Move pedidos em status final antigos para as tabelas de arquivo.
+
+    Roda em uma thread de fundo e trabalha em lotes: cada lote copia os
+    pedidos e itens com INSERT ... SELECT e os apaga das tabelas quentes na
+    mesma transação, então um pedido nunca fica nas duas (ou em nenhuma).
+    Assim `pedido` e `item_pedido` guardam só os pedidos recentes ou em
+    andamento; o histórico do cliente lê as duas tabelas.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._parar = threading.Event()
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ARQUIVO_IDADE_DIAS', float(os.getenv('ARQUIVO_IDADE_DIAS', '90')))
+        app.config.setdefault('ARQUIVO_TAMANHO_LOTE', int(os.getenv('ARQUIVO_TAMANHO_LOTE', '500')))
+        app.config.setdefault('ARQUIVO_INTERVALO', float(os.getenv('ARQUIVO_INTERVALO', '3600')))
+        app.config.setdefault('ARQUIVO_PAUSA_LOTES', float(os.getenv('ARQUIVO_PAUSA_LOTES', '0.5')))
+        self.app = app
+        app.extensions['arquivador_pedidos'] = self
+
+    def iniciar(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._loop, name='arquivador-pedidos', daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+
+    def _loop(self):
+        while not self._parar.wait(self.app.config['ARQUIVO_INTERVALO']):
+            try:
+                with self.app.app_context():
+                    total = self.arquivar(pausa=self.app.config['ARQUIVO_PAUSA_LOTES'])
+                if total:
+                    logger.info('Pedidos arquivados: %d', total)
+            except Exception:
+                logger.exception('Falha ao arquivar pedidos')
+            # Aproveita a rotina de manutenção para apagar as chaves de idempotência vencidas,
+            # mesmo quando o arquivamento falhou
+            try:
+                with self.app.app_context():
+                    removidas = idempotencia.limpar_expiradas()
+                if removidas:
+                    logger.info('Chaves de idempotência expiradas removidas: %d', removidas)
+            except Exception:
+                logger.exception('Falha ao remover chaves de idempotência expiradas')
+
+    def arquivar(self, pausa=0):
+        """Arquiva lotes até não restar pedido elegível. Retorna o total arquivado.
+
+        A pausa entre lotes libera o lock de escrita para os requests.
+        """
+        total = 0
+        while not self._parar.is_set():
+            arquivados = self.arquivar_lote()
+            total += arquivados
+            if arquivados < self.app.config['ARQUIVO_TAMANHO_LOTE'] or self._parar.wait(pausa):
+                break
+        return total
+
+    def arquivar_lote(self):
+        """Arquiva um lote em uma única transação. Retorna quantos pedidos foram movidos."""
+        limite = datetime.utcnow() - timedelta(days=self.app.config['ARQUIVO_IDADE_DIAS'])
+        try:
+            ids = db.session.execute(
+                select(Pedido.id)
+                .where(
+                    Pedido.status.in_(STATUS_FINAIS),
+                    Pedido.data_criacao < limite,
+                    Pedido.data_atualizacao < limite
+                )
+                .limit(self.app.config['ARQUIVO_TAMANHO_LOTE'])
+                .with_for_update()
+            ).scalars().all()
+            if not ids:
+                return 0
+
+            # Repete o filtro de status: o pedido pode ter mudado entre a leitura e a cópia
+            agora = datetime.utcnow()
+            db.session.execute(insert(PedidoArquivado).from_select(
+                COLUNAS_COPIADAS_PEDIDO + ['data_arquivamento'],
+                select(*[Pedido.__table__.c[nome] for nome in COLUNAS_COPIADAS_PEDIDO], literal(agora))
+                .where(Pedido.id.in_(ids), Pedido.status.in_(STATUS_FINAIS))
+            ))
+            movidos = select(PedidoArquivado.id).where(PedidoArquivado.id.in_(ids))
+            db.session.execute(insert(ItemPedidoArquivado).from_select(
+                COLUNAS_COPIADAS_ITEM,
+                select(*[ItemPedido.__table__.c[nome] for nome in COLUNAS_COPIADAS_ITEM])
+                .where(ItemPedido.pedido_id.in_(movidos))
+            ))
+            for exclusao in (
+                delete(PagamentoOutbox).where(PagamentoOutbox.pedido_id.in_(movidos)),
+                delete(ItemPedido).where(ItemPedido.pedido_id.in_(movidos)),
+            ):
+                db.session.execute(exclusao.execution_options(synchronize_session=False))
+            quantidade = db.session.execute(
+                delete(Pedido).where(Pedido.id.in_(movidos)).execution_options(synchronize_session=False)
+            ).rowcount
+            db.session.commit()
+            return quantidade
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            db.session.remove()
+
+
+arquivador_pedidos = ArquivadorPedidos()
@@ -0,0 +1,111 @@
+import bisect
+import os
+import re
+import threading
+import time
+import unicodedata
+
+from src.models.esfiha import Esfiha
+from src.services.cache_cardapio import cache_cardapio
+
+# Peso de cada campo na relevância; termos achados só por prefixo valem menos
+PESOS_CAMPOS = (('nome', 3.0), ('categoria', 2.0), ('descricao', 1.0))
+FATOR_PREFIXO = 0.6
+PADRAO_PALAVRA = re.compile(r'\w+')
+
+
+def normalizar(texto):
+    """Quebra o texto em termos sem acento, em minúsculas e sem o plural em 's' (ex.: 'Pães' -> ['pae'])."""
+    sem_acento = ''.join(
+        caractere for caractere in unicodedata.normalize('NFKD', texto or '')
+        if not unicodedata.combining(caractere)
+    ).casefold()
+    return [
+        palavra[:-1] if len(palavra) > 3 and palavra.endswith('s') else palavra
+        for palavra in PADRAO_PALAVRA.findall(sem_acento)
+    ]
+
+
+class IndiceBusca:
+    """Índice invertido em memória sobre nome, descrição e categoria das esfihas.
+
+    O índice acompanha a versão do cache do cardápio: toda escrita que chama
+    cache_cardapio.invalidar() (inclusive a importação em lote) faz com que ele
+    seja remontado na próxima busca. Nos outros workers a remontagem acontece
+    após `ttl` segundos, como nas respostas do cardápio.
+    """
+
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._versao = None
+        self._expira_em = 0
+        self._termos = []  # termos ordenados, para achar os que começam com um prefixo
+        self._postagens = {}  # termo -> {esfiha_id: peso}
+        self._documentos = {}  # esfiha_id -> to_dict()
+
+    def _montar(self):
+        postagens = {}
+        documentos = {}
+        for esfiha in Esfiha.query.all():
+            documentos[esfiha.id] = esfiha.to_dict()
+            for campo, peso in PESOS_CAMPOS:
+                for termo in normalizar(getattr(esfiha, campo)):
+                    pesos = postagens.setdefault(termo, {})
+                    pesos[esfiha.id] = max(pesos.get(esfiha.id, 0), peso)
+        return sorted(postagens), postagens, documentos
+
+    def _atualizar(self):
+        agora = time.monotonic()
+        versao = cache_cardapio.versao
+        with self._lock:
+            if self._versao == versao and self._expira_em > agora:
+                return
+        termos, postagens, documentos = self._montar()
+        with self._lock:
+            # Se houve outra escrita durante a montagem, a próxima busca remonta de novo
+            self._termos, self._postagens, self._documentos = termos, postagens, documentos
+            self._versao = versao
+            self._expira_em = agora + self.ttl
+
+    def _pontuar_termo(self, termo):
+        """Pontuação por esfiha de um termo da busca, aceitando-o como prefixo."""
+        pontos = dict(self._postagens.get(termo, {}))
+        inicio = bisect.bisect_left(self._termos, termo)
+        for indexado in self._termos[inicio:]:
+            if not indexado.startswith(termo):
+                break
+            if indexado == termo:
+                continue
+            for esfiha_id, peso in self._postagens[indexado].items():
+                pontos[esfiha_id] = max(pontos.get(esfiha_id, 0), peso * FATOR_PREFIXO)
+        return pontos
+
+    def buscar(self, consulta, limite=20, deslocamento=0):
+        """Retorna (total, esfihas da página) em ordem de relevância; todos os termos precisam casar."""
+        termos = normalizar(consulta)
+        if not termos:
+            return 0, []
+        self._atualizar()
+        with self._lock:
+            pontuacao = None
+            for termo in dict.fromkeys(termos):
+                pontos = self._pontuar_termo(termo)
+                if pontuacao is None:
+                    pontuacao = pontos
+                else:
+                    pontuacao = {
+                        esfiha_id: total + pontos[esfiha_id]
+                        for esfiha_id, total in pontuacao.items() if esfiha_id in pontos
+                    }
+                if not pontuacao:
+                    return 0, []
+            ordenados = sorted(
+                pontuacao,
+                key=lambda esfiha_id: (-pontuacao[esfiha_id], self._documentos[esfiha_id]['nome'], esfiha_id)
+            )
+            pagina = ordenados[deslocamento:deslocamento + limite]
+            return len(ordenados), [self._documentos[esfiha_id] for esfiha_id in pagina]
+
+
+indice_busca = IndiceBusca(ttl=float(os.getenv("CARDAPIO_CACHE_TTL", "30")))
@@ -0,0 +1,50 @@
+import hashlib
+import os
+import threading
+import time
+
+
+class CacheCardapio:
+    """Cache em memória das respostas JSON do cardápio, com contador de versão.
+
+    Cada escrita no cardápio chama invalidar(), que incrementa a versão e descarta
+    as entradas deste processo. Como cada worker do gunicorn tem sua própria cópia,
+    as entradas também expiram após `ttl` segundos para que os outros workers
+    enxerguem a alteração. O ETag é derivado do conteúdo, então uma reconstrução
+    que produz os mesmos bytes continua respondendo 304 aos clientes.
+    """
+
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._versao = 0
+        self._entradas = {}  # chave -> (versao, expira_em, corpo, etag)
+
+    @property
+    def versao(self):
+        return self._versao
+
+    def invalidar(self):
+        with self._lock:
+            self._versao += 1
+            self._entradas.clear()
+
+    def obter(self, chave, construir):
+        """Retorna (corpo, etag) da chave, chamando construir() para gerar os bytes se necessário."""
+        agora = time.monotonic()
+        with self._lock:
+            versao = self._versao
+            entrada = self._entradas.get(chave)
+        if entrada and entrada[0] == versao and entrada[1] > agora:
+            return entrada[2], entrada[3]
+
+        corpo = construir()
+        etag = hashlib.sha1(corpo).hexdigest()[:20]
+        with self._lock:
+            # Não armazena se houve uma escrita enquanto o corpo era montado
+            if self._versao == versao:
+                self._entradas[chave] = (versao, agora + self.ttl, corpo, etag)
+        return corpo, etag
+
+
+cache_cardapio = CacheCardapio(ttl=float(os.getenv("CARDAPIO_CACHE_TTL", "30")))
@@ -0,0 +1,69 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from src.models.user import db, User
+
+
+class CacheIdentidades:
+    """Cache LRU com TTL de User.to_dict(), indexado pela identidade do JWT.
+
+    Guarda dicionários (não objetos ORM) para poder ser compartilhado entre
+    requests. update_user/delete_user invalidam a entrada deste processo; nos
+    demais workers a entrada expira após `ttl` segundos.
+    """
+
+    def __init__(self, capacidade=10000, ttl=60):
+        self.capacidade = capacidade
+        self.ttl = ttl
+        self._entradas = OrderedDict()  # identidade -> (expira_em, dados)
+        self._lock = threading.Lock()
+        self.acertos = 0
+        self.falhas = 0
+        self.remocoes = 0
+
+    def obter(self, identidade):
+        """Retorna o dicionário do usuário ou None se ele não existir."""
+        chave = str(identidade)
+        agora = time.monotonic()
+        with self._lock:
+            entrada = self._entradas.get(chave)
+            if entrada and entrada[0] > agora:
+                self._entradas.move_to_end(chave)
+                self.acertos += 1
+                return entrada[1]
+            self.falhas += 1
+
+        user = db.session.get(User, int(identidade))
+        if user is None:
+            return None
+        dados = user.to_dict()
+        with self._lock:
+            self._entradas[chave] = (agora + self.ttl, dados)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.capacidade:
+                self._entradas.popitem(last=False)
+                self.remocoes += 1
+        return dados
+
+    def invalidar(self, identidade):
+        with self._lock:
+            self._entradas.pop(str(identidade), None)
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                'acertos': self.acertos,
+                'falhas': self.falhas,
+                'remocoes': self.remocoes,
+                'tamanho': len(self._entradas),
+                'capacidade': self.capacidade,
+                'ttl': self.ttl
+            }
+
+
+cache_identidades = CacheIdentidades(
+    capacidade=int(os.getenv('CACHE_USUARIOS_CAPACIDADE', '10000')),
+    ttl=float(os.getenv('CACHE_USUARIOS_TTL', '60'))
+)
@@ -0,0 +1,49 @@
+import os
+import threading
+
+
+class ClienteStripe:
+    """Importa e configura o SDK do Stripe no primeiro uso.
+
+    O pacote `stripe` leva uma fração de segundo para importar; carregá-lo só
+    quando um pagamento é criado, cancelado ou um webhook chega tira esse custo
+    da subida de cada worker. Use `cliente_stripe.obter()` no lugar de
+    `import stripe` dentro das funções que chamam a API.
+    """
+
+    def __init__(self, app=None):
+        self.chave = os.getenv('STRIPE_SECRET_KEY', 'sk_test_YOUR_SECRET_KEY')
+        self.timeout = float(os.getenv('STRIPE_TIMEOUT', '20'))
+        self._modulo = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # Configurar a chave secreta do Stripe (idealmente via variáveis de ambiente)
+        app.config.setdefault('STRIPE_SECRET_KEY', self.chave)
+        app.config.setdefault('STRIPE_TIMEOUT', self.timeout)
+        self.chave = app.config['STRIPE_SECRET_KEY']
+        self.timeout = app.config['STRIPE_TIMEOUT']
+        if self._modulo is not None:
+            self._configurar(self._modulo)
+        app.extensions['cliente_stripe'] = self
+
+    def obter(self):
+        """Retorna o módulo `stripe` já configurado, importando-o na primeira chamada."""
+        if self._modulo is None:
+            with self._lock:
+                if self._modulo is None:
+                    import stripe
+                    self._configurar(stripe)
+                    self._modulo = stripe
+        return self._modulo
+
+    def _configurar(self, stripe):
+        stripe.api_key = self.chave
+        # RequestsClient mantém uma requests.Session por thread, reaproveitando
+        # as conexões HTTP com o Stripe entre chamadas do mesmo worker
+        stripe.default_http_client = stripe.RequestsClient(timeout=self.timeout)
+
+
+cliente_stripe = ClienteStripe()
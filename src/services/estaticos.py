@@ -0,0 +1,101 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+
+from flask import Response
+
+try:
+    import brotli # Opcional: sem ele, servimos apenas gzip (ou arquivos .br pré-gerados)
+except ImportError:
+    brotli = None
+
+# Bundles do Vite levam o hash do conteúdo no nome (ex.: index-C-_j3_s6.js)
+PADRAO_HASH = re.compile(r'-[A-Za-z0-9_-]{8,}\.[a-z0-9]+$')
+TIPOS_COMPRIMIVEIS = ('text/', 'application/javascript', 'application/json', 'image/svg+xml', 'application/xml')
+TAMANHO_MINIMO_COMPRESSAO = 512
+CACHE_IMUTAVEL = 'public, max-age=31536000, immutable'
+
+
+class Arquivo:
+    __slots__ = ('mimetype', 'etag', 'cache_control', 'variantes')
+
+    def __init__(self, mimetype, etag, cache_control, variantes):
+        self.mimetype = mimetype
+        self.etag = etag
+        self.cache_control = cache_control
+        self.variantes = variantes  # codificação ('br', 'gzip', None) -> bytes
+
+
+class ManifestoEstaticos:
+    """Manifesto em memória do build do frontend, montado uma vez na inicialização.
+
+    Para cada arquivo guarda os bytes originais e as variantes gzip/brotli
+    (pré-geradas no disco como .gz/.br ou comprimidas aqui), além do ETag.
+    Bundles com hash no nome recebem Cache-Control immutable; index.html e os
+    demais são revalidados pelo ETag. Alterações no build exigem reiniciar.
+    """
+
+    def __init__(self, pasta):
+        self.pasta = pasta
+        self.arquivos = {}
+        if pasta and os.path.isdir(pasta):
+            self._carregar()
+
+    def _carregar(self):
+        for raiz, _, nomes in os.walk(self.pasta):
+            for nome in nomes:
+                if nome.endswith(('.gz', '.br')):
+                    continue
+                caminho = os.path.join(raiz, nome)
+                relativo = os.path.relpath(caminho, self.pasta).replace(os.sep, '/')
+                self.arquivos[relativo] = self._montar(caminho, relativo)
+
+    def _montar(self, caminho, relativo):
+        with open(caminho, 'rb') as arquivo:
+            conteudo = arquivo.read()
+        mimetype = mimetypes.guess_type(relativo)[0] or 'application/octet-stream'
+        variantes = {None: conteudo}
+
+        if mimetype.startswith(TIPOS_COMPRIMIVEIS) and len(conteudo) >= TAMANHO_MINIMO_COMPRESSAO:
+            for codificacao, extensao, comprimir in (
+                ('br', '.br', brotli.compress if brotli else None),
+                ('gzip', '.gz', lambda dados: gzip.compress(dados, compresslevel=9, mtime=0)),
+            ):
+                if os.path.exists(caminho + extensao):
+                    with open(caminho + extensao, 'rb') as arquivo:
+                        variantes[codificacao] = arquivo.read()
+                elif comprimir:
+                    variantes[codificacao] = comprimir(conteudo)
+                if codificacao in variantes and len(variantes[codificacao]) >= len(conteudo):
+                    del variantes[codificacao]
+
+        imutavel = relativo.startswith('assets/') and PADRAO_HASH.search(relativo)
+        return Arquivo(
+            mimetype=mimetype,
+            etag=hashlib.sha1(conteudo).hexdigest()[:20],
+            cache_control=CACHE_IMUTAVEL if imutavel else 'no-cache',
+            variantes=variantes
+        )
+
+    def __contains__(self, caminho):
+        return caminho in self.arquivos
+
+    def servir(self, caminho, request):
+        """Resposta do arquivo na melhor codificação aceita pelo cliente (304 se o ETag bater)."""
+        arquivo = self.arquivos[caminho]
+        codificacao = None
+        for candidata in ('br', 'gzip'):
+            if candidata in arquivo.variantes and request.accept_encodings[candidata]:
+                codificacao = candidata
+                break
+
+        resposta = Response(arquivo.variantes[codificacao], mimetype=arquivo.mimetype)
+        resposta.set_etag(f'{arquivo.etag}-{codificacao}' if codificacao else arquivo.etag)
+        resposta.headers['Cache-Control'] = arquivo.cache_control
+        if len(arquivo.variantes) > 1:
+            resposta.headers['Vary'] = 'Accept-Encoding'
+        if codificacao:
+            resposta.headers['Content-Encoding'] = codificacao
+        return resposta.make_conditional(request)
@@ -0,0 +1,273 @@
+import itertools
+import json
+import logging
+import os
+import secrets
+import threading
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from src.models.pedido import Pedido
+
+logger = logging.getLogger(__name__)
+
+CHAVE_MUDANCAS = 'mudancas_status_pedido'
+CHAVE_SAVEPOINTS = 'mudancas_status_pedido_savepoints' # SAVEPOINT -> quantas mudanças havia ao abri-lo
+
+# Funções chamadas dentro da transação que altera o status, com (sessao, dados)
+_ouvintes_transacao = []
+
+
+def adicionar_ouvinte_transacao(ouvinte):
+    """Registra uma função executada na mesma transação de cada mudança de status.
+
+    A função recebe (sessao, dados) e deve usar sessao.connection() para SQL,
+    já que pode ser chamada de dentro do flush.
+    """
+    _ouvintes_transacao.append(ouvinte)
+
+
+class BarramentoPedidos:
+    """Pub/sub em memória das mudanças de status de pedidos, usado pelos feeds SSE.
+
+    Guarda os últimos `capacidade` eventos em um buffer circular para que um
+    cliente que reconecta com Last-Event-ID receba o que perdeu. Os ids têm o
+    formato '<instância>-<sequência>'; se a instância não bate (o processo
+    reiniciou) ou o evento já saiu do buffer, o assinante recebe um 'reset' e
+    deve recarregar a lista completa.
+
+    O barramento é local ao processo; as mudanças feitas por outros workers
+    do gunicorn chegam pelo SincronizadorPedidos, que lê a tabela `pedido`.
+    """
+
+    def __init__(self, capacidade=1000):
+        self.instancia = secrets.token_hex(4)
+        self._sequencia = itertools.count(1)
+        self._eventos = deque(maxlen=capacidade)
+        self._condicao = threading.Condition()
+        self._ultima_sequencia = 0
+        self._ouvintes = []
+
+    def adicionar_ouvinte(self, ouvinte):
+        """Registra uma função chamada (na thread do commit) a cada evento publicado."""
+        self._ouvintes.append(ouvinte)
+
+    def publicar(self, dados):
+        for ouvinte in self._ouvintes:
+            ouvinte(dados)
+        with self._condicao:
+            self._ultima_sequencia = next(self._sequencia)
+            self._eventos.append((self._ultima_sequencia, dados))
+            self._condicao.notify_all()
+
+    def _parse_id(self, ultimo_id):
+        """Retorna a sequência do último evento visto ou None se não for possível retomar."""
+        try:
+            instancia, sequencia = ultimo_id.rsplit('-', 1)
+            sequencia = int(sequencia)
+        except (AttributeError, ValueError):
+            return None
+        if instancia != self.instancia or sequencia > self._ultima_sequencia:
+            return None
+        return sequencia
+
+    def assinar(self, ultimo_id=None, filtro=None, timeout=15, duracao_maxima=None):
+        """Gera (id, dados) dos novos eventos que passam no filtro.
+
+        Gera (None, None) a cada `timeout` segundos sem eventos (keepalive) e
+        ('reset', None) quando não é possível retomar a partir de `ultimo_id`.
+        """
+        inicio = datetime.utcnow()
+        with self._condicao:
+            if ultimo_id:
+                sequencia = self._parse_id(ultimo_id)
+                mais_antigo = self._eventos[0][0] if self._eventos else self._ultima_sequencia + 1
+                if sequencia is None or sequencia + 1 < mais_antigo:
+                    sequencia = self._ultima_sequencia
+                    precisa_reset = True
+                else:
+                    precisa_reset = False
+            else:
+                sequencia = self._ultima_sequencia
+                precisa_reset = False
+
+        if precisa_reset:
+            yield 'reset', None
+
+        while True:
+            with self._condicao:
+                pendentes = [(s, d) for s, d in self._eventos if s > sequencia]
+                if not pendentes:
+                    self._condicao.wait(timeout)
+                    pendentes = [(s, d) for s, d in self._eventos if s > sequencia]
+
+            if pendentes:
+                sequencia = pendentes[-1][0]
+                for s, dados in pendentes:
+                    if filtro is None or filtro(dados):
+                        yield f'{self.instancia}-{s}', dados
+            else:
+                yield None, None
+
+            if duracao_maxima and (datetime.utcnow() - inicio).total_seconds() >= duracao_maxima:
+                return
+
+
+barramento_pedidos = BarramentoPedidos()
+
+
+class SincronizadorPedidos:
+    """Republica no barramento local as mudanças de status feitas por outros processos.
+
+    Uma thread consulta a cada SSE_INTERVALO_SINCRONIZACAO segundos os pedidos
+    com data_atualizacao recente (índice ix_pedido_data_atualizacao). A janela
+    volta MARGEM segundos para pegar transações que confirmaram depois de
+    gravar a data; o último status conhecido de cada pedido (inclusive os
+    publicados por este processo) evita eventos repetidos.
+    """
+
+    MARGEM = timedelta(seconds=5)
+    CAPACIDADE = 10000
+
+    def __init__(self, barramento, app=None):
+        self.app = None
+        self.barramento = barramento
+        self._status_conhecido = OrderedDict()  # pedido_id -> status
+        self._lock = threading.Lock()
+        self._marca = None
+        self._parar = threading.Event()
+        self._thread = None
+        barramento.adicionar_ouvinte(self._registrar)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SSE_INTERVALO_SINCRONIZACAO', float(os.getenv('SSE_INTERVALO_SINCRONIZACAO', '2')))
+        self.app = app
+        app.extensions['sincronizador_pedidos'] = self
+
+    def iniciar(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._parar.clear()
+        self._marca = datetime.utcnow()
+        self._thread = threading.Thread(target=self._loop, name='sincronizador-pedidos', daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+
+    def _registrar(self, dados):
+        with self._lock:
+            self._status_conhecido[dados['pedido_id']] = dados['status']
+            self._status_conhecido.move_to_end(dados['pedido_id'])
+            while len(self._status_conhecido) > self.CAPACIDADE:
+                self._status_conhecido.popitem(last=False)
+
+    def _loop(self):
+        while not self._parar.wait(self.app.config['SSE_INTERVALO_SINCRONIZACAO']):
+            try:
+                with self.app.app_context():
+                    self.sincronizar()
+            except Exception:
+                logger.exception('Falha ao sincronizar as mudanças de status entre processos')
+
+    def sincronizar(self):
+        """Publica as mudanças ainda não vistas por este processo. Retorna quantas foram publicadas."""
+        from src.models.user import db
+        try:
+            linhas = db.session.execute(
+                select(Pedido.id, Pedido.cliente_id, Pedido.status, Pedido.data_atualizacao)
+                .where(Pedido.data_atualizacao > self._marca - self.MARGEM)
+                .order_by(Pedido.data_atualizacao)
+            ).all()
+        finally:
+            db.session.remove()
+
+        publicadas = 0
+        for linha in linhas:
+            with self._lock:
+                conhecido = self._status_conhecido.get(linha.id)
+            if conhecido != linha.status:
+                self.barramento.publicar({
+                    'pedido_id': linha.id,
+                    'cliente_id': linha.cliente_id,
+                    'status': linha.status,
+                    'status_anterior': conhecido,
+                    'data_atualizacao': linha.data_atualizacao.isoformat()
+                })
+                publicadas += 1
+            self._marca = max(self._marca, linha.data_atualizacao)
+        return publicadas
+
+
+sincronizador_pedidos = SincronizadorPedidos(barramento_pedidos)
+
+
+def registrar_mudanca_status(pedido_id, cliente_id, status, status_anterior=None, sessao=None):
+    """Agenda a publicação de uma mudança de status para depois do commit da sessão.
+
+    Alterações feitas por objetos ORM são capturadas automaticamente; use esta
+    função para UPDATEs em massa, que não passam pelo flush.
+    """
+    from src.models.user import db
+    sessao = sessao or db.session()
+    dados = {
+        'pedido_id': pedido_id,
+        'cliente_id': cliente_id,
+        'status': status,
+        'status_anterior': status_anterior,
+        'data_atualizacao': datetime.utcnow().isoformat()
+    }
+    for ouvinte in _ouvintes_transacao:
+        ouvinte(sessao, dados)
+    sessao.info.setdefault(CHAVE_MUDANCAS, []).append(dados)
+
+
+@event.listens_for(Session, 'after_flush')
+def _capturar_mudancas_status(sessao, contexto):
+    for obj in itertools.chain(sessao.new, sessao.dirty):
+        if not isinstance(obj, Pedido):
+            continue
+        historico = inspect(obj).attrs.status.history
+        if historico.added:
+            anterior = historico.deleted[0] if historico.deleted else None
+            registrar_mudanca_status(obj.id, obj.cliente_id, historico.added[0], anterior, sessao=sessao)
+
+
+@event.listens_for(Session, 'after_transaction_create')
+def _marcar_savepoint(sessao, transacao):
+    if transacao.nested:
+        sessao.info.setdefault(CHAVE_SAVEPOINTS, {})[transacao] = len(sessao.info.get(CHAVE_MUDANCAS, []))
+
+
+@event.listens_for(Session, 'after_commit')
+def _publicar_mudancas_status(sessao):
+    if sessao.in_nested_transaction():
+        return # RELEASE SAVEPOINT também dispara after_commit; publica só no commit de fora
+    sessao.info.pop(CHAVE_SAVEPOINTS, None)
+    for dados in sessao.info.pop(CHAVE_MUDANCAS, []):
+        barramento_pedidos.publicar(dados)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _descartar_mudancas_status(sessao, transacao_anterior):
+    marca = sessao.info.get(CHAVE_SAVEPOINTS, {}).pop(transacao_anterior, None)
+    if transacao_anterior.nested and marca is not None:
+        # Rollback de um SAVEPOINT descarta só as mudanças feitas dentro dele
+        del sessao.info.get(CHAVE_MUDANCAS, [])[marca:]
+        return
+    sessao.info.pop(CHAVE_SAVEPOINTS, None)
+    sessao.info.pop(CHAVE_MUDANCAS, None)
+
+
+def formatar_sse(evento_id, dados, tipo='status'):
+    """Formata um evento no protocolo text/event-stream."""
+    if evento_id is None:
+        return ': keepalive\n\n'
+    if evento_id == 'reset':
+        return 'event: reset\ndata: {}\n\n'
+    return f'id: {evento_id}\nevent: {tipo}\ndata: {json.dumps(dados)}\n\n'
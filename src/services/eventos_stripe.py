@@ -0,0 +1,189 @@
+import json
+import logging
+import os
+import threading
+from datetime import datetime
+
+from sqlalchemy import update
+
+from src.models.user import db
+from src.models.pedido import Pedido, StatusPedido
+from src.models.pagamento import EventoStripe, StatusEvento
+from src.services.eventos_pedido import registrar_mudanca_status
+
+logger = logging.getLogger(__name__)
+
+# Tipo de evento -> (status de origem, status de destino) do pedido
+TRANSICOES_EVENTO = {
+    'payment_intent.succeeded': (StatusPedido.PAGAMENTO_PENDENTE, StatusPedido.PENDENTE), # Ou APROVADO, dependendo do fluxo
+    'payment_intent.payment_failed': (StatusPedido.PAGAMENTO_PENDENTE, StatusPedido.FALHA_PAGAMENTO),
+}
+
+
+class ConsumidorEventosStripe:
+    """Aplica em lotes os eventos do Stripe gravados pelo webhook.
+
+    O webhook só verifica a assinatura, grava o EventoStripe e responde; este
+    consumidor roda em uma thread de fundo. Cada evento é reivindicado com um
+    UPDATE condicional (recebido -> processado) na mesma transação que altera o
+    pedido, e o pedido só muda se ainda estiver no status de origem, então o
+    efeito é aplicado uma única vez mesmo com vários processos consumindo.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._acordar = threading.Event()
+        self._parar = threading.Event()
+        self._thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('EVENTOS_STRIPE_TAMANHO_LOTE', int(os.getenv('EVENTOS_STRIPE_TAMANHO_LOTE', '100')))
+        app.config.setdefault('EVENTOS_STRIPE_INTERVALO', float(os.getenv('EVENTOS_STRIPE_INTERVALO', '2')))
+        app.config.setdefault('EVENTOS_STRIPE_MAX_TENTATIVAS', int(os.getenv('EVENTOS_STRIPE_MAX_TENTATIVAS', '5')))
+        self.app = app
+        app.extensions['consumidor_eventos_stripe'] = self
+
+    def iniciar(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._loop, name='eventos-stripe', daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+        self._acordar.set()
+
+    def notificar(self):
+        """Acorda o consumidor logo após a gravação de um novo evento."""
+        self._acordar.set()
+
+    def _loop(self):
+        while not self._parar.is_set():
+            self._acordar.wait(self.app.config['EVENTOS_STRIPE_INTERVALO'])
+            self._acordar.clear()
+            try:
+                with self.app.app_context():
+                    # Esvazia a fila antes de voltar a dormir
+                    while not self._parar.is_set() and self.processar_lote():
+                        pass
+            except Exception:
+                logger.exception('Falha ao processar eventos do Stripe')
+
+    def processar_lote(self):
+        """Processa um lote de eventos pendentes em uma única transação. Retorna quantos foram aplicados.
+
+        Cada evento roda em um SAVEPOINT: um evento que falha (ex.: payload
+        que quebra a transição) é desfeito sozinho e tem a falha registrada,
+        sem derrubar os outros do lote. Depois de EVENTOS_STRIPE_MAX_TENTATIVAS
+        falhas ele sai da fila como 'falhou'.
+        """
+        tamanho = self.app.config['EVENTOS_STRIPE_TAMANHO_LOTE']
+        try:
+            eventos = (
+                EventoStripe.query
+                .filter_by(status=StatusEvento.RECEBIDO)
+                .order_by(EventoStripe.data_recebimento)
+                .limit(tamanho)
+                .all()
+            )
+            agora = datetime.utcnow()
+            aplicados = 0
+            for evento in eventos:
+                try:
+                    with db.session.begin_nested():
+                        reivindicado = db.session.execute(
+                            update(EventoStripe)
+                            .where(EventoStripe.id == evento.id, EventoStripe.status == StatusEvento.RECEBIDO)
+                            .values(status=StatusEvento.PROCESSADO, data_processamento=agora)
+                            .execution_options(synchronize_session=False)
+                        ).rowcount
+                        if reivindicado:
+                            resultado = self._aplicar(evento, agora)
+                            db.session.execute(
+                                update(EventoStripe).where(EventoStripe.id == evento.id).values(resultado=resultado)
+                                .execution_options(synchronize_session=False)
+                            )
+                            logger.info('Evento Stripe %s (%s): %s', evento.id, evento.tipo, resultado)
+                except Exception as erro:
+                    self._registrar_falha(evento, erro)
+                else:
+                    aplicados += 1
+            db.session.commit()
+            return aplicados
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            db.session.remove()
+
+    def _registrar_falha(self, evento, erro):
+        """Conta a falha do evento e o tira da fila ao atingir o máximo de tentativas."""
+        tentativas = evento.tentativas + 1
+        esgotado = tentativas >= self.app.config['EVENTOS_STRIPE_MAX_TENTATIVAS']
+        db.session.execute(
+            update(EventoStripe)
+            .where(EventoStripe.id == evento.id, EventoStripe.status == StatusEvento.RECEBIDO)
+            .values(
+                tentativas=tentativas,
+                ultimo_erro=f'{type(erro).__name__}: {erro}'[:1000],
+                status=StatusEvento.FALHOU if esgotado else StatusEvento.RECEBIDO,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if esgotado:
+            logger.error('Evento Stripe %s (%s) falhou %d vezes; desistindo', evento.id, evento.tipo, tentativas,
+                         exc_info=erro)
+        else:
+            logger.warning('Falha ao aplicar o evento Stripe %s (%s), tentativa %d: %s',
+                           evento.id, evento.tipo, tentativas, erro)
+
+    def _aplicar(self, evento, agora):
+        """Aplica a transição de status do evento e retorna uma descrição do resultado."""
+        transicao = TRANSICOES_EVENTO.get(evento.tipo)
+        if not transicao:
+            return 'ignorado'
+
+        try:
+            payment_intent = json.loads(evento.payload)['data']['object']
+        except (ValueError, KeyError, TypeError):
+            return 'payload inválido'
+
+        filtro = self._filtro_pedido(payment_intent)
+        if filtro is None:
+            return 'sem pedido_id nos metadados'
+
+        status_origem, status_destino = transicao
+        pedido = (
+            db.session.query(Pedido.id, Pedido.cliente_id)
+            .filter(filtro, Pedido.status == status_origem)
+            .with_for_update()
+            .first()
+        )
+        if not pedido:
+            return 'pedido não encontrado ou já processado'
+        db.session.execute(
+            update(Pedido)
+            .where(Pedido.id == pedido.id)
+            .values(status=status_destino, data_atualizacao=agora)
+            .execution_options(synchronize_session=False)
+        )
+        registrar_mudanca_status(pedido.id, pedido.cliente_id, status_destino, status_origem)
+        return f'pedido -> {status_destino}'
+
+    @staticmethod
+    def _filtro_pedido(payment_intent):
+        pedido_id = (payment_intent.get('metadata') or {}).get('pedido_id')
+        if pedido_id:
+            try:
+                return Pedido.id == int(pedido_id)
+            except (TypeError, ValueError):
+                return None
+        if payment_intent.get('id'):
+            return Pedido.stripe_payment_intent_id == payment_intent['id']
+        return None
+
+
+consumidor_eventos_stripe = ConsumidorEventosStripe()
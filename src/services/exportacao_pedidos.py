@@ -0,0 +1,131 @@
+import csv
+import io
+import heapq
+import json
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import select
+
+from src.models.user import db
+from src.models.esfiha import Esfiha
+from src.models.pedido import Pedido, ItemPedido
+from src.models.arquivo import PedidoArquivado, ItemPedidoArquivado
+from src.services.serializacao_pedidos import COLUNAS_PEDIDO, item_dict, pedido_json
+
+FORMATOS = ('ndjson', 'csv')
+TIPOS_CONTEUDO = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+LOTE_CURSOR = 1000  # Linhas buscadas por vez no cursor do banco (yield_per)
+TAMANHO_BLOCO = 64 * 1024  # Bytes acumulados antes de enviar um pedaço da resposta
+
+CAMPOS_CSV = (
+    'cursor', 'pedido_id', 'data_criacao', 'data_atualizacao', 'status', 'cliente_id', 'nome_cliente',
+    'telefone', 'forma_entrega', 'valor_total', 'item_id', 'esfiha_id', 'esfiha', 'quantidade',
+    'preco_unitario', 'subtotal',
+)
+
+LinhaPedido = namedtuple('LinhaPedido', [coluna.key for coluna in COLUNAS_PEDIDO])
+
+
+def consulta_exportacao(filtros, modelo_pedido=Pedido, modelo_item=ItemPedido):
+    """Pedidos com seus itens (uma linha por item), em ordem crescente de (data_criacao, id)."""
+    return (
+        select(
+            *[getattr(modelo_pedido, coluna.key) for coluna in COLUNAS_PEDIDO],
+            modelo_item.id, modelo_item.esfiha_id, Esfiha.nome,
+            modelo_item.quantidade, modelo_item.preco_unitario, modelo_item.observacoes,
+        )
+        .outerjoin(modelo_item, modelo_item.pedido_id == modelo_pedido.id)
+        .outerjoin(Esfiha, Esfiha.id == modelo_item.esfiha_id)
+        .where(*filtros)
+        .order_by(modelo_pedido.data_criacao, modelo_pedido.id, modelo_item.id)
+        .execution_options(yield_per=LOTE_CURSOR)
+    )
+
+
+def _pedidos_com_itens(linhas):
+    """Agrupa as linhas consecutivas de um mesmo pedido em (linha_pedido, itens)."""
+    tamanho = len(COLUNAS_PEDIDO)
+    atual, itens = None, []
+    for linha in linhas:
+        pedido, item = LinhaPedido(*linha[:tamanho]), linha[tamanho:]
+        if atual is not None and pedido.id != atual.id:
+            yield atual, itens
+            itens = []
+        atual = pedido
+        if item[0] is not None:
+            itens.append(item_dict(pedido.id, *item))
+    if atual is not None:
+        yield atual, itens
+
+
+def _pedidos_arquivados(filtros):
+    # Conexão própria: o MySQL não aceita dois resultados em streaming na mesma conexão
+    with db.engine.connect() as conexao:
+        yield from _pedidos_com_itens(conexao.execute(
+            consulta_exportacao(filtros, PedidoArquivado, ItemPedidoArquivado)
+        ))
+
+
+def _em_blocos(partes):
+    bloco, tamanho = [], 0
+    for parte in partes:
+        bloco.append(parte)
+        tamanho += len(parte)
+        if tamanho >= TAMANHO_BLOCO:
+            yield b''.join(bloco)
+            bloco, tamanho = [], 0
+    if bloco:
+        yield b''.join(bloco)
+
+
+def _ndjson(pedidos, cursor_de):
+    for pedido, itens in pedidos:
+        cursor = json.dumps(cursor_de(pedido)).encode()
+        yield b'{"cursor":' + cursor + b',' + pedido_json(pedido, itens)[1:] + b'\n'
+
+
+def _csv(pedidos, cursor_de):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer)
+    escritor.writerow(CAMPOS_CSV)
+    # O cabeçalho sai mesmo quando nenhum pedido passa nos filtros
+    yield buffer.getvalue().encode('utf-8')
+    buffer.seek(0)
+    buffer.truncate()
+    for pedido, itens in pedidos:
+        (pedido_id, cliente_id, nome_cliente, telefone, _, forma_entrega, status,
+         valor_total, _, data_criacao, data_atualizacao, _) = pedido
+        inicio = (
+            cursor_de(pedido), pedido_id, data_criacao.isoformat() if data_criacao else '',
+            data_atualizacao.isoformat() if data_atualizacao else '', status, cliente_id, nome_cliente,
+            telefone, forma_entrega, valor_total,
+        )
+        for item in itens or [None]:
+            if item is None:
+                escritor.writerow(inicio)
+            else:
+                escritor.writerow(inicio + (
+                    item['id'], item['esfiha_id'], item['esfiha'], item['quantidade'],
+                    item['preco_unitario'], item['subtotal'],
+                ))
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+
+
+def exportar(filtros, filtros_arquivo, formato, cursor_de):
+    """Gera a exportação em pedaços de bytes; a memória usada não depende do intervalo.
+
+    Os pedidos quentes e os arquivados são lidos em paralelo e intercalados
+    por (data_criacao, id). Cada pedido carrega o cursor que retoma a
+    exportação logo depois dele (`cursor_de(linha)`), para continuar de onde
+    uma transferência parou.
+    """
+    pedidos = heapq.merge(
+        _pedidos_com_itens(db.session.execute(consulta_exportacao(filtros))),
+        _pedidos_arquivados(filtros_arquivo),
+        key=lambda pedido: (pedido[0].data_criacao or datetime.min, pedido[0].id)
+    )
+    gerador = _ndjson if formato == 'ndjson' else _csv
+    return _em_blocos(gerador(pedidos, cursor_de))
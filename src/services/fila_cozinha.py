@@ -0,0 +1,136 @@
+import json
+import logging
+import os
+import threading
+import time
+
+from src.models.user import db
+from src.models.pedido import Pedido, StatusPedido
+from src.services.eventos_pedido import barramento_pedidos
+from src.services.serializacao_pedidos import selecionar_pedidos, serializador_pedidos
+
+logger = logging.getLogger(__name__)
+
+STATUS_ATIVOS = (
+    StatusPedido.PENDENTE, StatusPedido.APROVADO, StatusPedido.EM_PREPARACAO,
+    StatusPedido.PRONTO_RETIRADA, StatusPedido.A_CAMINHO,
+)
+
+
+class FilaCozinha:
+    """Índice em memória dos pedidos em andamento, exibido na tela da cozinha.
+
+    É montado ao iniciar os serviços do processo (uma leitura pelo índice de
+    status), em segundo plano, e atualizado a cada mudança de status publicada
+    no barramento: os pedidos que mudaram são recarregados juntos na próxima
+    leitura, e os que saíram dos status ativos são removidos. Assim o custo da
+    tela depende só dos pedidos abertos.
+
+    As mudanças feitas por outros workers também chegam pelo barramento,
+    republicadas pelo SincronizadorPedidos (src/services/eventos_pedido.py).
+    A remontagem a cada `ressincronizar` segundos é só uma rede de segurança
+    para mudanças que não passaram pelo barramento (ex.: SQL manual no banco).
+    """
+
+    def __init__(self, app=None, ressincronizar=30):
+        self.app = None
+        self.ressincronizar = ressincronizar
+        self._entradas = {}  # pedido_id -> (forma_entrega, data_criacao, json)
+        self._recarregar = set()
+        self._montada_em = None
+        self._corpo = None  # JSON da última resposta, descartado a cada mudança
+        self._lock = threading.Lock()
+        self._lock_atualizacao = threading.Lock()  # Uma leitura do banco por vez; as outras esperam por ela
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['fila_cozinha'] = self
+        self.invalidar()
+
+    def iniciar(self):
+        """Monta o índice em segundo plano, para a primeira tela da cozinha não pagar a leitura completa."""
+        threading.Thread(target=self._montar_em_segundo_plano, name='fila-cozinha', daemon=True).start()
+
+    def _montar_em_segundo_plano(self):
+        try:
+            with self.app.app_context():
+                self.montar()
+        except Exception:
+            logger.exception('Falha ao montar a fila da cozinha; será montada na primeira leitura')
+
+    def montar(self):
+        """Remonta o índice agora a partir do banco."""
+        self.invalidar()
+        self._atualizar()
+
+    def registrar_mudanca(self, dados):
+        with self._lock:
+            if self._montada_em is None:
+                return
+            # Recarregado mesmo se saiu dos ativos: a leitura só traz os que continuam ativos
+            self._recarregar.add(dados['pedido_id'])
+
+    def invalidar(self):
+        with self._lock:
+            self._montada_em = None
+
+    def _carregar(self, filtro):
+        linhas = db.session.execute(
+            selecionar_pedidos().where(Pedido.status.in_(STATUS_ATIVOS), *filtro)
+        ).all()
+        corpos = serializador_pedidos.serializar(linhas)
+        return {linha.id: (linha.forma_entrega, linha.data_criacao, corpo) for linha, corpo in zip(linhas, corpos)}
+
+    def _atualizar(self):
+        with self._lock_atualizacao:
+            self._atualizar_indice()
+
+    def _atualizar_indice(self):
+        with self._lock:
+            montar = self._montada_em is None or time.monotonic() - self._montada_em >= self.ressincronizar
+            pendentes = self._recarregar
+            self._recarregar = set()
+            if not montar and not pendentes:
+                return
+            if montar:
+                self._montada_em = time.monotonic()
+
+        try:
+            carregados = self._carregar([] if montar else [Pedido.id.in_(pendentes)])
+        except Exception:
+            self.invalidar()
+            raise
+
+        with self._lock:
+            if montar:
+                self._entradas = {}
+            else:
+                for pedido_id in pendentes:
+                    self._entradas.pop(pedido_id, None)
+            # Pedidos que mudaram durante a leitura ficam para a próxima
+            for pedido_id, entrada in carregados.items():
+                if pedido_id not in self._recarregar:
+                    self._entradas[pedido_id] = entrada
+            self._corpo = None
+
+    def listar(self):
+        """JSON (bytes) dos pedidos ativos agrupados por forma de entrega, do mais antigo ao mais novo."""
+        self._atualizar()
+        with self._lock:
+            if self._corpo is None:
+                grupos = {}
+                for pedido_id, (forma_entrega, data_criacao, corpo) in sorted(
+                    self._entradas.items(), key=lambda item: (item[1][1], item[0])
+                ):
+                    grupos.setdefault(forma_entrega, []).append(corpo)
+                self._corpo = b'{' + b','.join(
+                    json.dumps(forma_entrega).encode() + b':[' + b','.join(corpos) + b']'
+                    for forma_entrega, corpos in sorted(grupos.items())
+                ) + b'}'
+            return self._corpo
+
+
+fila_cozinha = FilaCozinha(ressincronizar=float(os.getenv('FILA_COZINHA_RESSINCRONIZAR', '30')))
+barramento_pedidos.adicionar_ouvinte(fila_cozinha.registrar_mudanca)
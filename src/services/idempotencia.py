@@ -0,0 +1,151 @@
+import hashlib
+import os
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+
+from flask import Response, g, jsonify, make_response, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from src.models.user import db
+from src.models.idempotencia import RespostaIdempotente, StatusIdempotencia
+
+CABECALHO = 'Idempotency-Key'
+TAMANHO_MAXIMO_CHAVE = 255
+TTL = timedelta(hours=float(os.getenv('IDEMPOTENCIA_TTL_HORAS', '24')))
+ESPERA_MAXIMA = float(os.getenv('IDEMPOTENCIA_ESPERA', '10')) # Quanto um duplicado espera pelo primeiro request
+TIMEOUT_PROCESSANDO = timedelta(seconds=float(os.getenv('IDEMPOTENCIA_TIMEOUT_PROCESSANDO', '60')))
+
+
+def _erro(mensagem, codigo):
+    return jsonify({"status": "error", "message": mensagem}), codigo
+
+
+def _ler(escopo, chave):
+    try:
+        return db.session.execute(
+            select(
+                RespostaIdempotente.hash_requisicao, RespostaIdempotente.status, RespostaIdempotente.codigo_http,
+                RespostaIdempotente.corpo, RespostaIdempotente.data_criacao, RespostaIdempotente.expira_em,
+            ).where(RespostaIdempotente.escopo == escopo, RespostaIdempotente.chave == chave)
+        ).first()
+    finally:
+        db.session.rollback() # Encerra a leitura para a próxima enxergar o que outros requests gravaram
+
+
+def _reivindicar(escopo, chave, hash_requisicao):
+    """Cria o registro 'processando' da chave ou devolve a resposta para o request repetido.
+
+    Retorna None quando este request deve executar a rota. Um duplicado
+    concorrente espera até ESPERA_MAXIMA pelo primeiro e recebe a resposta dele.
+    """
+    prazo = time.monotonic() + ESPERA_MAXIMA
+    intervalo = 0.05
+    while True:
+        agora = datetime.utcnow()
+        try:
+            db.session.execute(insert(RespostaIdempotente).values(
+                escopo=escopo, chave=chave, hash_requisicao=hash_requisicao,
+                status=StatusIdempotencia.PROCESSANDO, data_criacao=agora, expira_em=agora + TTL
+            ))
+            db.session.commit()
+            return None
+        except IntegrityError:
+            db.session.rollback()
+
+        registro = _ler(escopo, chave)
+        if registro is None:
+            continue
+        abandonado = registro.status == StatusIdempotencia.PROCESSANDO and registro.data_criacao < agora - TIMEOUT_PROCESSANDO
+        if registro.expira_em <= agora or abandonado:
+            # Remove só se ninguém reivindicou a chave nesse meio tempo
+            db.session.execute(delete(RespostaIdempotente).where(
+                RespostaIdempotente.escopo == escopo, RespostaIdempotente.chave == chave,
+                RespostaIdempotente.data_criacao == registro.data_criacao
+            ))
+            db.session.commit()
+            continue
+        if registro.hash_requisicao != hash_requisicao:
+            return _erro(f"{CABECALHO} já usada com outro corpo de requisição.", 422)
+        if registro.status == StatusIdempotencia.CONCLUIDO:
+            return Response(registro.corpo, status=registro.codigo_http, mimetype='application/json',
+                            headers={'Idempotent-Replayed': 'true'})
+        if time.monotonic() >= prazo:
+            return _erro(f"Requisição com esta {CABECALHO} ainda em processamento. Tente novamente.", 409)
+        time.sleep(intervalo)
+        intervalo = min(intervalo * 2, 0.5)
+
+
+def _concluir(escopo, chave, resposta):
+    db.session.execute(
+        update(RespostaIdempotente)
+        .where(RespostaIdempotente.escopo == escopo, RespostaIdempotente.chave == chave)
+        .values(status=StatusIdempotencia.CONCLUIDO, codigo_http=resposta.status_code, corpo=resposta.get_data(as_text=True))
+    )
+
+
+def _liberar(escopo, chave):
+    db.session.rollback()
+    db.session.execute(delete(RespostaIdempotente).where(
+        RespostaIdempotente.escopo == escopo, RespostaIdempotente.chave == chave
+    ))
+    db.session.commit()
+
+
+def guardar_resposta(resposta):
+    """Grava a resposta da chave atual na transação da rota, antes do commit.
+
+    Assim o registro da resposta e as escritas da rota são confirmados juntos,
+    e uma queda entre os dois não permite reexecutar a rota. Sem chave, não faz nada.
+    """
+    if 'idempotencia' in g:
+        _concluir(*g.idempotencia, resposta)
+        g.idempotencia_guardada = True
+    return resposta
+
+
+def idempotente(view):
+    """Torna a rota idempotente para requests com o cabeçalho Idempotency-Key.
+
+    Deve ficar abaixo de @jwt_required (mesmo opcional): as chaves valem por
+    rota e usuário, e os anônimos dividem um escopo, então a chave precisa ser
+    aleatória (ex.: UUID v4). Respostas 2xx e 4xx são guardadas e reenviadas
+    às repetições; em caso de erro 5xx a chave é liberada para nova tentativa.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        chave = request.headers.get(CABECALHO)
+        if not chave:
+            return view(*args, **kwargs)
+        if len(chave) > TAMANHO_MAXIMO_CHAVE:
+            return _erro(f"{CABECALHO} deve ter no máximo {TAMANHO_MAXIMO_CHAVE} caracteres.", 400)
+
+        escopo = f'{request.endpoint}:{get_jwt_identity()}'[:100]
+        repetida = _reivindicar(escopo, chave, hashlib.sha256(request.get_data()).hexdigest())
+        if repetida is not None:
+            return repetida
+
+        g.idempotencia = (escopo, chave)
+        try:
+            resposta = make_response(view(*args, **kwargs))
+        except Exception:
+            _liberar(escopo, chave)
+            raise
+        if resposta.status_code >= 500:
+            _liberar(escopo, chave)
+        elif not g.pop('idempotencia_guardada', False):
+            _concluir(escopo, chave, resposta)
+            db.session.commit()
+        return resposta
+    return wrapper
+
+
+def limpar_expiradas():
+    """Apaga as respostas guardadas que já expiraram. Retorna quantas foram removidas."""
+    removidas = db.session.execute(
+        delete(RespostaIdempotente).where(RespostaIdempotente.expira_em < datetime.utcnow())
+    ).rowcount
+    db.session.commit()
+    return removidas
@@ -0,0 +1,193 @@
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+from src.models.user import db
+
+logger = logging.getLogger(__name__)
+
+BUCKETS_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_CONSULTAS = (1, 2, 3, 5, 10, 20, 50, 100)
+MAXIMO_SQL_CAPTURADO = 50
+COMANDOS_ESCRITA = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+
+class Histograma:
+    """Histograma cumulativo no formato do Prometheus, separado por labels."""
+
+    def __init__(self, nome, ajuda, buckets):
+        self.nome = nome
+        self.ajuda = ajuda
+        self.buckets = buckets
+        self._series = {}  # labels -> [contagens por bucket..., soma, total]
+        self._lock = threading.Lock()
+
+    def observar(self, valor, **labels):
+        chave = tuple(sorted(labels.items()))
+        with self._lock:
+            serie = self._series.get(chave)
+            if serie is None:
+                serie = self._series[chave] = [0] * (len(self.buckets) + 2)
+            for indice, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[indice] += 1
+            serie[-2] += valor
+            serie[-1] += 1
+
+    def exportar(self):
+        linhas = [f'# HELP {self.nome} {self.ajuda}', f'# TYPE {self.nome} histogram']
+        with self._lock:
+            series = {chave: list(serie) for chave, serie in self._series.items()}
+        for chave, serie in sorted(series.items()):
+            for limite, contagem in zip(self.buckets, serie):
+                linhas.append(f'{self.nome}_bucket{_labels(chave + (("le", str(limite)),))} {contagem}')
+            linhas.append(f'{self.nome}_bucket{_labels(chave + (("le", "+Inf"),))} {serie[-1]}')
+            linhas.append(f'{self.nome}_sum{_labels(chave)} {serie[-2]:.6f}')
+            linhas.append(f'{self.nome}_count{_labels(chave)} {serie[-1]}')
+        return linhas
+
+
+def _labels(pares):
+    if not pares:
+        return ''
+    conteudo = ','.join(
+        f'{chave}="{str(valor).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+        for chave, valor in pares
+    )
+    return '{' + conteudo + '}'
+
+
+class Metricas:
+    """Instrumentação por request (latência, SQL) e das chamadas ao Stripe, exposta em /metrics.
+
+    Os valores são do processo atual: com vários workers do gunicorn, cada um
+    responde com os seus próprios contadores.
+    """
+
+    def __init__(self):
+        self.duracao_request = Histograma(
+            'esfiharia_http_request_segundos', 'Latência das requisições HTTP por rota', BUCKETS_SEGUNDOS)
+        self.consultas_request = Histograma(
+            'esfiharia_http_request_consultas_sql', 'Consultas SQL executadas por requisição', BUCKETS_CONSULTAS)
+        self.tempo_sql_request = Histograma(
+            'esfiharia_http_request_sql_segundos', 'Tempo gasto em SQL por requisição', BUCKETS_SEGUNDOS)
+        self.escrita_sql = Histograma(
+            'esfiharia_db_escrita_segundos',
+            'Duração de comandos de escrita, incluindo a espera pelo lock de escrita do SQLite',
+            BUCKETS_SEGUNDOS)
+        self.chamadas_stripe = Histograma(
+            'esfiharia_stripe_chamada_segundos', 'Duração das chamadas ao Stripe', BUCKETS_SEGUNDOS)
+        self._histogramas = [
+            self.duracao_request, self.consultas_request, self.tempo_sql_request,
+            self.escrita_sql, self.chamadas_stripe,
+        ]
+        self._coletores = {}  # nome -> função; registrar de novo com o mesmo nome substitui
+        self.limite_lento = None
+
+    def init_app(self, app):
+        app.config.setdefault('METRICAS_LIMITE_LENTO', float(os.getenv('METRICAS_LIMITE_LENTO', '0.5')))
+        self.limite_lento = app.config['METRICAS_LIMITE_LENTO']
+
+        app.before_request(self._iniciar_request)
+        app.after_request(self._finalizar_request)
+        app.add_url_rule('/metrics', 'metricas', self._endpoint)
+
+        with app.app_context():
+            event.listen(db.engine, 'before_cursor_execute', self._antes_consulta)
+            event.listen(db.engine, 'after_cursor_execute', self._depois_consulta)
+            event.listen(db.engine, 'handle_error', self._erro_consulta)
+        app.extensions['metricas'] = self
+
+    def registrar_coletor(self, coletor, nome=None):
+        """Registra uma função que retorna linhas extras no formato de texto do Prometheus.
+
+        Um coletor já registrado com o mesmo `nome` é substituído, para que
+        chamar create_app() mais de uma vez não duplique as séries.
+        """
+        self._coletores[nome or coletor] = coletor
+
+    def registrar_estatisticas(self, prefixo, obter_estatisticas, contadores=()):
+        """Exporta os valores numéricos de um dicionário de estatísticas como `<prefixo>_<chave>`."""
+        def coletor():
+            linhas = []
+            for chave, valor in obter_estatisticas().items():
+                if isinstance(valor, (int, float)):
+                    tipo = 'counter' if chave in contadores else 'gauge'
+                    linhas += [f'# TYPE {prefixo}_{chave} {tipo}', f'{prefixo}_{chave} {valor}']
+            return linhas
+        self.registrar_coletor(coletor, nome=prefixo)
+
+    @contextmanager
+    def medir_stripe(self, operacao):
+        """Mede uma chamada ao Stripe, rotulada pela operação e pelo resultado (ok/erro)."""
+        inicio = time.perf_counter()
+        resultado = 'erro'
+        try:
+            yield
+            resultado = 'ok'
+        finally:
+            self.chamadas_stripe.observar(time.perf_counter() - inicio, operacao=operacao, resultado=resultado)
+
+    def _iniciar_request(self):
+        g.metricas_inicio = time.perf_counter()
+        g.metricas_consultas = 0
+        g.metricas_tempo_sql = 0.0
+        g.metricas_sql = []
+
+    def _finalizar_request(self, resposta):
+        inicio = g.pop('metricas_inicio', None)
+        if inicio is None:
+            return resposta
+        duracao = time.perf_counter() - inicio
+        rota = request.url_rule.rule if request.url_rule else '<sem rota>'
+
+        self.duracao_request.observar(duracao, rota=rota, metodo=request.method, status=resposta.status_code)
+        self.consultas_request.observar(g.metricas_consultas, rota=rota)
+        self.tempo_sql_request.observar(g.metricas_tempo_sql, rota=rota)
+
+        if duracao >= self.limite_lento:
+            logger.warning(
+                'Requisição lenta: %s %s (%s) %.3fs, %d consultas SQL em %.3fs\n%s',
+                request.method, request.path, rota, duracao, g.metricas_consultas, g.metricas_tempo_sql,
+                '\n'.join(f'  [{tempo * 1000:.1f} ms] {sql}' for tempo, sql in g.metricas_sql)
+            )
+        return resposta
+
+    def _antes_consulta(self, conexao, cursor, sql, parametros, contexto, executemany):
+        conexao.info.setdefault('metricas_inicio_consulta', []).append(time.perf_counter())
+
+    def _depois_consulta(self, conexao, cursor, sql, parametros, contexto, executemany):
+        duracao = time.perf_counter() - conexao.info['metricas_inicio_consulta'].pop()
+        if sql.lstrip().upper().startswith(COMANDOS_ESCRITA):
+            self.escrita_sql.observar(duracao)
+        if has_request_context() and 'metricas_consultas' in g:
+            g.metricas_consultas += 1
+            g.metricas_tempo_sql += duracao
+            if len(g.metricas_sql) < MAXIMO_SQL_CAPTURADO:
+                g.metricas_sql.append((duracao, ' '.join(sql.split())))
+
+    def _erro_consulta(self, contexto):
+        # Comandos que falham (ex.: IntegrityError esperado) não passam por
+        # after_cursor_execute; descarta o início para não acumular na conexão do pool
+        conexao = contexto.connection
+        if conexao is not None and conexao.info.get('metricas_inicio_consulta'):
+            conexao.info['metricas_inicio_consulta'].pop()
+
+    def exportar(self):
+        linhas = []
+        for histograma in self._histogramas:
+            linhas += histograma.exportar()
+        for coletor in list(self._coletores.values()):
+            linhas += coletor()
+        return '\n'.join(linhas) + '\n'
+
+    def _endpoint(self):
+        return self.exportar(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
+
+metricas = Metricas()
@@ -0,0 +1,181 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, or_, update
+
+from src.models.user import db
+from src.models.pedido import Pedido, StatusPedido
+from src.models.pagamento import PagamentoOutbox, StatusOutbox
+from src.services.cliente_stripe import cliente_stripe
+from src.services.metricas import metricas
+from src.services.pedidos_abandonados import coletor_pedidos_abandonados
+
+logger = logging.getLogger(__name__)
+
+
+def _erro_retentavel(erro):
+    """Erros transitórios do Stripe que justificam nova tentativa."""
+    stripe = cliente_stripe.obter()
+    return isinstance(erro, (stripe.error.APIConnectionError, stripe.error.RateLimitError, stripe.error.APIError))
+
+
+class DespachantePagamentos:
+    """Cria os Payment Intents do outbox em um pool de workers dedicado.
+
+    O request apenas grava Pedido + PagamentoOutbox e chama enfileirar(); a
+    chamada ao Stripe acontece fora de qualquer transação, então nem a thread
+    do request nem o lock de escrita do SQLite esperam pela rede. Falhas
+    transitórias são reagendadas com backoff exponencial e reprocessadas pela
+    varredura periódica, que também recupera linhas deixadas por um worker
+    que morreu no meio da chamada. A idempotency key por pedido garante que
+    uma nova tentativa nunca crie um segundo intent no Stripe.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._executor = None
+        self._parar = threading.Event()
+        self._thread_varredura = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PAGAMENTO_WORKERS', int(os.getenv('PAGAMENTO_WORKERS', '4')))
+        app.config.setdefault('PAGAMENTO_MAX_TENTATIVAS', int(os.getenv('PAGAMENTO_MAX_TENTATIVAS', '6')))
+        app.config.setdefault('PAGAMENTO_BACKOFF_BASE', float(os.getenv('PAGAMENTO_BACKOFF_BASE', '2')))
+        app.config.setdefault('PAGAMENTO_BACKOFF_MAXIMO', float(os.getenv('PAGAMENTO_BACKOFF_MAXIMO', '300')))
+        app.config.setdefault('PAGAMENTO_INTERVALO_VARREDURA', float(os.getenv('PAGAMENTO_INTERVALO_VARREDURA', '5')))
+        app.config.setdefault('PAGAMENTO_TIMEOUT_PROCESSANDO', float(os.getenv('PAGAMENTO_TIMEOUT_PROCESSANDO', '120')))
+
+        self.app = app
+        if self._executor is not None:
+            # Novo create_app (testes, recarga): encerra o pool anterior em vez de deixá-lo órfão
+            self._executor.shutdown(wait=False)
+        self._executor = ThreadPoolExecutor(
+            max_workers=app.config['PAGAMENTO_WORKERS'],
+            thread_name_prefix='pagamento'
+        )
+        app.extensions['despachante_pagamentos'] = self
+
+    def iniciar_varredura(self):
+        """Inicia a thread que reenvia entradas vencidas do outbox."""
+        if self._thread_varredura and self._thread_varredura.is_alive():
+            return
+        self._parar.clear()
+        self._thread_varredura = threading.Thread(target=self._loop_varredura, name='pagamento-varredura', daemon=True)
+        self._thread_varredura.start()
+
+    def parar(self):
+        self._parar.set()
+        if self._executor:
+            self._executor.shutdown(wait=False)
+
+    def enfileirar(self, pedido_id):
+        self._executor.submit(self._processar, pedido_id)
+
+    def _loop_varredura(self):
+        while not self._parar.wait(self.app.config['PAGAMENTO_INTERVALO_VARREDURA']):
+            try:
+                with self.app.app_context():
+                    for pedido_id in self._pedidos_vencidos():
+                        self.enfileirar(pedido_id)
+            except Exception:
+                logger.exception('Falha na varredura do outbox de pagamentos')
+
+    def _pedidos_vencidos(self):
+        try:
+            return [pedido_id for (pedido_id,) in db.session.query(PagamentoOutbox.pedido_id).filter(
+                self._condicao_reivindicavel(datetime.utcnow())
+            ).limit(100)]
+        finally:
+            db.session.remove()
+
+    def _condicao_reivindicavel(self, agora):
+        limite_processando = agora - timedelta(seconds=self.app.config['PAGAMENTO_TIMEOUT_PROCESSANDO'])
+        return or_(
+            and_(PagamentoOutbox.status == StatusOutbox.PENDENTE, PagamentoOutbox.proxima_tentativa_em <= agora),
+            and_(PagamentoOutbox.status == StatusOutbox.PROCESSANDO, PagamentoOutbox.data_atualizacao < limite_processando)
+        )
+
+    def _processar(self, pedido_id):
+        with self.app.app_context():
+            try:
+                self._criar_intent(pedido_id)
+            except Exception:
+                db.session.rollback()
+                logger.exception('Erro ao processar pagamento do pedido %s', pedido_id)
+            finally:
+                db.session.remove()
+
+    def _criar_intent(self, pedido_id):
+        agora = datetime.utcnow()
+        # Reivindica a entrada com um UPDATE condicional, para que dois workers
+        # (ou dois processos) nunca processem o mesmo pedido ao mesmo tempo
+        resultado = db.session.execute(
+            update(PagamentoOutbox)
+            .where(PagamentoOutbox.pedido_id == pedido_id, self._condicao_reivindicavel(agora))
+            .values(status=StatusOutbox.PROCESSANDO, tentativas=PagamentoOutbox.tentativas + 1, data_atualizacao=agora)
+        )
+        db.session.commit()
+        if resultado.rowcount == 0:
+            return
+
+        pedido = db.session.get(Pedido, pedido_id)
+        parametros = {
+            'amount': int(round(pedido.valor_total * 100)), # O valor deve ser em centavos
+            'currency': 'brl',
+            'metadata': {
+                'pedido_id': pedido.id,
+                'cliente_nome': pedido.nome_cliente,
+                'cliente_telefone': pedido.telefone
+            },
+            # Habilitar métodos de pagamento desejados (ex: card, pix)
+            'automatic_payment_methods': {'enabled': True},
+        }
+        db.session.commit() # Encerra a transação de leitura antes da chamada de rede
+
+        stripe = cliente_stripe.obter()
+        try:
+            with metricas.medir_stripe('payment_intent.create'):
+                intent = stripe.PaymentIntent.create(**parametros, idempotency_key=f'pedido-{pedido_id}-intent')
+        except stripe.error.StripeError as e:
+            self._registrar_falha(pedido_id, e)
+            return
+
+        entrada = PagamentoOutbox.query.filter_by(pedido_id=pedido_id).one()
+        entrada.pedido.stripe_payment_intent_id = intent.id
+        if entrada.pedido.status != StatusPedido.PAGAMENTO_PENDENTE:
+            # O pedido foi cancelado enquanto o intent era criado: não entrega o client_secret
+            db.session.commit()
+            coletor_pedidos_abandonados.cancelar_intents([intent.id])
+            return
+        entrada.status = StatusOutbox.CONCLUIDO
+        entrada.client_secret = intent.client_secret
+        entrada.ultimo_erro = None
+        db.session.commit()
+
+    def _registrar_falha(self, pedido_id, erro):
+        entrada = PagamentoOutbox.query.filter_by(pedido_id=pedido_id).one()
+        entrada.ultimo_erro = str(erro)
+        if _erro_retentavel(erro) and entrada.tentativas < self.app.config['PAGAMENTO_MAX_TENTATIVAS']:
+            atraso = min(
+                self.app.config['PAGAMENTO_BACKOFF_BASE'] ** entrada.tentativas,
+                self.app.config['PAGAMENTO_BACKOFF_MAXIMO']
+            )
+            entrada.status = StatusOutbox.PENDENTE
+            entrada.proxima_tentativa_em = datetime.utcnow() + timedelta(seconds=atraso)
+            logger.warning('Stripe indisponível para o pedido %s (tentativa %s), nova tentativa em %.0fs: %s',
+                           pedido_id, entrada.tentativas, atraso, erro)
+        else:
+            entrada.status = StatusOutbox.FALHOU
+            if entrada.pedido.status == StatusPedido.PAGAMENTO_PENDENTE:
+                entrada.pedido.status = StatusPedido.FALHA_PAGAMENTO
+                entrada.pedido.data_atualizacao = datetime.utcnow()
+            logger.error('Não foi possível criar o Payment Intent do pedido %s: %s', pedido_id, erro)
+        db.session.commit()
+
+
+despachante_pagamentos = DespachantePagamentos()
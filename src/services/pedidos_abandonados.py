@@ -0,0 +1,243 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, update
+
+from src.models.user import db
+from src.models.pedido import Pedido, StatusPedido
+from src.models.pagamento import PagamentoOutbox, StatusOutbox
+from src.services.cliente_stripe import cliente_stripe
+from src.services.eventos_pedido import registrar_mudanca_status
+from src.services.metricas import metricas
+
+logger = logging.getLogger(__name__)
+
+
+class LimitadorTaxa:
+    """Token bucket compartilhado pelas threads: no máximo `por_segundo` chamadas por segundo."""
+
+    def __init__(self, por_segundo):
+        self.intervalo = 1 / por_segundo
+        self._proxima = time.monotonic()
+        self._lock = threading.Lock()
+
+    def aguardar(self):
+        with self._lock:
+            agora = time.monotonic()
+            espera = self._proxima - agora
+            self._proxima = max(self._proxima, agora) + self.intervalo
+        if espera > 0:
+            time.sleep(espera)
+
+
+class ColetorPedidosAbandonados:
+    """Cancela pedidos que ficaram em PAGAMENTO_PENDENTE além do prazo.
+
+    Uma thread de fundo busca os pedidos vencidos pelo índice (status,
+    data_criacao) em lotes e os move para CANCELADO com um UPDATE por lote,
+    encerrando também as entradas do outbox para que nenhum Payment Intent
+    novo seja criado. Os intents já existentes são cancelados no Stripe depois
+    do commit, por um pool de workers limitado a STRIPE_CANCELAMENTOS_POR_SEGUNDO;
+    se o cancelamento falhar porque o intent já foi pago, o pedido volta para
+    PENDENTE.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._executor = None
+        self._limitador = None
+        self._parar = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._contadores = {
+            'execucoes': 0,
+            'pedidos_cancelados': 0,
+            'intents_cancelados': 0,
+            'intents_com_erro': 0,
+            'pedidos_restaurados': 0,
+        }
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ABANDONADOS_PRAZO_MINUTOS', float(os.getenv('ABANDONADOS_PRAZO_MINUTOS', '60')))
+        app.config.setdefault('ABANDONADOS_INTERVALO', float(os.getenv('ABANDONADOS_INTERVALO', '300')))
+        app.config.setdefault('ABANDONADOS_TAMANHO_LOTE', int(os.getenv('ABANDONADOS_TAMANHO_LOTE', '200')))
+        app.config.setdefault('ABANDONADOS_WORKERS', int(os.getenv('ABANDONADOS_WORKERS', '4')))
+        app.config.setdefault('STRIPE_CANCELAMENTOS_POR_SEGUNDO', float(os.getenv('STRIPE_CANCELAMENTOS_POR_SEGUNDO', '20')))
+
+        self.app = app
+        self._limitador = LimitadorTaxa(app.config['STRIPE_CANCELAMENTOS_POR_SEGUNDO'])
+        if self._executor is not None:
+            # init_app de novo: os cancelamentos já enviados terminam no pool antigo
+            self._executor.shutdown(wait=False)
+        self._executor = ThreadPoolExecutor(
+            max_workers=app.config['ABANDONADOS_WORKERS'],
+            thread_name_prefix='cancelar-intent'
+        )
+        app.extensions['coletor_pedidos_abandonados'] = self
+
+    def iniciar(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._parar.clear()
+        self._thread = threading.Thread(target=self._loop, name='pedidos-abandonados', daemon=True)
+        self._thread.start()
+
+    def parar(self):
+        self._parar.set()
+        if self._executor:
+            self._executor.shutdown(wait=False)
+
+    def estatisticas(self):
+        with self._lock:
+            return dict(self._contadores)
+
+    def _somar(self, **valores):
+        with self._lock:
+            for chave, valor in valores.items():
+                self._contadores[chave] += valor
+
+    def _loop(self):
+        while not self._parar.wait(self.app.config['ABANDONADOS_INTERVALO']):
+            try:
+                with self.app.app_context():
+                    total = self.coletar()
+                if total:
+                    logger.info('Pedidos com pagamento abandonado cancelados: %d', total)
+            except Exception:
+                logger.exception('Falha ao cancelar pedidos com pagamento abandonado')
+
+    def coletar(self):
+        """Cancela todos os pedidos vencidos, lote a lote. Retorna quantos foram cancelados."""
+        total = 0
+        while not self._parar.is_set():
+            cancelados = self.coletar_lote()
+            total += cancelados
+            if cancelados < self.app.config['ABANDONADOS_TAMANHO_LOTE']:
+                break
+        self._somar(execucoes=1)
+        return total
+
+    def coletar_lote(self):
+        """Cancela um lote em uma única transação e agenda o cancelamento dos intents."""
+        agora = datetime.utcnow()
+        limite = agora - timedelta(minutes=self.app.config['ABANDONADOS_PRAZO_MINUTOS'])
+        try:
+            linhas = db.session.execute(
+                select(Pedido.id, Pedido.cliente_id, Pedido.stripe_payment_intent_id)
+                .where(Pedido.status == StatusPedido.PAGAMENTO_PENDENTE, Pedido.data_criacao < limite)
+                .order_by(Pedido.data_criacao)
+                .limit(self.app.config['ABANDONADOS_TAMANHO_LOTE'])
+                .with_for_update()
+            ).all()
+            if not linhas:
+                return 0
+
+            ids = [linha.id for linha in linhas]
+            alterados = db.session.execute(
+                update(Pedido)
+                .where(Pedido.id.in_(ids), Pedido.status == StatusPedido.PAGAMENTO_PENDENTE)
+                .values(status=StatusPedido.CANCELADO, data_atualizacao=agora)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if alterados < len(ids):
+                # Algum pedido mudou entre a leitura e o UPDATE (ex.: webhook); só os nossos contam
+                cancelados = set(db.session.execute(
+                    select(Pedido.id).where(
+                        Pedido.id.in_(ids), Pedido.status == StatusPedido.CANCELADO, Pedido.data_atualizacao == agora
+                    )
+                ).scalars())
+                linhas = [linha for linha in linhas if linha.id in cancelados]
+
+            encerrar_outbox([linha.id for linha in linhas], 'Pedido cancelado por abandono do pagamento')
+            for linha in linhas:
+                registrar_mudanca_status(linha.id, linha.cliente_id, StatusPedido.CANCELADO, StatusPedido.PAGAMENTO_PENDENTE)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+        finally:
+            db.session.remove()
+
+        self._somar(pedidos_cancelados=len(linhas))
+        self.cancelar_intents([linha.stripe_payment_intent_id for linha in linhas if linha.stripe_payment_intent_id])
+        return len(linhas)
+
+    def cancelar_intents(self, payment_intent_ids, motivo='abandoned'):
+        """Agenda o cancelamento dos Payment Intents no Stripe, respeitando o limite de taxa."""
+        for payment_intent_id in payment_intent_ids:
+            self._executor.submit(self._cancelar_intent, payment_intent_id, motivo)
+
+    def _cancelar_intent(self, payment_intent_id, motivo):
+        self._limitador.aguardar()
+        stripe = cliente_stripe.obter()
+        try:
+            with metricas.medir_stripe('payment_intent.cancel'):
+                stripe.PaymentIntent.cancel(payment_intent_id, cancellation_reason=motivo)
+            self._somar(intents_cancelados=1)
+        except stripe.error.StripeError as e:
+            self._somar(intents_com_erro=1)
+            logger.error('Erro ao cancelar o Payment Intent %s: %s', payment_intent_id, e)
+            self._conferir_intent(stripe, payment_intent_id)
+
+    def _conferir_intent(self, stripe, payment_intent_id):
+        """Devolve ao fluxo pós-pagamento o pedido cancelado cujo intent já tinha sido pago."""
+        try:
+            with metricas.medir_stripe('payment_intent.retrieve'):
+                intent = stripe.PaymentIntent.retrieve(payment_intent_id)
+        except stripe.error.StripeError as e:
+            logger.error('Erro ao consultar o Payment Intent %s; confira o pedido manualmente: %s', payment_intent_id, e)
+            return
+        if intent.status != 'succeeded':
+            return
+
+        with self.app.app_context():
+            try:
+                pedido = db.session.execute(
+                    select(Pedido.id, Pedido.cliente_id).where(
+                        Pedido.stripe_payment_intent_id == payment_intent_id, Pedido.status == StatusPedido.CANCELADO
+                    ).with_for_update()
+                ).first()
+                if pedido is None:
+                    return
+                # Mesmo destino do webhook payment_intent.succeeded, que ignora pedidos já cancelados
+                db.session.execute(
+                    update(Pedido)
+                    .where(Pedido.id == pedido.id, Pedido.status == StatusPedido.CANCELADO)
+                    .values(status=StatusPedido.PENDENTE, data_atualizacao=datetime.utcnow())
+                    .execution_options(synchronize_session=False)
+                )
+                registrar_mudanca_status(pedido.id, pedido.cliente_id, StatusPedido.PENDENTE, StatusPedido.CANCELADO)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                logger.exception('Erro ao restaurar o pedido do Payment Intent pago %s', payment_intent_id)
+                return
+            finally:
+                db.session.remove()
+        self._somar(pedidos_restaurados=1)
+        logger.warning('Pedido %s já estava pago no Stripe (%s): voltou para %s',
+                       pedido.id, payment_intent_id, StatusPedido.PENDENTE)
+
+
+def encerrar_outbox(pedido_ids, motivo):
+    """Marca como falhas as entradas do outbox ainda não enviadas, para o despachante não criar o intent."""
+    if not pedido_ids:
+        return
+    db.session.execute(
+        update(PagamentoOutbox)
+        .where(
+            PagamentoOutbox.pedido_id.in_(pedido_ids),
+            PagamentoOutbox.status.in_((StatusOutbox.PENDENTE, StatusOutbox.PROCESSANDO))
+        )
+        .values(status=StatusOutbox.FALHOU, ultimo_erro=motivo, data_atualizacao=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+
+
+coletor_pedidos_abandonados = ColetorPedidosAbandonados()
@@ -0,0 +1,173 @@
+from datetime import date
+
+from sqlalchemy import case, delete, func, insert, select, union_all
+
+from src.models.user import db
+from src.models.esfiha import Esfiha
+from src.models.pedido import Pedido, ItemPedido, StatusPedido
+from src.models.arquivo import PedidoArquivado, ItemPedidoArquivado
+from src.models.relatorio import VendaDiaria
+from src.services.eventos_pedido import adicionar_ouvinte_transacao
+
+GRUPO_PAGO = 'pago'
+GRUPO_CANCELADO = 'cancelado'
+GRUPO_FALHA = 'falha'
+
+# Status -> grupo do relatório; pedidos aguardando pagamento não entram
+GRUPOS_STATUS = {
+    StatusPedido.PENDENTE: GRUPO_PAGO,
+    StatusPedido.APROVADO: GRUPO_PAGO,
+    StatusPedido.EM_PREPARACAO: GRUPO_PAGO,
+    StatusPedido.A_CAMINHO: GRUPO_PAGO,
+    StatusPedido.PRONTO_RETIRADA: GRUPO_PAGO,
+    StatusPedido.ENTREGUE: GRUPO_PAGO,
+    StatusPedido.CANCELADO: GRUPO_CANCELADO,
+    StatusPedido.RECUSADO: GRUPO_CANCELADO,
+    StatusPedido.FALHA_PAGAMENTO: GRUPO_FALHA,
+}
+
+AGRUPAMENTOS = ('dia', 'esfiha', 'categoria')
+
+
+def _upsert_somando(conexao, linhas):
+    """Soma quantidade/receita nas linhas de VendaDiaria, criando as que não existem."""
+    tabela = VendaDiaria.__table__
+    dialeto = conexao.dialect.name
+    if dialeto == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as insert_dialeto
+        comando = insert_dialeto(tabela)
+        comando = comando.on_conflict_do_update(
+            index_elements=[tabela.c.dia, tabela.c.esfiha_id, tabela.c.grupo_status],
+            set_={
+                'quantidade': tabela.c.quantidade + comando.excluded.quantidade,
+                'receita': tabela.c.receita + comando.excluded.receita,
+            }
+        )
+    elif dialeto == 'mysql':
+        from sqlalchemy.dialects.mysql import insert as insert_dialeto
+        comando = insert_dialeto(tabela)
+        comando = comando.on_duplicate_key_update(
+            quantidade=tabela.c.quantidade + comando.inserted.quantidade,
+            receita=tabela.c.receita + comando.inserted.receita,
+        )
+    else:
+        raise NotImplementedError(f'Upsert de relatórios não suportado para {dialeto}')
+    conexao.execute(comando, linhas)
+
+
+def aplicar_transicao(sessao, dados):
+    """Move os totais do pedido entre grupos de status, na transação da mudança."""
+    grupo_anterior = GRUPOS_STATUS.get(dados['status_anterior'])
+    grupo_novo = GRUPOS_STATUS.get(dados['status'])
+    if grupo_anterior == grupo_novo:
+        return
+
+    conexao = sessao.connection()
+    data_criacao = conexao.execute(
+        select(Pedido.data_criacao).where(Pedido.id == dados['pedido_id'])
+    ).scalar()
+    if data_criacao is None:
+        return
+    itens = conexao.execute(
+        select(
+            ItemPedido.esfiha_id,
+            func.sum(ItemPedido.quantidade),
+            func.sum(ItemPedido.quantidade * ItemPedido.preco_unitario),
+        )
+        .where(ItemPedido.pedido_id == dados['pedido_id'])
+        .group_by(ItemPedido.esfiha_id)
+    ).all()
+
+    linhas = []
+    for grupo, sinal in ((grupo_anterior, -1), (grupo_novo, 1)):
+        if grupo is None:
+            continue
+        linhas.extend({
+            'dia': data_criacao.date(),
+            'esfiha_id': esfiha_id,
+            'grupo_status': grupo,
+            'quantidade': sinal * quantidade,
+            'receita': sinal * receita,
+        } for esfiha_id, quantidade, receita in itens)
+    if linhas:
+        _upsert_somando(conexao, linhas)
+
+
+adicionar_ouvinte_transacao(aplicar_transicao)
+
+
+def _vendas_por_item(modelo_pedido, modelo_item):
+    """(dia, esfiha_id, grupo, quantidade, receita) de cada item, para o backfill."""
+    grupo = case(
+        *[(modelo_pedido.status == status, nome) for status, nome in GRUPOS_STATUS.items()],
+        else_=None
+    )
+    return (
+        select(
+            func.date(modelo_pedido.data_criacao).label('dia'),
+            modelo_item.esfiha_id.label('esfiha_id'),
+            grupo.label('grupo_status'),
+            modelo_item.quantidade.label('quantidade'),
+            (modelo_item.quantidade * modelo_item.preco_unitario).label('receita'),
+        )
+        .join(modelo_item, modelo_item.pedido_id == modelo_pedido.id)
+        .where(modelo_pedido.status.in_(GRUPOS_STATUS.keys()), modelo_pedido.data_criacao.isnot(None))
+    )
+
+
+def recalcular():
+    """Reconstrói VendaDiaria a partir dos pedidos, inclusive os arquivados (backfill). Retorna o número de linhas."""
+    vendas = union_all(
+        _vendas_por_item(Pedido, ItemPedido),
+        _vendas_por_item(PedidoArquivado, ItemPedidoArquivado),
+    ).subquery()
+    origem = (
+        select(
+            vendas.c.dia, vendas.c.esfiha_id, vendas.c.grupo_status,
+            func.sum(vendas.c.quantidade), func.sum(vendas.c.receita),
+        )
+        .group_by(vendas.c.dia, vendas.c.esfiha_id, vendas.c.grupo_status)
+    )
+    tabela = VendaDiaria.__table__
+    db.session.execute(delete(tabela))
+    db.session.execute(insert(tabela).from_select(
+        ['dia', 'esfiha_id', 'grupo_status', 'quantidade', 'receita'], origem
+    ))
+    db.session.commit()
+    return db.session.query(func.count()).select_from(tabela).scalar()
+
+
+def consultar(data_inicio, data_fim, agrupar, grupo_status=GRUPO_PAGO):
+    """Totais por dia/esfiha/categoria no intervalo [data_inicio, data_fim] (datas inclusivas)."""
+    colunas = []
+    if 'dia' in agrupar:
+        colunas.append(VendaDiaria.dia.label('dia'))
+    if 'esfiha' in agrupar:
+        colunas += [VendaDiaria.esfiha_id.label('esfiha_id'), Esfiha.nome.label('esfiha')]
+    if 'categoria' in agrupar:
+        colunas.append(Esfiha.categoria.label('categoria'))
+
+    consulta = select(
+        *colunas,
+        func.sum(VendaDiaria.quantidade).label('quantidade'),
+        func.sum(VendaDiaria.receita).label('receita'),
+    ).where(VendaDiaria.grupo_status == grupo_status)
+    if 'esfiha' in agrupar or 'categoria' in agrupar:
+        consulta = consulta.outerjoin(Esfiha, Esfiha.id == VendaDiaria.esfiha_id)
+    if data_inicio:
+        consulta = consulta.where(VendaDiaria.dia >= data_inicio)
+    if data_fim:
+        consulta = consulta.where(VendaDiaria.dia <= data_fim)
+    if colunas:
+        # Linhas zeradas por transições (ex.: pago -> cancelado) não aparecem no relatório
+        consulta = consulta.group_by(*colunas).having(func.sum(VendaDiaria.quantidade) != 0).order_by(*colunas)
+
+    resultado = []
+    for linha in db.session.execute(consulta).mappings():
+        item = dict(linha)
+        if isinstance(item.get('dia'), date):
+            item['dia'] = item['dia'].isoformat()
+        item['receita'] = round(item['receita'] or 0, 2)
+        item['quantidade'] = item['quantidade'] or 0
+        resultado.append(item)
+    return resultado
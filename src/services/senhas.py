@@ -0,0 +1,113 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+
+class PoolSenhasSaturado(Exception):
+    """O pool de hashing está sem vagas ou não respondeu a tempo; o cliente deve tentar de novo."""
+
+
+def _contexto_processos():
+    # Sem fork: o worker já tem threads (outbox, consumidor) e locks que não
+    # podem ser copiados para os processos do pool
+    metodos = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in metodos else 'spawn')
+
+
+class PoolSenhas:
+    """Executa o hashing e a verificação de senhas em um pool de processos limitado.
+
+    O scrypt é CPU-bound e segura o GIL, então rodá-lo na thread do request trava
+    o worker inteiro. Aqui cada operação ocupa uma vaga de um semáforo com
+    `processos + fila` vagas; sem vaga disponível, PoolSenhasSaturado é levantado
+    imediatamente (a rota responde 429) em vez de enfileirar sem limite. A vaga
+    só é devolvida quando a tarefa termina no pool, mesmo que o request tenha
+    desistido por timeout. O pool é criado sob demanda, já dentro do processo do
+    worker, e recriado se um dos processos morrer (BrokenProcessPool).
+    """
+
+    def __init__(self, processos=None, fila=None, metodo=None, timeout=None):
+        self.processos = processos or int(os.getenv('SENHA_PROCESSOS', str(max(1, (os.cpu_count() or 2) // 2))))
+        self.fila = fila if fila is not None else int(os.getenv('SENHA_FILA', str(self.processos * 4)))
+        # Custo do hash no formato do werkzeug, ex.: scrypt:32768:8:1 ou pbkdf2:sha256:600000
+        self.metodo = metodo or os.getenv('SENHA_METODO', 'scrypt:32768:8:1')
+        self.timeout = timeout or float(os.getenv('SENHA_TIMEOUT', '10'))
+        self._vagas = threading.BoundedSemaphore(self.processos + self.fila)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._prefixo = None # (metodo, prefixo normalizado)
+
+    def _obter_executor(self):
+        with self._lock:
+            # Recria o pool se o processo foi copiado por fork (gunicorn --preload)
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.processos, mp_context=_contexto_processos())
+                self._pid = os.getpid()
+            return self._executor
+
+    def _descartar_executor(self, executor):
+        """Descarta o pool quebrado (ex.: processo morto por OOM) para o próximo uso criar outro."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _executar(self, funcao, *args):
+        for _ in range(2):
+            if not self._vagas.acquire(blocking=False):
+                raise PoolSenhasSaturado()
+            executor = self._obter_executor()
+            try:
+                futuro = executor.submit(funcao, *args)
+            except BaseException as e:
+                self._vagas.release()
+                if not isinstance(e, BrokenProcessPool):
+                    raise
+                self._descartar_executor(executor)
+                continue
+            futuro.add_done_callback(lambda _: self._vagas.release())
+
+            try:
+                return futuro.result(timeout=self.timeout)
+            except TimeoutError:
+                futuro.cancel() # Ainda na fila: libera a vaga já; em execução: libera ao terminar
+                raise PoolSenhasSaturado()
+            except BrokenProcessPool:
+                # Um processo do pool morreu (ex.: OOM); recria o pool e tenta mais uma vez
+                self._descartar_executor(executor)
+        raise PoolSenhasSaturado()
+
+    def gerar_hash(self, senha):
+        return self._executar(generate_password_hash, senha, self.metodo)
+
+    def verificar(self, password_hash, senha):
+        return self._executar(check_password_hash, password_hash, senha)
+
+    def _prefixo_metodo(self):
+        """Prefixo completo dos hashes gerados com `metodo` (ex.: scrypt -> scrypt:32768:8:1).
+
+        O werkzeug completa os parâmetros omitidos em SENHA_METODO, então o prefixo
+        vem de um hash gerado uma vez com o método configurado.
+        """
+        metodo = self.metodo
+        if self._prefixo is None or self._prefixo[0] != metodo:
+            self._prefixo = (metodo, generate_password_hash('', metodo).split('$', 1)[0])
+        return self._prefixo[1]
+
+    def precisa_rehash(self, password_hash):
+        """Indica se o hash foi gerado com parâmetros diferentes dos configurados."""
+        return password_hash.split('$', 1)[0] != self._prefixo_metodo()
+
+    def encerrar(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+
+
+pool_senhas = PoolSenhas()
@@ -0,0 +1,167 @@
+import json
+import threading
+from collections import OrderedDict
+
+from flask import Response
+from sqlalchemy import select
+
+from src.models.user import db
+from src.models.esfiha import Esfiha
+from src.models.pedido import Pedido, ItemPedido
+from src.models.arquivo import ItemPedidoArquivado
+from src.services.eventos_pedido import barramento_pedidos
+
+# Mesmas chaves e ordem de Pedido.to_dict
+COLUNAS_PEDIDO = (
+    Pedido.id, Pedido.cliente_id, Pedido.nome_cliente, Pedido.telefone, Pedido.endereco,
+    Pedido.forma_entrega, Pedido.status, Pedido.valor_total, Pedido.observacoes,
+    Pedido.data_criacao, Pedido.data_atualizacao, Pedido.stripe_payment_intent_id,
+)
+
+
+def selecionar_pedidos(modelo=Pedido):
+    """SELECT das colunas de Pedido usadas pelo serializador (sem objetos ORM).
+
+    Aceita PedidoArquivado, que tem as mesmas colunas.
+    """
+    return select(*[getattr(modelo, coluna.key) for coluna in COLUNAS_PEDIDO])
+
+
+def _isoformat(valor):
+    return valor.isoformat() if valor else None
+
+
+def item_dict(pedido_id, item_id, esfiha_id, esfiha_nome, quantidade, preco_unitario, observacoes):
+    """Mesmo formato de ItemPedido.to_dict, a partir das colunas do item e do nome da esfiha."""
+    return {
+        'id': item_id,
+        'pedido_id': pedido_id,
+        'esfiha_id': esfiha_id,
+        'esfiha': esfiha_nome,
+        'quantidade': quantidade,
+        'preco_unitario': preco_unitario,
+        'subtotal': quantidade * preco_unitario,
+        'observacoes': observacoes
+    }
+
+
+def pedido_json(linha, itens):
+    """JSON (bytes) no formato de Pedido.to_dict, a partir das colunas de COLUNAS_PEDIDO."""
+    (pedido_id, cliente_id, nome_cliente, telefone, endereco, forma_entrega, status,
+     valor_total, observacoes, data_criacao, data_atualizacao, stripe_payment_intent_id) = linha
+    return json.dumps({
+        'id': pedido_id,
+        'cliente_id': cliente_id,
+        'nome_cliente': nome_cliente,
+        'telefone': telefone,
+        'endereco': endereco,
+        'forma_entrega': forma_entrega,
+        'status': status,
+        'valor_total': valor_total,
+        'observacoes': observacoes,
+        'data_criacao': _isoformat(data_criacao),
+        'data_atualizacao': _isoformat(data_atualizacao),
+        'stripe_payment_intent_id': stripe_payment_intent_id,
+        'itens': itens
+    }, separators=(',', ':')).encode('utf-8')
+
+
+class SerializadorPedidos:
+    """Converte linhas de pedido em JSON e guarda um snapshot por pedido.
+
+    Os pedidos são lidos como tuplas de colunas e os itens de todos os pedidos
+    que faltam no cache vêm em uma única consulta. O snapshot só é reutilizado
+    se a data_atualizacao da linha for a mesma de quando foi gerado, então uma
+    alteração feita por outro processo também o invalida; mudanças de status
+    publicadas neste processo o descartam na hora. Pedidos em status final
+    (entregue, cancelado) praticamente sempre saem do cache.
+    """
+
+    def __init__(self, capacidade=10000):
+        self.capacidade = capacidade
+        self._snapshots = OrderedDict()  # pedido_id -> (data_atualizacao, bytes)
+        self._lock = threading.Lock()
+
+    def invalidar(self, pedido_id):
+        with self._lock:
+            self._snapshots.pop(pedido_id, None)
+
+    def limpar(self):
+        with self._lock:
+            self._snapshots.clear()
+
+    def serializar(self, linhas):
+        """Retorna o JSON (bytes) de cada linha de selecionar_pedidos(), na mesma ordem."""
+        resultado = [None] * len(linhas)
+        faltando = {}
+        with self._lock:
+            for posicao, linha in enumerate(linhas):
+                snapshot = self._snapshots.get(linha.id)
+                if snapshot and snapshot[0] == linha.data_atualizacao:
+                    self._snapshots.move_to_end(linha.id)
+                    resultado[posicao] = snapshot[1]
+                else:
+                    faltando[linha.id] = posicao
+
+        if faltando:
+            itens = self._itens_por_pedido(list(faltando))
+            novos = []
+            for pedido_id, posicao in faltando.items():
+                linha = linhas[posicao]
+                corpo = pedido_json(linha, itens.get(pedido_id, []))
+                resultado[posicao] = corpo
+                novos.append((pedido_id, linha.data_atualizacao, corpo))
+            self._guardar(novos)
+        return resultado
+
+    def serializar_lista(self, linhas):
+        """JSON (bytes) de uma lista de pedidos."""
+        return b'[' + b','.join(self.serializar(linhas)) + b']'
+
+    def _guardar(self, novos):
+        with self._lock:
+            for pedido_id, data_atualizacao, corpo in novos:
+                self._snapshots[pedido_id] = (data_atualizacao, corpo)
+                self._snapshots.move_to_end(pedido_id)
+            while len(self._snapshots) > self.capacidade:
+                self._snapshots.popitem(last=False)
+
+    @classmethod
+    def _itens_por_pedido(cls, pedido_ids):
+        itens = cls._consultar_itens(ItemPedido, pedido_ids)
+        # Pedidos arquivados (ou sem itens) são procurados na tabela de arquivo
+        arquivados = [pedido_id for pedido_id in pedido_ids if pedido_id not in itens]
+        if arquivados:
+            itens.update(cls._consultar_itens(ItemPedidoArquivado, arquivados))
+        return itens
+
+    @staticmethod
+    def _consultar_itens(modelo, pedido_ids):
+        consulta = (
+            select(
+                modelo.pedido_id, modelo.id, modelo.esfiha_id, Esfiha.nome,
+                modelo.quantidade, modelo.preco_unitario, modelo.observacoes,
+            )
+            .outerjoin(Esfiha, Esfiha.id == modelo.esfiha_id)
+            .where(modelo.pedido_id.in_(pedido_ids))
+            .order_by(modelo.pedido_id, modelo.id)
+        )
+        itens = {}
+        for pedido_id, item_id, esfiha_id, esfiha_nome, quantidade, preco_unitario, observacoes in db.session.execute(consulta):
+            itens.setdefault(pedido_id, []).append(
+                item_dict(pedido_id, item_id, esfiha_id, esfiha_nome, quantidade, preco_unitario, observacoes)
+            )
+        return itens
+
+
+serializador_pedidos = SerializadorPedidos()
+barramento_pedidos.adicionar_ouvinte(lambda dados: serializador_pedidos.invalidar(dados['pedido_id']))
+
+
+def resposta_json(dados_json, status=200, **extras):
+    """Monta a resposta {"status": "success", "data": ...} com o JSON já serializado em 'data'."""
+    partes = [b'{"status":"success","data":', dados_json]
+    for chave, valor in extras.items():
+        partes.append(f',"{chave}":'.encode() + json.dumps(valor, separators=(',', ':')).encode('utf-8'))
+    partes.append(b'}')
+    return Response(b''.join(partes), status=status, mimetype='application/json')
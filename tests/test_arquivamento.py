@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+
+from src.models.esfiha import Esfiha
+from src.models.idempotencia import RespostaIdempotente
+from src.models.pedido import ItemPedido, Pedido, StatusPedido
+from src.models.user import db
+from src.services.arquivamento import ArquivadorPedidos, arquivador_pedidos
+
+
+def _pedido_entregue(esfiha_id):
+    antigo = datetime.utcnow() - timedelta(seconds=5)
+    pedido = Pedido(
+        nome_cliente='Cliente', telefone='11999999999', forma_entrega='entrega', valor_total=1,
+        status=StatusPedido.ENTREGUE, data_criacao=antigo, data_atualizacao=antigo
+    )
+    pedido.itens.append(ItemPedido(esfiha_id=esfiha_id, quantidade=1, preco_unitario=1))
+    db.session.add(pedido)
+    db.session.commit()
+    return pedido.id, pedido.itens[0].id
+
+
+def test_ids_arquivados_nao_sao_reaproveitados(criar_app):
+    app = criar_app(ARQUIVO_IDADE_DIAS=0)
+    with app.app_context():
+        esfiha = Esfiha(nome='Carne', preco=1.0, disponivel=True)
+        db.session.add(esfiha)
+        db.session.commit()
+        esfiha_id = esfiha.id
+        ultimo = [_pedido_entregue(esfiha_id) for _ in range(2)][-1]
+        assert arquivador_pedidos.arquivar() == 2
+
+        novo = _pedido_entregue(esfiha_id)
+        assert novo[0] > ultimo[0] and novo[1] > ultimo[1]
+        assert arquivador_pedidos.arquivar() == 1
+
+
+def test_chaves_expiradas_sao_removidas_mesmo_com_falha_no_arquivamento(criar_app, monkeypatch):
+    app = criar_app()
+    with app.app_context():
+        db.session.add(RespostaIdempotente(
+            escopo='pedidos', chave='vencida', hash_requisicao='0' * 64,
+            expira_em=datetime.utcnow() - timedelta(minutes=1)
+        ))
+        db.session.commit()
+
+    arquivador = ArquivadorPedidos(app)
+    app.config['ARQUIVO_INTERVALO'] = 0
+
+    def arquivar_com_falha(pausa=0):
+        arquivador.parar() # Uma volta só do loop
+        raise RuntimeError('banco indisponível')
+
+    monkeypatch.setattr(arquivador, 'arquivar', arquivar_com_falha)
+    arquivador._loop()
+    with app.app_context():
+        assert db.session.get(RespostaIdempotente, ('pedidos', 'vencida')) is None
@@ -0,0 +1,102 @@
+import json
+from datetime import datetime, timedelta
+
+from benchmarks.stripe_falso import evento_assinado
+from src.models.pagamento import EventoStripe, StatusEvento
+from src.models.pedido import Pedido, StatusPedido
+from src.models.user import db
+from src.services.eventos_pedido import barramento_pedidos
+from src.services.eventos_stripe import consumidor_eventos_stripe
+
+SEGREDO = 'whsec_teste'
+
+
+def _criar_pedido(app):
+    with app.app_context():
+        pedido = Pedido(nome_cliente='Cliente', telefone='11999999999', forma_entrega='entrega', valor_total=10)
+        db.session.add(pedido)
+        db.session.commit()
+        return pedido.id
+
+
+def _webhook(app, event_id, pedido_id, tipo='payment_intent.succeeded'):
+    payload, assinatura = evento_assinado(SEGREDO, event_id, tipo, pedido_id, f'pi_{pedido_id}')
+    return app.test_client().post('/api/pedidos/stripe-webhook', data=payload, headers={
+        'Stripe-Signature': assinatura, 'Content-Type': 'application/json'
+    })
+
+
+def _processar(app):
+    with app.app_context():
+        return consumidor_eventos_stripe.processar_lote()
+
+
+def _evento(app, event_id):
+    with app.app_context():
+        evento = db.session.get(EventoStripe, event_id)
+        db.session.expunge(evento)
+        return evento
+
+
+def _status_pedido(app, pedido_id):
+    with app.app_context():
+        return db.session.get(Pedido, pedido_id).status
+
+
+def test_reentrega_do_webhook_e_gravada_e_aplicada_uma_vez(criar_app, monkeypatch):
+    monkeypatch.setenv('STRIPE_WEBHOOK_SECRET', SEGREDO)
+    app = criar_app()
+    pedido_id = _criar_pedido(app)
+    for _ in range(3):
+        assert _webhook(app, 'evt_1', pedido_id).status_code == 200
+    # Outro evento para o mesmo intent (ex.: reenvio manual pelo painel do Stripe)
+    assert _webhook(app, 'evt_2', pedido_id).status_code == 200
+    with app.app_context():
+        assert EventoStripe.query.count() == 2
+
+    sequencia = barramento_pedidos._ultima_sequencia
+    assert _processar(app) == 2
+    assert _processar(app) == 0
+
+    assert _status_pedido(app, pedido_id) == StatusPedido.PENDENTE
+    publicados = [dados for numero, dados in barramento_pedidos._eventos if numero > sequencia]
+    assert [dados['pedido_id'] for dados in publicados] == [pedido_id]
+    assert _evento(app, 'evt_1').resultado == f'pedido -> {StatusPedido.PENDENTE}'
+    assert _evento(app, 'evt_2').resultado == 'pedido não encontrado ou já processado'
+
+
+def test_webhook_com_assinatura_invalida_nao_e_gravado(criar_app, monkeypatch):
+    monkeypatch.setenv('STRIPE_WEBHOOK_SECRET', 'whsec_outro')
+    app = criar_app()
+    assert _webhook(app, 'evt_1', _criar_pedido(app)).status_code == 400
+    with app.app_context():
+        assert EventoStripe.query.count() == 0
+
+
+def test_evento_com_erro_nao_derruba_o_lote_e_sai_da_fila_apos_o_maximo(criar_app):
+    app = criar_app(EVENTOS_STRIPE_MAX_TENTATIVAS=2)
+    pedido_id = _criar_pedido(app)
+    with app.app_context():
+        # 'object' como lista quebra a leitura do payment intent com AttributeError
+        agora = datetime.utcnow()
+        db.session.add(EventoStripe(id='evt_bom', tipo='payment_intent.succeeded', payload=json.dumps(
+            {'data': {'object': {'id': f'pi_{pedido_id}', 'metadata': {'pedido_id': str(pedido_id)}}}}
+        ), data_recebimento=agora - timedelta(seconds=1)))
+        db.session.add(EventoStripe(id='evt_veneno', tipo='payment_intent.succeeded',
+                                    payload=json.dumps({'data': {'object': []}}), data_recebimento=agora))
+        db.session.commit()
+
+    sequencia = barramento_pedidos._ultima_sequencia
+    assert _processar(app) == 1
+    assert _status_pedido(app, pedido_id) == StatusPedido.PENDENTE
+    # O rollback do SAVEPOINT do evento com erro não descarta a mudança do outro evento
+    assert [dados['pedido_id'] for numero, dados in barramento_pedidos._eventos if numero > sequencia] == [pedido_id]
+    veneno = _evento(app, 'evt_veneno')
+    assert (veneno.status, veneno.tentativas) == (StatusEvento.RECEBIDO, 1)
+    assert veneno.ultimo_erro.startswith('AttributeError')
+
+    assert _processar(app) == 0
+    veneno = _evento(app, 'evt_veneno')
+    assert (veneno.status, veneno.tentativas) == (StatusEvento.FALHOU, 2)
+    with app.app_context():
+        assert EventoStripe.query.filter_by(status=StatusEvento.RECEBIDO).count() == 0
@@ -0,0 +1,7 @@
+from src.services.exportacao_pedidos import CAMPOS_CSV
+
+
+def test_csv_sem_pedidos_traz_so_o_cabecalho(criar_app):
+    resposta = criar_app().test_client().get('/api/pedidos/admin/exportar?formato=csv')
+    assert resposta.status_code == 200
+    assert resposta.get_data(as_text=True).splitlines() == [','.join(CAMPOS_CSV)]
@@ -0,0 +1,35 @@
+import json
+
+from sqlalchemy import event
+
+from src.models.pedido import Pedido, StatusPedido
+from src.models.user import db
+from src.services.fila_cozinha import FilaCozinha
+
+
+def _pedido(status, forma_entrega='retirada'):
+    return Pedido(nome_cliente='Cliente', telefone='11999999999', forma_entrega=forma_entrega,
+                  valor_total=10, status=status)
+
+
+def test_fila_montada_ao_iniciar_e_atualizada_pelo_barramento(criar_app):
+    app = criar_app()
+    with app.app_context():
+        ativo, entregue = _pedido(StatusPedido.PENDENTE), _pedido(StatusPedido.ENTREGUE, 'entrega')
+        db.session.add_all([ativo, entregue])
+        db.session.commit()
+        ativo_id = ativo.id
+
+    fila = FilaCozinha(app)
+    fila._montar_em_segundo_plano() # O que iniciar() roda na thread
+    consultas = []
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', lambda *args: consultas.append(args[2]))
+        assert [pedido['id'] for pedido in json.loads(fila.listar())['retirada']] == [ativo_id]
+        assert consultas == [] # A primeira leitura não vai ao banco
+
+        pedido = db.session.get(Pedido, ativo_id)
+        pedido.status = StatusPedido.EM_PREPARACAO
+        db.session.commit()
+        fila.registrar_mudanca({'pedido_id': ativo_id}) # Em produção, via barramento_pedidos
+        assert json.loads(fila.listar())['retirada'][0]['status'] == StatusPedido.EM_PREPARACAO
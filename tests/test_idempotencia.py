@@ -0,0 +1,86 @@
+import threading
+import time
+
+import pytest
+
+from src.models.esfiha import Esfiha
+from src.models.pedido import Pedido
+from src.models.user import db
+from src.routes import pedido as rotas_pedido
+from src.services.pagamento_outbox import despachante_pagamentos
+
+URL = '/api/pedidos/criar-intent-pagamento'
+
+
+@pytest.fixture
+def app(criar_app, monkeypatch):
+    app = criar_app()
+    monkeypatch.setattr(despachante_pagamentos, 'enfileirar', lambda pedido_id: None) # Sem chamadas ao Stripe
+    with app.app_context():
+        esfiha = Esfiha(nome='Carne', preco=5.0, disponivel=True)
+        db.session.add(esfiha)
+        db.session.commit()
+        app.config['ESFIHA_TESTE'] = esfiha.id
+    return app
+
+
+def _corpo(app, quantidade=1):
+    return {
+        'nome_cliente': 'Cliente', 'telefone': '11999999999', 'forma_entrega': 'retirada',
+        'itens': [{'esfiha_id': app.config['ESFIHA_TESTE'], 'quantidade': quantidade}],
+    }
+
+
+def _total_pedidos(app):
+    with app.app_context():
+        return Pedido.query.count()
+
+
+def test_repeticao_recebe_a_resposta_original_sem_criar_outro_pedido(app):
+    cliente = app.test_client()
+    primeira = cliente.post(URL, json=_corpo(app), headers={'Idempotency-Key': 'chave-1'})
+    repetida = cliente.post(URL, json=_corpo(app), headers={'Idempotency-Key': 'chave-1'})
+    assert primeira.status_code == repetida.status_code == 202
+    assert 'Idempotent-Replayed' not in primeira.headers
+    assert repetida.headers['Idempotent-Replayed'] == 'true'
+    assert repetida.get_json() == primeira.get_json()
+    assert _total_pedidos(app) == 1
+
+    outra = cliente.post(URL, json=_corpo(app), headers={'Idempotency-Key': 'chave-2'})
+    assert outra.status_code == 202
+    assert _total_pedidos(app) == 2
+
+
+def test_mesma_chave_com_outro_corpo_e_rejeitada(app):
+    cliente = app.test_client()
+    assert cliente.post(URL, json=_corpo(app), headers={'Idempotency-Key': 'chave'}).status_code == 202
+    resposta = cliente.post(URL, json=_corpo(app, quantidade=2), headers={'Idempotency-Key': 'chave'})
+    assert resposta.status_code == 422
+    assert _total_pedidos(app) == 1
+
+
+def test_repeticao_concorrente_espera_e_recebe_a_resposta_do_primeiro(app, monkeypatch):
+    reivindicada = threading.Event()
+    guardar_resposta = rotas_pedido.guardar_resposta
+
+    def guardar_devagar(resposta):
+        reivindicada.set()
+        time.sleep(0.3) # Segura a transação da rota enquanto o duplicado chega
+        return guardar_resposta(resposta)
+
+    monkeypatch.setattr(rotas_pedido, 'guardar_resposta', guardar_devagar)
+    respostas = {}
+
+    def enviar(nome):
+        respostas[nome] = app.test_client().post(URL, json=_corpo(app), headers={'Idempotency-Key': 'concorrente'})
+
+    primeira = threading.Thread(target=enviar, args=('primeira',))
+    primeira.start()
+    assert reivindicada.wait(5)
+    enviar('repetida')
+    primeira.join()
+
+    assert respostas['primeira'].status_code == respostas['repetida'].status_code == 202
+    assert respostas['repetida'].headers['Idempotent-Replayed'] == 'true'
+    assert respostas['repetida'].get_json() == respostas['primeira'].get_json()
+    assert _total_pedidos(app) == 1
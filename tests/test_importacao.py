@@ -0,0 +1,24 @@
+from src.models.esfiha import Esfiha
+from src.models.user import db
+
+URL = '/api/esfihas/importar'
+
+
+def test_nome_repetido_no_lote_e_rejeitado_por_linha(criar_app):
+    app = criar_app()
+    client = app.test_client()
+
+    resposta = client.post(URL, json=[
+        {'nome': 'Carne', 'preco': 6},
+        {'nome': 'Queijo', 'preco': 5},
+        {'nome': 'Carne', 'preco': 7},
+    ])
+    assert resposta.status_code == 400
+    assert resposta.get_json()['erros'] == [{'linha': 3, 'erro': "Nome 'Carne' repetido (já usado na linha 1)"}]
+    with app.app_context():
+        assert db.session.query(Esfiha).count() == 0
+
+    csv = 'nome,preco\nCarne,6\nQueijo,5\n'
+    resposta = client.post(URL, data=csv, headers={'Content-Type': 'text/csv'})
+    assert resposta.status_code == 200
+    assert resposta.get_json()['data'] == {'criadas': 2, 'atualizadas': 0}
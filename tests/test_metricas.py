@@ -0,0 +1,23 @@
+from src.models.pagamento import EventoStripe
+from src.models.user import db
+
+
+def test_comando_com_erro_nao_acumula_inicio_na_conexao(criar_app):
+    app = criar_app()
+    with app.app_context():
+        for _ in range(3):
+            db.session.add(EventoStripe(id='evt_repetido', tipo='teste', payload='{}'))
+            try:
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+        with db.engine.connect() as conexao:
+            assert not conexao.info.get('metricas_inicio_consulta')
+
+
+def test_create_app_repetido_nao_duplica_series(criar_app):
+    criar_app()
+    app = criar_app()
+    texto = app.test_client().get('/metrics').get_data(as_text=True)
+    tipos = [linha for linha in texto.splitlines() if linha.startswith('# TYPE')]
+    assert len(tipos) == len(set(tipos))
@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+
+import pytest
+from flask_jwt_extended import create_access_token
+
+from src.models.pedido import Pedido, StatusPedido
+from src.models.user import User, db
+
+URL = '/api/pedidos/me'
+
+
+@pytest.fixture
+def app(criar_app):
+    return criar_app(JWT_SECRET_KEY='segredo-dos-testes-com-32-bytes-ou-mais')
+
+
+def _cliente(app, nome):
+    """Cria um usuário e devolve (id, cabeçalhos com o token dele)."""
+    with app.app_context():
+        usuario = User(username=nome, email=f'{nome}@exemplo.com', password_hash='-')
+        db.session.add(usuario)
+        db.session.commit()
+        return usuario.id, {'Authorization': f'Bearer {create_access_token(identity=str(usuario.id))}'}
+
+
+def _criar_pedidos(app, cliente_id, quantidade, data):
+    with app.app_context():
+        pedidos = [
+            Pedido(cliente_id=cliente_id, nome_cliente='Cliente', telefone='11999999999', forma_entrega='retirada',
+                   valor_total=10, status=StatusPedido.PENDENTE, data_criacao=data, data_atualizacao=data)
+            for _ in range(quantidade)
+        ]
+        db.session.add_all(pedidos)
+        db.session.commit()
+        return [pedido.id for pedido in pedidos]
+
+
+def _ids(resposta):
+    return [pedido['id'] for pedido in resposta.get_json()['data']]
+
+
+def test_etag_igual_responde_304_ate_um_pedido_mudar(app):
+    cliente_id, cabecalhos = _cliente(app, 'ana')
+    ids = _criar_pedidos(app, cliente_id, 2, datetime.utcnow() - timedelta(hours=1))
+    http = app.test_client()
+
+    primeira = http.get(URL, headers=cabecalhos)
+    assert primeira.status_code == 200
+    assert sorted(_ids(primeira)) == sorted(ids)
+    etag = primeira.headers['ETag']
+
+    repetida = http.get(URL, headers={**cabecalhos, 'If-None-Match': etag})
+    assert repetida.status_code == 304
+    assert repetida.get_data() == b''
+    assert repetida.headers['ETag'] == etag
+
+    with app.app_context():
+        pedido = db.session.get(Pedido, ids[0])
+        pedido.status = StatusPedido.APROVADO
+        pedido.data_atualizacao = datetime.utcnow()
+        db.session.commit()
+    alterada = http.get(URL, headers={**cabecalhos, 'If-None-Match': etag})
+    assert alterada.status_code == 200
+    assert alterada.headers['ETag'] != etag
+
+
+def test_since_devolve_so_os_pedidos_alterados_do_cliente(app):
+    cliente_id, cabecalhos = _cliente(app, 'ana')
+    outro_id, _ = _cliente(app, 'bruno')
+    antigo = datetime.utcnow() - timedelta(hours=1)
+    ids = _criar_pedidos(app, cliente_id, 3, antigo)
+    _criar_pedidos(app, outro_id, 1, antigo)
+    http = app.test_client()
+
+    cursor = http.get(URL, headers=cabecalhos).get_json()['cursor']
+    assert http.get(URL, query_string={'since': cursor}, headers=cabecalhos).get_json()['data'] == []
+
+    with app.app_context():
+        pedido = db.session.get(Pedido, ids[1])
+        pedido.status = StatusPedido.EM_PREPARACAO
+        pedido.data_atualizacao = datetime.utcnow()
+        db.session.commit()
+    _criar_pedidos(app, outro_id, 1, datetime.utcnow())
+
+    delta = http.get(URL, query_string={'since': cursor}, headers=cabecalhos)
+    assert _ids(delta) == [ids[1]]
+    assert delta.get_json()['data'][0]['status'] == StatusPedido.EM_PREPARACAO
+
+
+def test_since_invalido_responde_400(app):
+    _, cabecalhos = _cliente(app, 'ana')
+    assert app.test_client().get(URL, query_string={'since': 'ontem'}, headers=cabecalhos).status_code == 400
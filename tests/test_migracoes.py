@@ -0,0 +1,14 @@
+from sqlalchemy import inspect
+
+from src.models.user import db
+
+
+def test_migracoes_chegam_ao_esquema_dos_modelos(criar_app):
+    app = criar_app()
+    with app.app_context():
+        inspetor = inspect(db.engine)
+        for tabela in db.metadata.sorted_tables:
+            assert {coluna['name'] for coluna in inspetor.get_columns(tabela.name)} == set(tabela.columns.keys()), tabela.name
+            indices = {indice['name'] for indice in inspetor.get_indexes(tabela.name)}
+            # O MySQL cria índices próprios para chaves estrangeiras, então só exige os dos modelos
+            assert {indice.name for indice in tabela.indexes} <= indices, tabela.name
@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import stripe as stripe_real
+
+from src.models.pedido import Pedido, StatusPedido
+from src.models.user import db
+from src.services.cliente_stripe import cliente_stripe
+from src.services.pedidos_abandonados import coletor_pedidos_abandonados
+
+
+class StripeIntentPago:
+    """Stripe falso em que o intent foi pago antes do cancelamento chegar."""
+
+    error = stripe_real.error
+
+    def __init__(self, status):
+        self.cancelados = []
+        self.PaymentIntent = SimpleNamespace(cancel=self._cancelar, retrieve=lambda id_: SimpleNamespace(id=id_, status=status))
+
+    def _cancelar(self, payment_intent_id, **kwargs):
+        self.cancelados.append(payment_intent_id)
+        raise stripe_real.error.InvalidRequestError('This PaymentIntent has already succeeded', None)
+
+
+def _pedido_abandonado(app):
+    criado = datetime.utcnow() - timedelta(hours=3)
+    with app.app_context():
+        pedido = Pedido(nome_cliente='Cliente', telefone='11999999999', forma_entrega='retirada', valor_total=10,
+                        status=StatusPedido.PAGAMENTO_PENDENTE, stripe_payment_intent_id='pi_pago',
+                        data_criacao=criado, data_atualizacao=criado)
+        db.session.add(pedido)
+        db.session.commit()
+        return pedido.id
+
+
+def _status(app, pedido_id):
+    with app.app_context():
+        return db.session.get(Pedido, pedido_id).status
+
+
+def _coletar(app, monkeypatch, status_intent):
+    stripe = StripeIntentPago(status_intent)
+    monkeypatch.setattr(cliente_stripe, 'obter', lambda: stripe)
+    # Cancelamento síncrono: o teste confere o resultado logo após a coleta
+    monkeypatch.setattr(coletor_pedidos_abandonados, 'cancelar_intents',
+                        lambda ids, motivo='abandoned': [coletor_pedidos_abandonados._cancelar_intent(id_, motivo) for id_ in ids])
+    with app.app_context():
+        assert coletor_pedidos_abandonados.coletar() == 1
+    return stripe
+
+
+def test_intent_ja_pago_devolve_o_pedido_para_pendente(criar_app, monkeypatch):
+    app = criar_app(ABANDONADOS_PRAZO_MINUTOS=60)
+    pedido_id = _pedido_abandonado(app)
+    restaurados = coletor_pedidos_abandonados.estatisticas()['pedidos_restaurados']
+
+    stripe = _coletar(app, monkeypatch, 'succeeded')
+
+    assert stripe.cancelados == ['pi_pago']
+    assert _status(app, pedido_id) == StatusPedido.PENDENTE
+    assert coletor_pedidos_abandonados.estatisticas()['pedidos_restaurados'] == restaurados + 1
+
+
+def test_erro_sem_pagamento_mantem_o_pedido_cancelado(criar_app, monkeypatch):
+    app = criar_app(ABANDONADOS_PRAZO_MINUTOS=60)
+    pedido_id = _pedido_abandonado(app)
+
+    _coletar(app, monkeypatch, 'requires_payment_method')
+
+    assert _status(app, pedido_id) == StatusPedido.CANCELADO
@@ -0,0 +1,18 @@
+import pytest
+from flask import Flask
+
+from src.banco import init_banco
+from src.migracoes import migrar, verificar_planos
+from src.models.user import db
+
+
+def test_migracoes_aplicadas_uma_vez_e_planos_sem_varredura(url_banco):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = url_banco
+    init_banco(app)
+    with app.app_context():
+        assert migrar()
+        assert migrar() == []
+        if db.engine.dialect.name != 'sqlite':
+            pytest.skip('verificar_planos usa EXPLAIN QUERY PLAN, só do SQLite')
+        assert verificar_planos() == {}
@@ -0,0 +1,118 @@
+import json
+from datetime import datetime, timedelta
+
+from src.models.esfiha import Esfiha
+from src.models.pagamento import EventoStripe
+from src.models.pedido import ItemPedido, Pedido, StatusPedido
+from src.models.relatorio import VendaDiaria
+from src.models.user import db
+from src.services import relatorios
+from src.services.arquivamento import arquivador_pedidos
+from src.services.eventos_stripe import consumidor_eventos_stripe
+
+
+def _criar_pedido(esfihas, itens, status=StatusPedido.PAGAMENTO_PENDENTE, data_criacao=None):
+    pedido = Pedido(nome_cliente='Cliente', telefone='11999999999', forma_entrega='entrega', status=status,
+                    valor_total=sum(quantidade * esfihas[nome][1] for nome, quantidade in itens),
+                    data_criacao=data_criacao, data_atualizacao=data_criacao)
+    for nome, quantidade in itens:
+        esfiha_id, preco = esfihas[nome]
+        pedido.itens.append(ItemPedido(esfiha_id=esfiha_id, quantidade=quantidade, preco_unitario=preco))
+    db.session.add(pedido)
+    db.session.commit()
+    return pedido.id
+
+
+def _esfihas():
+    """nome -> (id, preço); o consumidor de eventos encerra a sessão, então não devolve objetos ORM."""
+    esfihas = {
+        'carne': Esfiha(nome='Carne', preco=5.0, categoria='salgada', disponivel=True),
+        'chocolate': Esfiha(nome='Chocolate', preco=8.0, categoria='doce', disponivel=True),
+    }
+    db.session.add_all(esfihas.values())
+    db.session.commit()
+    return {nome: (esfiha.id, esfiha.preco) for nome, esfiha in esfihas.items()}
+
+
+def _totais():
+    """(dia, esfiha, grupo) -> (quantidade, receita), sem as linhas zeradas por transições."""
+    return {
+        (linha.dia, linha.esfiha_id, linha.grupo_status): (linha.quantidade, round(linha.receita, 2))
+        for linha in VendaDiaria.query.all() if linha.quantidade
+    }
+
+
+def _pagar(pedido_id):
+    db.session.add(EventoStripe(id=f'evt_{pedido_id}', tipo='payment_intent.succeeded', payload=json.dumps(
+        {'data': {'object': {'id': f'pi_{pedido_id}', 'metadata': {'pedido_id': str(pedido_id)}}}}
+    )))
+    db.session.commit()
+    consumidor_eventos_stripe.processar_lote()
+
+
+def test_cancelar_pedido_pago_move_os_totais_de_grupo(criar_app):
+    app = criar_app()
+    with app.app_context():
+        esfihas = _esfihas()
+        pedido_id = _criar_pedido(esfihas, [('carne', 2), ('chocolate', 1)])
+        assert _totais() == {} # Aguardando pagamento não entra no relatório
+        dia = db.session.get(Pedido, pedido_id).data_criacao.date()
+        carne, chocolate = esfihas['carne'][0], esfihas['chocolate'][0]
+
+        _pagar(pedido_id) # UPDATE em massa do consumidor de eventos
+        assert _totais() == {
+            (dia, carne, relatorios.GRUPO_PAGO): (2, 10.0),
+            (dia, chocolate, relatorios.GRUPO_PAGO): (1, 8.0),
+        }
+
+    resposta = app.test_client().patch(f'/api/pedidos/admin/atualizar-status/{pedido_id}',
+                                       json={'status': StatusPedido.CANCELADO}) # Alteração pelo ORM
+    assert resposta.status_code == 200
+    with app.app_context():
+        assert _totais() == {
+            (dia, carne, relatorios.GRUPO_CANCELADO): (2, 10.0),
+            (dia, chocolate, relatorios.GRUPO_CANCELADO): (1, 8.0),
+        }
+
+    relatorio = app.test_client().get('/api/pedidos/admin/relatorios?agrupar=esfiha').get_json()['data']
+    assert relatorio == [] # As linhas 'pago' zeradas não aparecem
+    relatorio = app.test_client().get(
+        '/api/pedidos/admin/relatorios?agrupar=esfiha&grupo_status=cancelado'
+    ).get_json()['data']
+    assert [(linha['esfiha'], linha['quantidade'], linha['receita']) for linha in relatorio] == [
+        ('Carne', 2, 10.0), ('Chocolate', 1, 8.0)
+    ]
+
+
+def test_backfill_reproduz_os_totais_incrementais(criar_app):
+    app = criar_app(ARQUIVO_IDADE_DIAS=1)
+    with app.app_context():
+        esfihas = _esfihas()
+        antigo = datetime.utcnow() - timedelta(days=2)
+        arquivado = _criar_pedido(esfihas, [('carne', 3)], data_criacao=antigo)
+        _pagar(arquivado)
+        pedido = db.session.get(Pedido, arquivado)
+        pedido.status = StatusPedido.ENTREGUE
+        db.session.commit()
+
+        pago = _criar_pedido(esfihas, [('carne', 1), ('chocolate', 2)])
+        _pagar(pago)
+        cancelado = _criar_pedido(esfihas, [('chocolate', 4)])
+        _pagar(cancelado)
+        pedido = db.session.get(Pedido, cancelado)
+        pedido.status = StatusPedido.CANCELADO
+        db.session.commit()
+        _criar_pedido(esfihas, [('carne', 5)], status=StatusPedido.FALHA_PAGAMENTO)
+        _criar_pedido(esfihas, [('carne', 7)]) # Ainda aguardando pagamento
+
+        # Envelhece o pedido entregue para o arquivador movê-lo
+        db.session.query(Pedido).filter_by(id=arquivado).update({'data_atualizacao': antigo})
+        db.session.commit()
+        assert arquivador_pedidos.arquivar() == 1
+
+        incrementais = _totais()
+        assert incrementais[(antigo.date(), esfihas['carne'][0], relatorios.GRUPO_PAGO)] == (3, 15.0)
+        assert incrementais[(datetime.utcnow().date(), esfihas['carne'][0], relatorios.GRUPO_FALHA)] == (5, 25.0)
+
+        relatorios.recalcular()
+        assert _totais() == incrementais
@@ -0,0 +1,42 @@
+import os
+import signal
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+from src.services.senhas import PoolSenhas, PoolSenhasSaturado
+
+
+@pytest.fixture
+def pool():
+    pool = PoolSenhas(processos=1, fila=0, metodo='pbkdf2:sha256:1000', timeout=5)
+    yield pool
+    processos = list(pool._executor._processes.values()) if pool._executor else []
+    pool.encerrar()
+    for processo in processos:
+        processo.terminate() # Não espera o hash lento do teste de timeout
+
+
+def test_pool_recriado_quando_um_processo_morre(pool):
+    password_hash = pool.gerar_hash('segredo')
+    for pid in list(pool._executor._processes):
+        os.kill(pid, signal.SIGKILL)
+    assert pool.verificar(password_hash, 'segredo')
+
+
+def test_timeout_vira_saturado_e_mantem_a_vaga_ocupada(pool):
+    pool.metodo = 'pbkdf2:sha256:50000000'
+    pool.timeout = 0.1
+    with pytest.raises(PoolSenhasSaturado):
+        pool.gerar_hash('segredo')
+    # A tarefa ainda roda no pool: a única vaga continua ocupada
+    with pytest.raises(PoolSenhasSaturado):
+        pool.gerar_hash('segredo')
+
+
+@pytest.mark.parametrize('metodo', ['pbkdf2:sha256:1000', 'pbkdf2:sha256', 'pbkdf2', 'scrypt'])
+def test_precisa_rehash_normaliza_o_metodo_configurado(metodo):
+    pool = PoolSenhas(processos=1, fila=0, metodo=metodo)
+    atual = generate_password_hash('segredo', metodo)
+    assert not pool.precisa_rehash(atual)
+    assert pool.precisa_rehash(generate_password_hash('segredo', 'pbkdf2:sha256:999'))
@@ -0,0 +1,33 @@
+import threading
+import time
+
+from src.services.pagamento_outbox import despachante_pagamentos
+from src.services.pedidos_abandonados import coletor_pedidos_abandonados
+
+
+def _threads(prefixo):
+    return [thread for thread in threading.enumerate() if thread.name.startswith(prefixo)]
+
+
+def _aguardar_encerrar(prefixo, maximo, timeout=5):
+    limite = time.monotonic() + timeout
+    while len(_threads(prefixo)) > maximo and time.monotonic() < limite:
+        time.sleep(0.01)
+    return len(_threads(prefixo))
+
+
+def test_create_app_repetido_nao_acumula_pools(criar_app):
+    pools = [] # Mantém os pools antigos vivos: o coletor de lixo não pode encerrá-los pelo teste
+    for _ in range(5):
+        criar_app(PAGAMENTO_WORKERS=2, ABANDONADOS_WORKERS=2)
+        # Ocupa todos os workers para que as threads do pool existam de fato
+        for servico in (despachante_pagamentos, coletor_pedidos_abandonados):
+            pools.append(servico._executor)
+            barreira = threading.Barrier(3)
+            futuros = [servico._executor.submit(barreira.wait, 5) for _ in range(2)]
+            barreira.wait(5)
+            for futuro in futuros:
+                futuro.result()
+
+    assert _aguardar_encerrar('pagamento_', 2) <= 2
+    assert _aguardar_encerrar('cancelar-intent_', 2) <= 2
@@ -0,0 +1,67 @@
+from src.models.pedido import Pedido, StatusPedido
+from src.models.user import db
+
+
+def _app_com_pedidos(criar_app, *status):
+    app = criar_app()
+    with app.app_context():
+        pedidos = [
+            Pedido(nome_cliente='Cliente', telefone='11999999999', forma_entrega='entrega', valor_total=1, status=valor)
+            for valor in status
+        ]
+        db.session.add_all(pedidos)
+        db.session.commit()
+        return app, [pedido.id for pedido in pedidos]
+
+
+def _status(app, ids):
+    with app.app_context():
+        return [db.session.get(Pedido, pedido_id).status for pedido_id in ids]
+
+
+def _patch_lote(app, ids, destino):
+    return app.test_client().patch('/api/pedidos/admin/atualizar-status', json={'ids': ids, 'status': destino})
+
+
+def test_lote_atualiza_todos_os_pedidos_validos(criar_app):
+    app, ids = _app_com_pedidos(criar_app, StatusPedido.PENDENTE, StatusPedido.PENDENTE)
+    resposta = _patch_lote(app, ids, StatusPedido.APROVADO)
+    assert resposta.status_code == 200
+    assert resposta.get_json()['data'] == {'atualizados': ids, 'erros': {}}
+    assert _status(app, ids) == [StatusPedido.APROVADO, StatusPedido.APROVADO]
+
+
+def test_lote_com_ids_validos_e_invalidos_atualiza_so_os_validos(criar_app):
+    app, (pendente, entregue) = _app_com_pedidos(criar_app, StatusPedido.PENDENTE, StatusPedido.ENTREGUE)
+    inexistente = entregue + 1000
+    dados = _patch_lote(app, [pendente, entregue, inexistente], StatusPedido.EM_PREPARACAO).get_json()['data']
+    assert dados['atualizados'] == [pendente]
+    assert set(dados['erros']) == {str(entregue), str(inexistente)}
+    assert _status(app, [pendente, entregue]) == [StatusPedido.EM_PREPARACAO, StatusPedido.ENTREGUE]
+
+
+def test_admin_nao_faz_transicoes_de_pagamento(criar_app):
+    app, (pendente, falhou, cancelar) = _app_com_pedidos(
+        criar_app, StatusPedido.PAGAMENTO_PENDENTE, StatusPedido.FALHA_PAGAMENTO, StatusPedido.PAGAMENTO_PENDENTE
+    )
+    for destino in (StatusPedido.PENDENTE, StatusPedido.APROVADO):
+        dados = _patch_lote(app, [pendente, falhou], destino).get_json()['data']
+        assert dados['atualizados'] == []
+        assert set(dados['erros']) == {str(pendente), str(falhou)}
+
+    dados = _patch_lote(app, [falhou, cancelar], StatusPedido.CANCELADO).get_json()['data']
+    assert dados == {'atualizados': [falhou, cancelar], 'erros': {}}
+
+
+def test_admin_nao_faz_transicao_de_pagamento_em_um_pedido(criar_app):
+    app, (pedido_id,) = _app_com_pedidos(criar_app, StatusPedido.PAGAMENTO_PENDENTE)
+    cliente = app.test_client()
+    for destino in (StatusPedido.PENDENTE, StatusPedido.APROVADO):
+        resposta = cliente.patch(f'/api/pedidos/admin/atualizar-status/{pedido_id}', json={'status': destino})
+        assert resposta.status_code == 409
+        assert resposta.get_json()['transicoes_permitidas'] == [StatusPedido.CANCELADO]
+    assert _status(app, [pedido_id]) == [StatusPedido.PAGAMENTO_PENDENTE]
+
+    resposta = cliente.patch(f'/api/pedidos/admin/atualizar-status/{pedido_id}', json={'status': StatusPedido.CANCELADO})
+    assert resposta.status_code == 200
+    assert _status(app, [pedido_id]) == [StatusPedido.CANCELADO]
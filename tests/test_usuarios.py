@@ -0,0 +1,33 @@
+import pytest
+
+from src.models.user import User, db
+
+
+@pytest.fixture
+def app(criar_app):
+    return criar_app(JWT_SECRET_KEY='segredo-dos-testes-com-32-bytes-ou-mais')
+
+
+def _login(client, identifier, password):
+    return client.post('/api/users/login', json={'identifier': identifier, 'password': password})
+
+
+def test_token_do_login_resolve_o_usuario_em_me(app):
+    with app.app_context():
+        usuario = User(username='ana', email='ana@exemplo.com')
+        usuario.set_password('segredo')
+        db.session.add(usuario)
+        db.session.commit()
+        usuario_id = usuario.id
+
+    client = app.test_client()
+    assert _login(client, 'ana', 'errada').status_code == 401
+    token = _login(client, 'ana@exemplo.com', 'segredo').get_json()['access_token']
+    cabecalhos = {'Authorization': f'Bearer {token}'}
+
+    resposta = client.get('/api/users/me', headers=cabecalhos)
+    assert resposta.status_code == 200
+    assert resposta.get_json()['id'] == usuario_id
+    # A identidade do token é string; as rotas por id continuam reconhecendo o dono
+    assert client.get(f'/api/users/users/{usuario_id}', headers=cabecalhos).status_code == 200
+    assert client.get(f'/api/users/users/{usuario_id + 1}', headers=cabecalhos).status_code == 403